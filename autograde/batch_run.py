@@ -1,20 +1,56 @@
 """A script for running the autograder."""
+import os
+import asyncio
 import argparse
 from os import PathLike
 from pathlib import Path
-from typing import List, Optional, Tuple, Iterator
-from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Any, AsyncIterator, Callable, Dict, Iterable, List, Mapping, Optional,
+    Sequence, Tuple, Iterator, Union
+)
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+    as_completed, wait
+)
+from contextlib import ExitStack
+from functools import partial
 from time import time
 
 from autograde import CppProgram
-from autograde.components import Program
-from autograde.tools import compile_cpp, execute_program, clean_cpp
+from autograde.components import ParseIndex, Program
+from autograde.components.archive import extract_program, is_archive
+from autograde.components.discovery import (
+    DEFAULT_IGNORE, discover_many, is_ignored
+)
+from autograde.tools import (
+    compile_cpp, compile_cpp_async, execute_program, execute_program_async,
+    clean_cpp
+)
+from autograde.tools.cache import CacheStats, CompileCache, ObjectCache
+from autograde.tools.compare import COMPARATORS, DEFAULT_TOLERANCE, Verdict
 from autograde.tools.container import compile_run_cpp
-from autograde.tools.result import CompileResult, ExecuteResult
+from autograde.tools.dedup import group_duplicates
+from autograde.tools.distributed import (
+    Address, pack_program, parse_address, run_worker, start_coordinator
+)
+from autograde.tools.metrics import measure_call, percentile
+from autograde.tools.pch import DEFAULT_PCH_HEADERS, PrecompiledHeader
+from autograde.tools.store import ResultStore, make_fingerprint, passed
+from autograde.tools.pool import ContainerPool
+from autograde.tools.result import CompileResult, ExecuteResult, PhaseMetrics
+from autograde.tools.sandbox import ResourceLimits
+from autograde.tools.testcase import (
+    TestCase, CaseResult, load_test_cases, run_test_cases,
+    run_test_cases_async
+)
+from autograde.tools.watch import debounce, make_watcher
 
 from tqdm import tqdm
 
-RunResult = Tuple[Program, Optional[CompileResult], Optional[ExecuteResult]]
+RunResult = Tuple[
+    Program, Optional[CompileResult],
+    Union[None, ExecuteResult, List[CaseResult]]
+]
 
 
 def get_args():
@@ -29,44 +65,657 @@ def get_args():
     parser.add_argument(
         "--use_container", action="store_true",
         help="Use a container to compile and run the program.")
+    parser.add_argument(
+        "--pool_size", default=None, type=int,
+        help="Run programs in a pool of this many long lived containers. "
+             "Implies --use_container.")
+    parser.add_argument(
+        "--max_jobs", default=100, type=int,
+        help="Number of programs a pooled container runs before it is "
+             "replaced.")
     parser.add_argument(
         "--concurrent", action="store_true",
         help="Run each program's compilation and execution concurrently.")
-    return parser.parse_args()
+    parser.add_argument(
+        "--compile_workers", default=None, type=int,
+        help="Number of programs to compile at once when concurrent.")
+    parser.add_argument(
+        "--execute_workers", default=None, type=int,
+        help="Number of programs to execute at once when concurrent.")
+    parser.add_argument(
+        "--cache_dir", default=None, type=Path,
+        help="Directory of a cache of compiled programs to reuse.")
+    parser.add_argument(
+        "--cache_size", default=1 << 30, type=int,
+        help="Maximum size of the compile cache in bytes.")
+    parser.add_argument(
+        "--object_cache_dir", default=None, type=Path,
+        help="Directory of a cache of compiled translation units that "
+             "programs share. Only used by the direct backend.")
+    parser.add_argument(
+        "--object_cache_size", default=1 << 30, type=int,
+        help="Maximum size of the object cache in bytes.")
+    parser.add_argument(
+        "--index", default=None, type=Path,
+        help="SQLite file that caches what was parsed from source files "
+             "between runs.")
+    parser.add_argument(
+        "--backend", default="scons",
+        choices=["scons", "direct", "incremental"],
+        help="Compile with scons, by calling the compiler directly or by "
+             "only recompiling what changed in --build_dir, which defaults "
+             "to a hidden .<program>.build folder next to each program.")
+    parser.add_argument(
+        "--build_dir", default=None, type=Path,
+        help="Directory to keep each program's build files in between runs "
+             "instead of cleaning them from the program's folder.")
+    parser.add_argument(
+        "--pch_dir", default=None, type=Path,
+        help="Directory to build a precompiled header of common includes in "
+             "and reuse it for every program.")
+    parser.add_argument(
+        "--pch_headers", default=list(DEFAULT_PCH_HEADERS), nargs="+",
+        help="The standard headers to precompile.")
+    parser.add_argument(
+        "--unity", action="store_true",
+        help="Compile each program's files as one translation unit and fall "
+             "back to compiling them separately if that fails.")
+    parser.add_argument(
+        "--results", default=None, type=Path,
+        help="Directory of a store to append each program's results to as "
+             "it finishes.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip programs in --results that already ran with the same "
+             "sources and input.")
+    parser.add_argument(
+        "--dedup", action="store_true",
+        help="Run programs with identical sources once and report the "
+             "groups of identical programs.")
+    parser.add_argument(
+        "--quiet", action="store_true",
+        help="Don't print each program's output.")
+    parser.add_argument(
+        "--test_cases", default=None, type=Path,
+        help="A directory of <case>.in/<case>.out files or a json manifest "
+             "of test cases to run each program against.")
+    parser.add_argument(
+        "--compare", default="exact", choices=list(COMPARATORS),
+        help="How a test case's output is compared with the expected "
+             "output. The program is killed at the first mismatch.")
+    parser.add_argument(
+        "--tolerance", default=DEFAULT_TOLERANCE, type=float,
+        help="Absolute and relative tolerance of numbers compared with "
+             "--compare numeric.")
+    parser.add_argument(
+        "--case_workers", default=None, type=int,
+        help="Number of test cases of a program to run at once.")
+    parser.add_argument(
+        "--timeout", default=None, type=float,
+        help="Seconds a program may run before it is killed.")
+    parser.add_argument(
+        "--output_limit", default=None, type=int,
+        help="Bytes of output a program may write before it is killed.")
+    parser.add_argument(
+        "--cpu_limit", default=None, type=float,
+        help="Seconds of cpu time a program may use.")
+    parser.add_argument(
+        "--memory_limit", default=None, type=int,
+        help="Bytes of address space a program may use.")
+    parser.add_argument(
+        "--file_size_limit", default=None, type=int,
+        help="Bytes a program may write to a single file.")
+    parser.add_argument(
+        "--process_limit", default=None, type=int,
+        help="Number of processes the user running a program may have.")
+    parser.add_argument(
+        "--open_files_limit", default=None, type=int,
+        help="Number of files a program may have open.")
+    parser.add_argument(
+        "--serve", default=None, type=parse_address, metavar="HOST:PORT",
+        help="Hand the programs out to workers that connect to this "
+             "address instead of running them here.")
+    parser.add_argument(
+        "--worker", default=None, type=parse_address, metavar="HOST:PORT",
+        help="Run programs for the coordinator at this address. The "
+             "program path is the directory to write them into.")
+    parser.add_argument(
+        "--worker_jobs", default=None, type=int,
+        help="Number of programs a worker runs at once.")
+    parser.add_argument(
+        "--authkey", default=os.environ.get("AUTOGRADE_AUTHKEY"),
+        help="Key the coordinator and workers authenticate with. Defaults "
+             "to $AUTOGRADE_AUTHKEY.")
+    parser.add_argument(
+        "--lease_timeout", default=30, type=float,
+        help="Seconds a worker may go unheard from before its programs "
+             "are handed to other workers.")
+    parser.add_argument(
+        "--max_attempts", default=3, type=int,
+        help="Number of workers a program is tried on before it fails.")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep watching the batch after running it and rerun the "
+             "programs whose sources change until interrupted.")
+    parser.add_argument(
+        "--debounce", default=0.5, type=float,
+        help="Seconds without changes before changed programs are rerun.")
+    parser.add_argument(
+        "--poll", action="store_true",
+        help="Poll the batch for changes instead of using inotify.")
+    parser.add_argument(
+        "--poll_interval", default=1, type=float,
+        help="Seconds between polls of the batch.")
+    args = parser.parse_args()
+    if args.resume and args.results is None:
+        parser.error("--resume requires --results.")
+    if args.serve is not None and args.worker is not None:
+        parser.error("--serve and --worker can't be used together.")
+    if (args.serve or args.worker) is not None and args.authkey is None:
+        parser.error("--serve and --worker require --authkey.")
+    if args.serve is not None and (args.use_container or args.pool_size):
+        parser.error("--serve can't run programs in containers.")
+    if args.watch and (args.serve or args.worker) is not None:
+        parser.error("--watch can't be used with --serve or --worker.")
+    if (args.object_cache_dir is not None and args.worker is None
+            and args.backend != "direct"):
+        parser.error("--object_cache_dir requires --backend direct.")
+    return args
+
+
+def load_program(
+        program_path: PathLike, index: Optional[ParseIndex] = None,
+        source_paths: Optional[Sequence[Path]] = None) -> CppProgram:
+    """Returns the program in a path with its sources and entry point set.
+
+    args:
+        program_path: A path that contains the program.
+        index: An index of parsed source files to look sources up in.
+        source_paths: The program's source files if they were already
+            discovered.
+    """
+    program = CppProgram(program_path, index=index)
+    program.collect_source(source_paths)
+    program.set_entry_point()
+    return program
+
+
+def prepare_target(
+        program_path: PathLike, cache: Optional[CompileCache] = None,
+        backend: str = "scons",
+        build_dir: Optional[PathLike] = None) -> Path:
+    """Returns the directory to build a program in, cleaning it if needed.
+
+    Without build_dir a program in an archive, and a program compiled by
+    the incremental backend which keeps its build files between runs, is
+    built in a hidden directory next to it named after it so no build
+    files are written into the program's sources.
+
+    args:
+        program_path: A path that contains the program to compile.
+        cache: A cache of compiled programs.
+        backend: The compile backend.
+        build_dir: A directory that holds a build directory for each
+            program. See compile_program.
+    """
+    target_path = Path(program_path)
+    if build_dir is not None:
+        target_path = Path(build_dir, target_path.resolve().name)
+        target_path.mkdir(parents=True, exist_ok=True)
+    elif backend == "incremental" or (
+            is_archive(target_path) and target_path.is_file()):
+        program_path = target_path.resolve()
+        target_path = program_path.parent / f".{program_path.name}.build"
+        target_path.mkdir(parents=True, exist_ok=True)
+    elif cache is None and backend == "scons":
+        clean_cpp(program_path)
+    return target_path
+
+
+def extract_archived(
+        program: Program, program_path: PathLike,
+        build_dir: Optional[PathLike] = None) -> Program:
+    """Returns a program whose files are extracted if it is in an archive.
+
+    Containers mount the program's folder so an archived program's sources
+    are extracted into the directory prepare_target would build it in.
+    """
+    if not is_archive(program_path) or not Path(program_path).is_file():
+        return program
+    return extract_program(
+        program, prepare_target(program_path, build_dir=build_dir)
+    )
+
+
+def compile_program(
+        program_path: PathLike, cache: Optional[CompileCache] = None,
+        backend: str = "scons", index: Optional[ParseIndex] = None,
+        source_paths: Optional[Sequence[Path]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None, unity: bool = False,
+        object_cache: Optional[ObjectCache] = None
+) -> Tuple[Program, Optional[CompileResult]]:
+    """Compiles a program contained in the path.
+
+    A program in a zip or tar archive is parsed from the archive and only
+    its sources and the files they include are extracted into its build
+    directory. See extract_program.
+
+    args:
+        program_path: A path that contains the program to compile.
+        cache: A cache of compiled programs. When given the program's build
+            files aren't cleaned since a cache hit skips compiling.
+        backend: The compile backend, "scons", "direct" or "incremental".
+        index: An index of parsed source files.
+        source_paths: The program's source files if they were already
+            discovered.
+        pch: A precompiled header to compile the program with.
+        build_dir: A directory that holds a build directory for each program
+            named after the program's folder. The build files are kept
+            between runs so only what changed is rebuilt. If None then the
+            program is built in its own folder, or next to it for archives
+            and the incremental backend. See prepare_target.
+        unity: Compile the program as one translation unit. See compile_cpp.
+        object_cache: A cache of compiled translation units. See
+            compile_cpp.
+    returns:
+        Returns the program and the result of compiling it. The result's
+            parse_metrics are the metrics of loading the program.
+    """
+    program, parse_metrics = measure_call(
+        load_program, program_path, index=index, source_paths=source_paths
+    )
+    target_path = prepare_target(
+        program_path, cache=cache, backend=backend, build_dir=build_dir
+    )
+    compile_result = compile_cpp(
+        extract_program(program, target_path), target_path=target_path,
+        cache=cache, backend=backend, pch=pch, unity=unity,
+        object_cache=object_cache
+    )
+    return (program, compile_result._replace(parse_metrics=parse_metrics))
+
+
+def execute_compiled(
+        program: Program, compile_result: Optional[CompileResult],
+        program_input: Optional[str] = None,
+        test_cases: Optional[Sequence[TestCase]] = None,
+        case_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+        compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE) -> RunResult:
+    """Executes a program that was compiled by compile_program.
+
+    args:
+        program: The program that was compiled.
+        compile_result: The result of compiling the program.
+        program_input: Input to give the program.
+        test_cases: Test cases to run the program against instead of
+            program_input.
+        case_workers: The number of test cases to run at once.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
+        limits: Resource limits to apply to the program.
+        compare: How the output of a test case is compared with its
+            expected output. See run_test_case.
+        tolerance: The tolerance of the "numeric" comparison.
+    returns:
+        Returns the results of the compile and execution of the program.
+    """
+    execute_result = None
+    if compile_result and compile_result.executable is not None:
+        executable = compile_result.executable
+        if test_cases is not None:
+            execute_result = run_test_cases(
+                executable, executable.parent, test_cases,
+                max_workers=case_workers, timeout=timeout,
+                output_limit=output_limit, limits=limits, compare=compare,
+                tolerance=tolerance
+            )
+        else:
+            execute_result = execute_program(
+                executable, executable.parent,
+                program_input=program_input, timeout=timeout,
+                output_limit=output_limit, limits=limits
+            )
+    return (program, compile_result, execute_result)
 
 
 def run_program(
         program_path: PathLike, program_input: Optional[str] = None,
-        use_container: bool = False) -> RunResult:
+        use_container: bool = False,
+        cache: Optional[CompileCache] = None,
+        backend: str = "scons",
+        test_cases: Optional[Sequence[TestCase]] = None,
+        case_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        pool: Optional[ContainerPool] = None,
+        index: Optional[ParseIndex] = None,
+        source_paths: Optional[Sequence[Path]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None,
+        limits: Optional[ResourceLimits] = None,
+        unity: bool = False, compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE,
+        object_cache: Optional[ObjectCache] = None) -> RunResult:
     """Runs a program contained in the path.
 
     args:
         program_path: A path that contains the program to compile and run.
         program_input: Input to give the program.
+        cache: A cache of compiled programs. When given the program's build
+            files aren't cleaned since a cache hit skips compiling.
+        backend: The compile backend, "scons", "direct" or "incremental".
+        test_cases: Test cases to run the program against instead of
+            program_input. The program is compiled once for all of them.
+        case_workers: The number of test cases to run at once.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
+        pool: A pool of containers to compile and run the program in instead
+            of starting a new container.
+        index: An index of parsed source files.
+        source_paths: The program's source files if they were already
+            discovered.
+        pch: A precompiled header to compile the program with. It isn't
+            used in containers.
+        build_dir: A directory to keep the program's build files in. See
+            compile_program.
+        limits: Resource limits to apply to the program. Containers don't
+            use them.
+        unity: Compile the program as one translation unit. See compile_cpp.
+            It isn't used in containers.
+        compare: How the output of a test case is compared with its
+            expected output. See run_test_case.
+        tolerance: The tolerance of the "numeric" comparison.
+        object_cache: A cache of compiled translation units. It isn't used
+            in containers.
     returns:
-        Returns the results of the compile and execution of the program.
+        Returns the results of the compile and execution of the program. If
+            test_cases are given then the execution result is a list of the
+            results for each test case.
     """
-    program = CppProgram(program_path)
-    program.collect_source()
-    program.set_entry_point()
-    if use_container:
-        compile_result, execute_result = compile_run_cpp(
-            program, program_input=program_input)
-    else:
-        clean_cpp(program_path)
-        compile_result = compile_cpp(program, target_path=program_path)
-        execute_result = None
-        if compile_result and compile_result.executable is not None:
-            execute_result = execute_program(
-                compile_result.executable, compile_result.executable.parent,
-                program_input=program_input
+    if (use_container or pool) and test_cases is not None:
+        raise ValueError("Test cases can't be run with a container.")
+    if pool is not None or use_container:
+        program, parse_metrics = measure_call(
+            load_program, program_path, index=index,
+            source_paths=source_paths
+        )
+        extracted = extract_archived(program, program_path, build_dir)
+        if pool is not None:
+            compile_result, execute_result = pool.run(
+                extracted, program_input=program_input, timeout=timeout,
+                output_limit=output_limit
             )
-    return (program, compile_result, execute_result)
+        else:
+            compile_result, execute_result = compile_run_cpp(
+                extracted, program_input=program_input, timeout=timeout,
+                output_limit=output_limit
+            )
+        if compile_result is not None:
+            compile_result = compile_result._replace(
+                parse_metrics=parse_metrics
+            )
+        return (program, compile_result, execute_result)
+    program, compile_result = compile_program(
+        program_path, cache=cache, backend=backend, index=index,
+        source_paths=source_paths, pch=pch, build_dir=build_dir, unity=unity,
+        object_cache=object_cache
+    )
+    return execute_compiled(
+        program, compile_result, program_input=program_input,
+        test_cases=test_cases, case_workers=case_workers, timeout=timeout,
+        output_limit=output_limit, limits=limits, compare=compare,
+        tolerance=tolerance
+    )
+
+
+def get_program_folders(
+        batch_path: PathLike,
+        ignore: Sequence[str] = DEFAULT_IGNORE) -> List[Path]:
+    """Returns the paths of the programs in a batch.
+
+    args:
+        batch_path: The path to a directory that contains programs.
+        ignore: Glob patterns of names in the batch that aren't programs.
+    """
+    return sorted(
+        path for path in Path(batch_path).iterdir()
+        if not is_ignored(path.name, ignore)
+    )
+
+
+def run_in_stages(
+        programs: Mapping[Path, Sequence[Path]],
+        compile_stage: Callable[..., Tuple[Program, Any]],
+        execute_stage: Callable[[Program, Any], RunResult],
+        compile_workers: Optional[int] = None,
+        execute_workers: Optional[int] = None
+) -> Iterator[Tuple[Path, RunResult]]:
+    """Runs programs through separate compile and execute pools.
+
+    Compiling is CPU heavy so it happens in a pool of processes while
+    executing mostly waits on the program so it happens in a pool of threads.
+    A program is handed to the execute pool as soon as it is compiled.
+
+    args:
+        programs: A map from the paths of the programs to run to their
+            source files.
+        compile_stage: Compiles the program in a path given its source files
+            and returns the program along with the result of compiling it.
+        execute_stage: Executes a compiled program.
+        compile_workers: The number of programs to compile at once.
+        execute_workers: The number of programs to execute at once.
+    returns:
+        Returns the results of the programs in the order they finish.
+    """
+    with ProcessPoolExecutor(compile_workers) as compile_executor, \
+            ThreadPoolExecutor(execute_workers) as execute_executor:
+        compiling = {
+            compile_executor.submit(
+                compile_stage, program_path, source_paths=source_paths
+            ): program_path
+            for program_path, source_paths in programs.items()
+        }
+        executing: Dict[Future, Path] = {}
+        while compiling or executing:
+            done, _ = wait(
+                [*compiling, *executing], return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future in compiling:
+                    program_path = compiling.pop(future)
+                    execute_future = execute_executor.submit(
+                        execute_stage, *future.result()
+                    )
+                    executing[execute_future] = program_path
+                else:
+                    yield (executing.pop(future), future.result())
+
+
+def run_as_completed(
+        executor: Executor, programs: Mapping[Path, Sequence[Path]],
+        run: Callable[..., RunResult]
+) -> Iterator[Tuple[Path, RunResult]]:
+    """Runs programs with an executor and yields them as they finish.
+
+    args:
+        executor: The executor to run the programs with.
+        programs: A map from the paths of the programs to run to their
+            source files.
+        run: Compiles and executes the program in a path given its source
+            files.
+    returns:
+        Returns the results of the programs in the order they finish.
+    """
+    with executor:
+        futures = {
+            executor.submit(
+                run, program_path, source_paths=source_paths
+            ): program_path
+            for program_path, source_paths in programs.items()
+        }
+        for future in as_completed(futures):
+            yield (futures[future], future.result())
+
+
+def find_programs(
+        batch_path: PathLike, store: Optional[ResultStore] = None,
+        resume: bool = False,
+        program_paths: Optional[Iterable[PathLike]] = None, **settings: Any
+) -> Tuple[Dict[Path, List[Path]], Dict[Path, str]]:
+    """Returns the programs of a batch that need to run.
+
+    args:
+        batch_path: The path to a directory that contains programs.
+        store: A store of earlier results. When given every program is
+            fingerprinted with its sources and settings.
+        resume: Leave out the programs whose latest result in store has the
+            same fingerprint.
+        program_paths: Only the programs in these folders of the batch. If
+            None then every program.
+        settings: What the programs are run with. See make_fingerprint.
+    returns:
+        A map from the paths of the programs to their source files and a map
+            from the paths to their fingerprints.
+    """
+    if resume and store is None:
+        raise ValueError("A store is needed to resume a batch.")
+    program_folders = get_program_folders(batch_path)
+    if program_paths is not None:
+        wanted = {Path(path).resolve() for path in program_paths}
+        program_folders = [
+            path for path in program_folders if path.resolve() in wanted
+        ]
+    programs = discover_many(program_folders, CppProgram().get_extensions())
+    fingerprints = {}
+    if store is not None:
+        fingerprints = {
+            program_path: make_fingerprint(source_paths, **settings)
+            for program_path, source_paths in programs.items()
+        }
+    if resume:
+        latest = store.latest()
+        programs = {
+            program_path: source_paths
+            for program_path, source_paths in programs.items()
+            if latest.get(str(program_path.resolve()), {}).get("fingerprint")
+            != fingerprints[program_path]
+        }
+    return programs, fingerprints
+
+
+def relocate_path(path: Path, program_path: Path, new_path: Path) -> Path:
+    """Returns a program's file at the same place in another program.
+
+    Files outside of the program's folder keep their name like they do in
+    source_fingerprint.
+    """
+    try:
+        return new_path / path.relative_to(program_path)
+    except ValueError:
+        return new_path / path.name
+
+
+def duplicate_result(
+        program_path: Path, run_result: RunResult, path: Path) -> RunResult:
+    """Returns the result of a program for a program with identical sources.
+
+    The program is loaded at path from the names of the original's sources
+    without being parsed again. The executable and the metrics are dropped
+    since the duplicate wasn't compiled or run itself, so nothing that uses
+    its result acts on the original's build.
+
+    args:
+        program_path: The path to the program that was run.
+        run_result: The result of running it.
+        path: The path to the duplicate.
+    """
+    program, compile_result, execute_result = run_result
+    duplicate = type(program)(path, index=program.index)
+    duplicate.collect_source(
+        relocate_path(source_file.path, program_path, path)
+        for source_file in program.source_files
+    )
+    if program.entry_point is not None:
+        duplicate.set_entry_point(
+            relocate_path(program.entry_point.path, program_path, path)
+        )
+    if compile_result is not None:
+        compile_result = compile_result._replace(
+            executable=None, metrics=None, parse_metrics=None
+        )
+    if isinstance(execute_result, list):
+        execute_result = [
+            case_result if case_result.execute_result is None
+            else case_result._replace(
+                execute_result=case_result.execute_result._replace(
+                    metrics=None
+                )
+            )
+            for case_result in execute_result
+        ]
+    elif execute_result is not None:
+        execute_result = execute_result._replace(metrics=None)
+    return (duplicate, compile_result, execute_result)
+
+
+def fan_out(
+        program_path: Path, run_result: RunResult, duplicates: List[Path],
+        store: Optional[ResultStore], fingerprints: Mapping[Path, str],
+        **extra: Any
+) -> Iterator[Tuple[Path, RunResult]]:
+    """Yields the result of a program for it and for its duplicates.
+
+    Each result is recorded in store first. The results of duplicates are
+    made by duplicate_result and recorded with the path of the program that
+    was run as duplicate_of.
+
+    args:
+        program_path: The path to the program that was run.
+        run_result: The result of running it.
+        duplicates: The paths to the programs with identical sources.
+        store: A store to record the results in.
+        fingerprints: The fingerprint of each program for the store.
+        extra: Extra fields to record with every result.
+    """
+    for path in [program_path, *duplicates]:
+        path_result = run_result
+        if path != program_path:
+            path_result = duplicate_result(program_path, run_result, path)
+        if store is not None:
+            fields: Dict[str, Any] = {
+                "fingerprint": fingerprints[path], **extra
+            }
+            if path != program_path:
+                fields["duplicate_of"] = str(program_path.resolve())
+            store.record(path, path_result, **fields)
+        yield (path, path_result)
 
 
 def batch_run_programs(
         batch_path: PathLike, program_input: Optional[str] = None,
-        use_container: bool = False, concurrent: bool = False
+        use_container: bool = False, concurrent: bool = False,
+        cache: Optional[CompileCache] = None, backend: str = "scons",
+        test_cases: Optional[Sequence[TestCase]] = None,
+        case_workers: Optional[int] = None, timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        pool: Optional[ContainerPool] = None,
+        compile_workers: Optional[int] = None,
+        execute_workers: Optional[int] = None,
+        index: Optional[ParseIndex] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None,
+        store: Optional[ResultStore] = None, resume: bool = False,
+        limits: Optional[ResourceLimits] = None, dedup: bool = False,
+        unity: bool = False, compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE,
+        object_cache: Optional[ObjectCache] = None,
+        program_paths: Optional[Iterable[PathLike]] = None,
+        timings: Optional[Dict[str, PhaseMetrics]] = None
 ) -> Iterator[Tuple[Path, RunResult]]:
     """Runs multiple programs in a folder within a folder.
 
@@ -74,30 +723,440 @@ def batch_run_programs(
         batch_path: The path to a directory that contains subdirectories that
             contains program code.
         program_input: Input to give to the program.
+        concurrent: Compile and execute programs concurrently. Results are
+            returned in the order the programs finish.
+        cache: A cache of compiled programs.
+        backend: The compile backend, "scons", "direct" or "incremental".
+        test_cases: Test cases to run each program against.
+        case_workers: The number of test cases of a program to run at once.
+        timeout: The number of seconds each program may run for.
+        output_limit: The number of bytes of output each program may write.
+        pool: A pool of containers to run the programs in. The programs are
+            handed to the pool from threads as many as the pool has workers.
+        compile_workers: The number of programs to compile at once when
+            concurrent. Defaults to the number of cores.
+        execute_workers: The number of programs to execute at once when
+            concurrent.
+        index: An index of parsed source files shared by every program.
+        pch: A precompiled header that is built once before any program is
+            compiled. If it fails to build then programs compile without it.
+        build_dir: A directory to keep each program's build files in between
+            runs. See compile_program.
+        store: A store to record each result in as it finishes along with a
+            fingerprint of the program's sources and input.
+        resume: Skip the programs whose latest result in store has the same
+            fingerprint. Skipped programs aren't yielded.
+        limits: Resource limits to apply to each program.
+        dedup: Only run the first of each group of programs with identical
+            sources and yield its result for the rest of the group right
+            after it. See group_duplicates.
+        unity: Compile each program as one translation unit. See
+            compile_cpp.
+        compare: How the output of each test case is compared with its
+            expected output. See run_test_case.
+        tolerance: The tolerance of the "numeric" comparison.
+        object_cache: A cache of compiled translation units shared by every
+            program so files that programs have in common are compiled
+            once. Only the "direct" backend can use it.
+        program_paths: Only run the programs in these folders of the batch.
+            If None then every program is run.
+        timings: A map that the metrics of the phases of the whole batch
+            are recorded in. "Discovery" is finding and fingerprinting the
+            programs.
     returns:
         Returns the results of the compilation process and the execution
             process.
     """
-    program_folders = list(Path(batch_path).iterdir())
-    if concurrent:
-        with ProcessPoolExecutor() as executor:
-            tasks = executor.map(
-                run_program, program_folders,
-                [program_input]*len(program_folders),
-                [use_container]*len(program_folders)
-            )
-            yield from zip(program_folders, tasks)
+    (programs, fingerprints), discovery_metrics = measure_call(
+        find_programs, batch_path, store=store, resume=resume,
+        program_paths=program_paths, program_input=program_input,
+        test_cases=test_cases, timeout=timeout, output_limit=output_limit,
+        backend=backend, limits=limits, compare=compare, tolerance=tolerance
+    )
+    if timings is not None:
+        # The folders are walked from a pool of threads whose cpu times
+        # the calling thread's don't include.
+        timings["Discovery"] = discovery_metrics._replace(
+            user=None, sys=None
+        )
+    duplicates = {}
+    if dedup:
+        duplicates = group_duplicates(programs)
+        programs = {path: programs[path] for path in duplicates}
+    if pch is not None and not (use_container or pool):
+        pch.build()
+    run = partial(
+        run_program, program_input=program_input,
+        use_container=use_container, cache=cache, backend=backend,
+        test_cases=test_cases, case_workers=case_workers, timeout=timeout,
+        output_limit=output_limit, pool=pool, index=index, pch=pch,
+        build_dir=build_dir, limits=limits, unity=unity, compare=compare,
+        tolerance=tolerance, object_cache=object_cache
+    )
+    if pool is not None:
+        results = run_as_completed(
+            ThreadPoolExecutor(pool.size), programs, run
+        )
+    elif concurrent and use_container:
+        results = run_as_completed(
+            ProcessPoolExecutor(compile_workers), programs, run
+        )
+    elif concurrent:
+        results = run_in_stages(
+            programs,
+            partial(
+                compile_program, cache=cache, backend=backend, index=index,
+                pch=pch, build_dir=build_dir, unity=unity,
+                object_cache=object_cache
+            ),
+            partial(
+                execute_compiled, program_input=program_input,
+                test_cases=test_cases, case_workers=case_workers,
+                timeout=timeout, output_limit=output_limit, limits=limits,
+                compare=compare, tolerance=tolerance
+            ),
+            compile_workers=compile_workers, execute_workers=execute_workers
+        )
     else:
-        yield from (
-            (
-                program_path,
-                run_program(program_path, program_input, use_container)
+        results = (
+            (program_path, run(program_path, source_paths=source_paths))
+            for program_path, source_paths in programs.items()
+        )
+    for program_path, run_result in results:
+        yield from fan_out(
+            program_path, run_result, duplicates.get(program_path, []),
+            store, fingerprints
+        )
+
+
+async def run_program_async(
+        program_path: Path, source_paths: Sequence[Path],
+        compile_semaphore: asyncio.Semaphore,
+        execute_semaphore: asyncio.Semaphore,
+        program_input: Optional[str] = None,
+        cache: Optional[CompileCache] = None, backend: str = "direct",
+        test_cases: Optional[Sequence[TestCase]] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        index: Optional[ParseIndex] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None,
+        limits: Optional[ResourceLimits] = None, unity: bool = False,
+        compare: str = "exact", tolerance: float = DEFAULT_TOLERANCE,
+        object_cache: Optional[ObjectCache] = None
+) -> Tuple[Path, RunResult]:
+    """Compiles and runs a program from an event loop.
+
+    Loading the program and preparing its build directory happen in a
+    thread so they don't block the loop. See batch_run_programs_async for
+    the arguments.
+    """
+    program, parse_metrics = await asyncio.to_thread(
+        measure_call, load_program, program_path, index=index,
+        source_paths=source_paths
+    )
+    target_path = await asyncio.to_thread(
+        prepare_target, program_path, cache=cache, backend=backend,
+        build_dir=build_dir
+    )
+    extracted = await asyncio.to_thread(
+        extract_program, program, target_path
+    )
+    compile_result = (await compile_cpp_async(
+        extracted, target_path, cache=cache, backend=backend, pch=pch,
+        semaphore=compile_semaphore, unity=unity, object_cache=object_cache
+    ))._replace(parse_metrics=parse_metrics)
+    execute_result = None
+    if compile_result.executable is not None:
+        executable = compile_result.executable
+        if test_cases is not None:
+            execute_result = await run_test_cases_async(
+                executable, executable.parent, test_cases, timeout=timeout,
+                output_limit=output_limit, limits=limits,
+                semaphore=execute_semaphore, compare=compare,
+                tolerance=tolerance
+            )
+        else:
+            execute_result = await execute_program_async(
+                executable, executable.parent, program_input=program_input,
+                timeout=timeout, output_limit=output_limit, limits=limits,
+                semaphore=execute_semaphore
+            )
+    return (program_path, (program, compile_result, execute_result))
+
+
+async def batch_run_programs_async(
+        batch_path: PathLike, program_input: Optional[str] = None,
+        cache: Optional[CompileCache] = None, backend: str = "direct",
+        test_cases: Optional[Sequence[TestCase]] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        compile_workers: Optional[int] = None,
+        execute_workers: int = 64,
+        index: Optional[ParseIndex] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None,
+        store: Optional[ResultStore] = None, resume: bool = False,
+        limits: Optional[ResourceLimits] = None, dedup: bool = False,
+        unity: bool = False, compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE,
+        object_cache: Optional[ObjectCache] = None
+) -> AsyncIterator[Tuple[Path, RunResult]]:
+    """Runs the programs in a folder from one event loop.
+
+    Every program is in flight at once and semaphores limit the number of
+    compiler processes and executions that run at the same time, so a batch
+    doesn't need a python process or thread per program. Programs can't be
+    run in containers and only the "direct" and "scons" backends are
+    supported.
+
+    args:
+        batch_path: The path to a directory that contains subdirectories that
+            contains program code.
+        program_input: Input to give to the program.
+        cache: A cache of compiled programs.
+        backend: The compile backend, "direct" or "scons".
+        test_cases: Test cases to run each program against.
+        timeout: The number of seconds each program may run for.
+        output_limit: The number of bytes of output each program may write.
+        compile_workers: The number of compiler processes to run at once.
+            Defaults to the number of cores.
+        execute_workers: The number of programs to execute at once.
+        index: An index of parsed source files shared by every program.
+            Programs are loaded in threads that each open their own
+            connection to it.
+        pch: A precompiled header that is built once before any program is
+            compiled.
+        build_dir: A directory to keep each program's build files in between
+            runs. See compile_program.
+        store: A store to record each result in as it finishes.
+        resume: Skip the programs whose latest result in store has the same
+            fingerprint.
+        limits: Resource limits to apply to each program.
+        dedup: Only run the first of each group of programs with identical
+            sources. See batch_run_programs.
+        unity: Compile each program as one translation unit.
+        compare: How the output of each test case is compared.
+        tolerance: The tolerance of the "numeric" comparison.
+        object_cache: A cache of compiled translation units shared by every
+            program.
+    returns:
+        Returns the results of the programs in the order they finish.
+    """
+    programs, fingerprints = await asyncio.to_thread(
+        find_programs, batch_path, store=store, resume=resume,
+        program_input=program_input, test_cases=test_cases, timeout=timeout,
+        output_limit=output_limit, backend=backend, limits=limits,
+        compare=compare, tolerance=tolerance
+    )
+    duplicates = {}
+    if dedup:
+        duplicates = await asyncio.to_thread(group_duplicates, programs)
+        programs = {path: programs[path] for path in duplicates}
+    if pch is not None:
+        await asyncio.to_thread(pch.build)
+    compile_semaphore = asyncio.Semaphore(
+        compile_workers or os.cpu_count() or 1
+    )
+    execute_semaphore = asyncio.Semaphore(execute_workers)
+    tasks = [
+        asyncio.create_task(run_program_async(
+            program_path, source_paths, compile_semaphore, execute_semaphore,
+            program_input=program_input, cache=cache, backend=backend,
+            test_cases=test_cases, timeout=timeout,
+            output_limit=output_limit, index=index, pch=pch,
+            build_dir=build_dir, limits=limits, unity=unity,
+            compare=compare, tolerance=tolerance, object_cache=object_cache
+        ))
+        for program_path, source_paths in programs.items()
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            program_path, run_result = await task
+            for result in fan_out(
+                    program_path, run_result,
+                    duplicates.get(program_path, []), store, fingerprints):
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def watch_programs(
+        batch_path: PathLike, debounce_time: float = 0.5,
+        polling: bool = False, poll_interval: float = 1,
+        **options: Any) -> Iterator[Tuple[Path, RunResult]]:
+    """Runs a batch and then reruns the programs whose sources change.
+
+    The batch is watched from before the first run so no change is missed.
+    Each burst of changes is regraded once it settles and only the program
+    folders with a changed source file are run again. It never returns so
+    it is stopped by closing the generator or interrupting it.
+
+    args:
+        batch_path: The path to a directory that contains subdirectories that
+            contains program code.
+        debounce_time: The number of seconds without changes that ends a
+            burst of changes.
+        polling: Poll the batch for changes instead of using inotify. See
+            make_watcher.
+        poll_interval: The number of seconds between polls.
+        options: The arguments of batch_run_programs. With a store and
+            resume a program whose sources were saved without changing is
+            skipped.
+    returns:
+        Returns the results of the programs as they finish.
+    """
+    with make_watcher(
+            batch_path, CppProgram().get_extensions(), polling=polling,
+            interval=poll_interval) as watcher:
+        yield from batch_run_programs(batch_path, **options)
+        for changed in debounce(watcher, debounce_time):
+            yield from batch_run_programs(
+                batch_path, program_paths=changed, **options
             )
-            for program_path in program_folders
+
+
+def run_job(
+        program_path: Path, source_paths: List[Path],
+        settings: Mapping[str, Any], **options: Any
+) -> Tuple[Optional[CompileResult], Any]:
+    """Runs a program that a worker was handed by a coordinator.
+
+    The coordinator picks the compile backend so the worker's object cache
+    is only used when the backend is "direct".
+
+    args:
+        program_path: The folder the worker wrote the program into.
+        source_paths: The program's source files.
+        settings: The coordinator's arguments for run_program.
+        options: The worker's own arguments for run_program.
+    returns:
+        The results of compiling and executing the program. The program
+            itself is loaded again by the coordinator.
+    """
+    if settings.get("backend", "scons") != "direct":
+        options = {**options, "object_cache": None}
+    _, compile_result, execute_result = run_program(
+        program_path, source_paths=source_paths, **settings, **options
+    )
+    return compile_result, execute_result
+
+
+def serve_programs(
+        coordinator: Any, batch_path: PathLike,
+        program_input: Optional[str] = None, backend: str = "scons",
+        test_cases: Optional[Sequence[TestCase]] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        index: Optional[ParseIndex] = None,
+        store: Optional[ResultStore] = None, resume: bool = False,
+        limits: Optional[ResourceLimits] = None, dedup: bool = False,
+        unity: bool = False, compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE
+) -> Iterator[Tuple[Path, RunResult]]:
+    """Runs the programs in a folder on the workers of a coordinator.
+
+    The sources of every program are queued as jobs for workers started with
+    work_programs and the results are merged here in the order they finish.
+    A program that failed on max_attempts workers has no compile result and
+    is recorded in store with the errors of each attempt.
+
+    args:
+        coordinator: A proxy of a coordinator from start_coordinator.
+        batch_path: The path to a directory that contains subdirectories that
+            contains program code.
+        index: An index of parsed source files used to load the programs
+            here once their results arrive.
+        The other arguments are the same as batch_run_programs. Compile
+            caches, precompiled headers and build directories are chosen by
+            each worker.
+    returns:
+        Returns the results of the programs in the order they finish.
+    """
+    programs, fingerprints = find_programs(
+        batch_path, store=store, resume=resume, program_input=program_input,
+        test_cases=test_cases, timeout=timeout, output_limit=output_limit,
+        backend=backend, limits=limits, compare=compare, tolerance=tolerance
+    )
+    duplicates = {}
+    if dedup:
+        duplicates = group_duplicates(programs)
+        programs = {path: programs[path] for path in duplicates}
+    coordinator.configure({
+        "program_input": program_input, "backend": backend,
+        "test_cases": test_cases, "timeout": timeout,
+        "output_limit": output_limit, "limits": limits, "unity": unity,
+        "compare": compare, "tolerance": tolerance
+    })
+    jobs = {
+        coordinator.add_job(
+            program_path.name, pack_program(program_path, source_paths)
+        ): program_path
+        for program_path, source_paths in programs.items()
+    }
+    coordinator.close()
+    while jobs:
+        job_result = coordinator.next_result()
+        if job_result is None:
+            continue
+        program_path = jobs.pop(job_result.job_id)
+        program = load_program(
+            program_path, index=index, source_paths=programs[program_path]
+        )
+        extra = {}
+        if job_result.result is None:
+            run_result: RunResult = (program, None, None)
+            extra["errors"] = job_result.errors
+        else:
+            run_result = (program, *job_result.result)
+        yield from fan_out(
+            program_path, run_result, duplicates.get(program_path, []),
+            store, fingerprints, **extra
         )
 
 
-def display(results: List[Tuple[Path, RunResult]]):
+def work_programs(
+        address: Address, authkey: bytes, work_path: PathLike,
+        jobs: Optional[int] = None, cache: Optional[CompileCache] = None,
+        case_workers: Optional[int] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        build_dir: Optional[PathLike] = None,
+        object_cache: Optional[ObjectCache] = None,
+        retry_timeout: float = 0) -> int:
+    """Runs programs for a coordinator until it has no more.
+
+    args:
+        address: The host and port of the coordinator.
+        authkey: The key the coordinator was started with.
+        work_path: The directory to write the programs into.
+        jobs: The number of programs to run at once. Defaults to the number
+            of cores.
+        cache: A cache of compiled programs on this host.
+        case_workers: The number of test cases of a program to run at once.
+        pch: A precompiled header that is built before the first program.
+        build_dir: A directory to keep each program's build files in. See
+            compile_program.
+        object_cache: A cache of compiled translation units on this host.
+        retry_timeout: The number of seconds to wait for the coordinator to
+            start.
+    returns:
+        The number of programs that were run.
+    """
+    if pch is not None:
+        pch.build()
+    return run_worker(
+        address, authkey,
+        partial(
+            run_job, cache=cache, case_workers=case_workers, pch=pch,
+            build_dir=build_dir, object_cache=object_cache
+        ),
+        work_path, jobs=jobs or os.cpu_count() or 1,
+        retry_timeout=retry_timeout
+    )
+
+
+def display(results: Iterable[Tuple[Path, RunResult]]):
     """Displays the results of compiling and running the programs.
 
     args:
@@ -105,35 +1164,351 @@ def display(results: List[Tuple[Path, RunResult]]):
             programs.
     """
     print("-"*80)
-    for prog_path, (program, compile_result, execute_result) in results:
-        print("Path:", prog_path)
-        print("Entry Point:", program.entry_point)
-        if compile_result is not None:
-            print("Compiling...")
-            print("STDOUT")
-            print(compile_result.stdout)
-            print("STDERR")
-            print(compile_result.stderr)
-        if execute_result is not None:
-            print("Executing...")
+    for prog_path, run_result in results:
+        display_result(prog_path, run_result)
+    print("-"*80)
+
+
+def display_result(prog_path: Path, run_result: RunResult):
+    """Displays the result of compiling and running one program.
+
+    args:
+        prog_path: The path to the program.
+        run_result: The result of compiling and running the program.
+    """
+    program, compile_result, execute_result = run_result
+    print("Path:", prog_path)
+    print("Entry Point:", program.entry_point)
+    if compile_result is not None:
+        print("Compiling...")
+        if compile_result.mode != "per_file":
+            print("Mode:", compile_result.mode)
+        display_metrics(compile_result.metrics)
+        print("STDOUT")
+        print(compile_result.stdout)
+        print("STDERR")
+        print(compile_result.stderr)
+    if isinstance(execute_result, list):
+        display_cases(execute_result)
+    elif execute_result is not None:
+        print("Executing...")
+        display_limits(execute_result)
+        display_metrics(execute_result.metrics)
+        print("STDOUT:")
+        print(execute_result.stdout)
+        print("STDERR")
+        print(execute_result.stderr)
+    # for source_file in program.source_files:
+    #    print(source_file.functions)
+    print("*"*80)
+
+
+def display_limits(execute_result: ExecuteResult):
+    """Displays whether a program was stopped by a limit."""
+    if execute_result.timed_out:
+        print("Timed out.")
+    if execute_result.truncated:
+        print("Output truncated.")
+    if execute_result.limit_hit is not None:
+        print("Limit hit:", execute_result.limit_hit)
+
+
+def display_verdict(verdict: Optional[Verdict]):
+    """Displays where a program's output stopped matching, if it did."""
+    if verdict is not None and not verdict.passed:
+        unit = "token" if verdict.mode in ("whitespace", "numeric") else "line"
+        print(
+            f"Mismatch at {unit} {verdict.position}: {verdict.message}, "
+            f"expected {verdict.expected!r}, got {verdict.actual!r}"
+        )
+
+
+def display_metrics(metrics: Optional[PhaseMetrics]):
+    """Displays the time and memory a phase used if it was measured."""
+    if metrics is None:
+        return
+    parts = [f"Time: {metrics.wall:.3f}s wall"]
+    if metrics.user is not None and metrics.sys is not None:
+        parts.append(f"{metrics.user:.3f}s user, {metrics.sys:.3f}s sys")
+    if metrics.overhead is not None:
+        parts.append(f"{metrics.overhead:.3f}s build tool")
+    if metrics.max_rss is not None:
+        parts.append(f"Memory: {metrics.max_rss} KB")
+    print(", ".join(parts))
+
+
+def display_summary(
+        phases: Mapping[str, Sequence[Tuple[Path, PhaseMetrics]]],
+        slowest: int = 3):
+    """Displays percentiles of the metrics of each phase of a batch.
+
+    Values that weren't measured, such as the cpu times of processes
+    reaped by an event loop, are left out of their column.
+
+    args:
+        phases: A map from the name of a phase to the path and metrics of
+            each program that went through it.
+        slowest: The number of slowest programs to list for each phase.
+    """
+    for name, measured in phases.items():
+        if not measured:
+            continue
+        print(f"{name} ({len(measured)} measured):")
+        columns = {
+            "wall (s)": [metrics.wall for _, metrics in measured],
+            "cpu (s)": [
+                metrics.user + metrics.sys for _, metrics in measured
+                if metrics.user is not None and metrics.sys is not None
+            ],
+            "max rss (KB)": [
+                metrics.max_rss for _, metrics in measured
+                if metrics.max_rss is not None
+            ],
+        }
+        for column, values in columns.items():
+            if not values:
+                continue
+            print(
+                f"  {column:<13}"
+                + "".join(
+                    f" p{q}={percentile(values, q):<10.6g}"
+                    for q in (50, 90, 99)
+                )
+                + f" max={max(values):.6g}"
+            )
+        ordered = sorted(measured, key=lambda item: item[1].wall)
+        for path, metrics in reversed(ordered[-slowest:]):
+            print(f"  slow: {metrics.wall:.3f}s {path}")
+
+
+def display_cases(case_results: List[CaseResult]):
+    """Displays the results of running a program against test cases.
+
+    args:
+        case_results: The results of each test case.
+    """
+    passed = sum(1 for case_result in case_results if case_result.passed)
+    print(f"Test Cases: {passed}/{len(case_results)} passed")
+    for case, execute_result, case_passed in case_results:
+        print(f"Case {case.name}:", "PASS" if case_passed else "FAIL")
+        display_limits(execute_result)
+        display_verdict(execute_result.verdict)
+        display_metrics(execute_result.metrics)
+        if not case_passed:
             print("STDOUT:")
             print(execute_result.stdout)
             print("STDERR")
             print(execute_result.stderr)
-        # for source_file in program.source_files:
-        #    print(source_file.functions)
-        print("*"*80)
-    print("-"*80)
+
+
+def display_duplicates(groups: Mapping[Path, Sequence[Path]]):
+    """Displays the groups of programs with identical sources.
+
+    args:
+        groups: A map from the first program of each group to the rest of
+            the group as returned by group_duplicates.
+    """
+    duplicated = {
+        first: rest for first, rest in groups.items() if rest
+    }
+    print(
+        f"Duplicates: {len(duplicated)} groups of "
+        f"{sum(len(rest) + 1 for rest in duplicated.values())} programs"
+    )
+    for first, rest in duplicated.items():
+        print(f"  {first.name}: {', '.join(path.name for path in rest)}")
+
+
+def display_cache_stats(cache: CompileCache, hits: int, lookups: int):
+    """Displays how many programs were found in the compile cache.
+
+    The hits are counted from the results since concurrent runs look up the
+    cache in other processes.
+
+    args:
+        cache: The cache used to compile the programs.
+        hits: The number of compile results that came from the cache.
+        lookups: The number of compile results.
+    """
+    stats = cache.stats()
+    print(
+        f"Compile Cache: {hits} hits, {lookups - hits} misses, "
+        f"{stats.entries} entries, {stats.size} bytes"
+    )
+
+
+def display_object_cache_stats(before: CacheStats, after: CacheStats):
+    """Displays how many translation units were found in the object cache.
+
+    args:
+        before: The stats of the object cache before the programs ran.
+        after: The stats of the object cache after the programs ran.
+    """
+    hits = after.hits - before.hits
+    lookups = hits + after.misses - before.misses
+    hit_rate = hits / lookups if lookups else 0.0
+    print(
+        f"Object Cache: {hits} hits, {lookups - hits} misses, "
+        f"{hit_rate:.1%} hit rate, {after.entries} entries, "
+        f"{after.size} bytes"
+    )
 
 
 def main():
     args = get_args()
-    with tqdm(batch_run_programs(
-            args.program_path, program_input=args.program_input,
-            use_container=args.use_container, concurrent=args.concurrent
-    )) as batches:
-        program_results = list(batches)
-    display(program_results)
+    cache = test_cases = object_cache = None
+    if args.test_cases is not None:
+        test_cases = load_test_cases(args.test_cases)
+    if args.cache_dir is not None:
+        cache = CompileCache(args.cache_dir, max_size=args.cache_size)
+    if args.object_cache_dir is not None:
+        object_cache = ObjectCache(
+            args.object_cache_dir, max_size=args.object_cache_size
+        )
+        object_stats = object_cache.stats()
+    pch = store = None
+    if args.pch_dir is not None:
+        pch = PrecompiledHeader(args.pch_dir, headers=args.pch_headers)
+    if args.results is not None:
+        store = ResultStore(args.results)
+    if args.worker is not None:
+        args.program_path.mkdir(parents=True, exist_ok=True)
+        count = work_programs(
+            args.worker, args.authkey.encode(), args.program_path,
+            jobs=args.worker_jobs, cache=cache,
+            case_workers=args.case_workers, pch=pch,
+            build_dir=args.build_dir, object_cache=object_cache,
+            retry_timeout=args.lease_timeout
+        )
+        print(f"Ran {count} programs.")
+        if object_cache is not None:
+            display_object_cache_stats(object_stats, object_cache.stats())
+        return
+    program_folders = get_program_folders(args.program_path)
+    limits = ResourceLimits(
+        cpu_time=args.cpu_limit, memory=args.memory_limit,
+        file_size=args.file_size_limit, processes=args.process_limit,
+        open_files=args.open_files_limit
+    )
+    if limits == ResourceLimits():
+        limits = None
+    hits = lookups = count = 0
+    phases: Dict[str, List[Tuple[Path, PhaseMetrics]]] = {
+        "Discovery": [], "Parse": [], "SCons startup": [], "Compile": [],
+        "Execute": []
+    }
+    timings: Dict[str, PhaseMetrics] = {}
+    if not args.quiet:
+        print("-"*80)
+    with ExitStack() as stack:
+        pool = None
+        if args.pool_size is not None:
+            pool = stack.enter_context(ContainerPool(
+                args.program_path, size=args.pool_size,
+                max_jobs=args.max_jobs
+            ))
+        index = None if args.index is None else ParseIndex(args.index)
+        if args.serve is not None:
+            manager = stack.enter_context(start_coordinator(
+                args.serve, args.authkey.encode(),
+                lease_timeout=args.lease_timeout,
+                max_attempts=args.max_attempts
+            ))
+            print("Serving on {}:{}".format(*manager.address))
+            results = serve_programs(
+                manager.coordinator(), args.program_path,
+                program_input=args.program_input, backend=args.backend,
+                test_cases=test_cases, timeout=args.timeout,
+                output_limit=args.output_limit, index=index, store=store,
+                resume=args.resume, limits=limits, dedup=args.dedup,
+                unity=args.unity, compare=args.compare,
+                tolerance=args.tolerance
+            )
+        else:
+            run_batch = batch_run_programs
+            if args.watch:
+                run_batch = partial(
+                    watch_programs, debounce_time=args.debounce,
+                    polling=args.poll, poll_interval=args.poll_interval
+                )
+            results = run_batch(
+                args.program_path, program_input=args.program_input,
+                use_container=args.use_container, concurrent=args.concurrent,
+                cache=cache, backend=args.backend, test_cases=test_cases,
+                case_workers=args.case_workers, timeout=args.timeout,
+                output_limit=args.output_limit, pool=pool,
+                compile_workers=args.compile_workers,
+                execute_workers=args.execute_workers, index=index,
+                pch=pch, build_dir=args.build_dir, store=store,
+                resume=args.resume, limits=limits, dedup=args.dedup,
+                unity=args.unity, compare=args.compare,
+                tolerance=args.tolerance, object_cache=object_cache,
+                timings=timings
+            )
+        batches = stack.enter_context(tqdm(
+            results,
+            total=None if args.resume or args.watch else len(program_folders)
+        ))
+        try:
+            for prog_path, run_result in batches:
+                count += 1
+                _, compile_result, execute_result = run_result
+                if compile_result is not None:
+                    lookups += 1
+                    hits += compile_result.cached
+                    metrics = compile_result.metrics
+                    if compile_result.parse_metrics is not None:
+                        phases["Parse"].append(
+                            (prog_path, compile_result.parse_metrics)
+                        )
+                    if metrics is not None and metrics.overhead is not None:
+                        phases["SCons startup"].append(
+                            (prog_path, PhaseMetrics(metrics.overhead))
+                        )
+                    if metrics is not None:
+                        phases["Compile"].append((prog_path, metrics))
+                if not isinstance(execute_result, list):
+                    execute_result = [CaseResult(None, execute_result, None)]
+                phases["Execute"].extend(
+                    (prog_path, case_result.execute_result.metrics)
+                    for case_result in execute_result
+                    if case_result.execute_result is not None
+                    and case_result.execute_result.metrics is not None
+                )
+                if not args.quiet:
+                    with tqdm.external_write_mode():
+                        display_result(prog_path, run_result)
+        except KeyboardInterrupt:
+            # Watching only stops when it is interrupted.
+            if not args.watch:
+                raise
+    if not args.quiet:
+        print("-"*80)
+    if "Discovery" in timings:
+        phases["Discovery"].append(
+            (args.program_path, timings["Discovery"])
+        )
+    display_summary(phases)
+    if args.dedup:
+        display_duplicates(group_duplicates(discover_many(
+            program_folders, CppProgram().get_extensions()
+        )))
+    if args.resume and not args.watch:
+        print(f"Skipped {len(program_folders) - count} unchanged programs.")
+    if store is not None:
+        latest = store.latest()
+        lines = [
+            latest[str(path.resolve())] for path in program_folders
+            if str(path.resolve()) in latest
+        ]
+        print(
+            f"Results: {sum(map(passed, lines))}/{len(lines)} passed, "
+            f"stored in {args.results}"
+        )
+    if cache is not None:
+        display_cache_stats(cache, hits, lookups)
+    if object_cache is not None:
+        display_object_cache_stats(object_stats, object_cache.stats())
 
 
 if __name__ == "__main__":
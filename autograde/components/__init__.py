@@ -1,3 +1,4 @@
 
 from autograde.components.program import Program, Source
-from autograde.components.cpp_components import CppProgram
+from autograde.components.cpp_components import CppProgram, CppSource
+from autograde.components.index import ParseIndex
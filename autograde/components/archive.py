@@ -0,0 +1,250 @@
+"""Module that reads programs straight from zip and tar archives.
+
+A file inside of an archive is named by a path inside of the archive's path,
+for example batch/alice.zip/src/main.cpp, so archived sources can be
+discovered, parsed and hashed like any other source without extracting the
+archive. Only the files a build needs are extracted, see extract_program.
+"""
+
+import io
+import os
+import re
+import json
+import tarfile
+import zipfile
+import posixpath
+import threading
+from functools import lru_cache
+from pathlib import Path
+from os import PathLike
+from typing import (
+    BinaryIO, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+)
+
+if TYPE_CHECKING:
+    from autograde.components.program import Program
+
+ARCHIVE_SUFFIXES = (
+    ".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz"
+)
+INCLUDE_PATTERN = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*"([^"\n]+)"', re.M)
+MANIFEST_NAME = ".archive_files.json"
+
+
+def is_archive(path: PathLike) -> bool:
+    """Returns True if a path is named like a supported archive."""
+    return os.fspath(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def split_archive_path(path: PathLike) -> Optional[Tuple[Path, str]]:
+    """Splits the path of a file inside of an archive.
+
+    returns:
+        The path to the archive and the name of the file in it or None if
+            the path isn't inside of an archive.
+    """
+    path = Path(path)
+    for parent in path.parents:
+        if is_archive(parent.name) and parent.is_file():
+            return parent, path.relative_to(parent).as_posix()
+    return None
+
+
+def safe_name(name: str) -> Optional[str]:
+    """Returns a member name relative to the archive's root or None.
+
+    Names that are absolute or climb out of the archive are unsafe.
+    """
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if name in ("", ".") or name.split("/")[0] == "..":
+        return None
+    return name
+
+
+class SubmissionArchive(object):
+    """The index of a zip or tar archive and the files in it.
+
+    Only the index is read when the archive is opened. Reading a tar's index
+    decompresses the whole stream once since tars have no central directory.
+    Reads are serialized since archive handles can't be read from many
+    threads at once.
+
+    attributes:
+        path: The path to the archive.
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._members: Dict[str, object] = {}
+        if zipfile.is_zipfile(self.path):
+            self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(self.path)
+            self._tar: Optional[tarfile.TarFile] = None
+            for info in self._zip.infolist():
+                name = safe_name(info.filename)
+                if name is not None and not info.is_dir():
+                    self._members[name] = info
+        else:
+            self._zip = None
+            self._tar = tarfile.open(self.path, "r:*")
+            for member in self._tar.getmembers():
+                name = safe_name(member.name)
+                if name is not None and member.isfile():
+                    self._members[name] = member
+
+    def names(self) -> List[str]:
+        """Returns the names of the regular files in the archive."""
+        return list(self._members)
+
+    def read(self, name: str) -> bytes:
+        """Returns the content of a file in the archive.
+
+        raises:
+            FileNotFoundError: If the archive has no file with the name.
+        """
+        if name not in self._members:
+            raise FileNotFoundError(f"{name} isn't in {self.path}")
+        with self._lock:
+            if self._zip is not None:
+                return self._zip.read(self._members[name])
+            with self._tar.extractfile(self._members[name]) as member:
+                return member.read()
+
+    def close(self):
+        """Closes the archive."""
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+
+@lru_cache(maxsize=16)
+def _open_archive(
+        path: Path, mtime_ns: int, size: int, pid: int) -> SubmissionArchive:
+    """Opens an archive once per version and process."""
+    return SubmissionArchive(path)
+
+
+def open_archive(path: PathLike) -> SubmissionArchive:
+    """Returns the opened archive at path.
+
+    Archives are kept open while they are unchanged so that discovering,
+    parsing and extracting a program read the index once. Processes don't
+    share handles since forked processes would share the file offsets.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    return _open_archive(path, stat.st_mtime_ns, stat.st_size, os.getpid())
+
+
+def open_source(path: PathLike) -> BinaryIO:
+    """Opens a source file, which may be inside of an archive, for reading."""
+    archived = split_archive_path(path)
+    if archived is None:
+        return open(path, "rb")
+    archive_path, name = archived
+    return io.BytesIO(open_archive(archive_path).read(name))
+
+
+def find_includes(
+        name: str, content: bytes, names: Iterable[str]) -> List[str]:
+    """Returns the files of an archive that a file includes with quotes.
+
+    Quoted includes are resolved relative to the including file like the
+    compiler resolves them.
+
+    args:
+        name: The name of the including file in the archive.
+        content: The content of the including file.
+        names: The names of the files in the archive.
+    """
+    names = set(names)
+    includes = []
+    for include in INCLUDE_PATTERN.findall(content):
+        included = safe_name(posixpath.join(
+            posixpath.dirname(name), os.fsdecode(include)
+        ))
+        if included in names:
+            includes.append(included)
+    return includes
+
+
+def write_files(files: Dict[str, bytes], target_path: Path):
+    """Writes files into target_path and removes ones written before.
+
+    A file whose content is unchanged isn't rewritten so builds that check
+    timestamps don't rebuild it. The names that were written are kept in a
+    manifest so the files a resubmission dropped are removed.
+    """
+    manifest_path = target_path / MANIFEST_NAME
+    try:
+        with manifest_path.open("rt") as manifest:
+            previous = json.load(manifest)
+    except (OSError, ValueError):
+        previous = []
+    for name in set(previous) - set(files):
+        try:
+            (target_path / name).unlink()
+        except OSError:
+            pass
+    for name, content in files.items():
+        file_path = target_path / name
+        try:
+            if file_path.read_bytes() == content:
+                continue
+        except OSError:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    with manifest_path.open("wt") as manifest:
+        json.dump(sorted(files), manifest)
+
+
+def extract_program(program: "Program", target_path: PathLike) -> "Program":
+    """Returns a copy of an archived program with its build files extracted.
+
+    Only the program's source files and the files of the archive that they
+    include with quotes, directly or through other includes, are written to
+    target_path in the archive's layout. Everything else in the archive is
+    never read.
+
+    args:
+        program: A program whose sources are inside of an archive.
+        target_path: The directory to extract the files into.
+    returns:
+        A program of the same type made of the extracted sources. A program
+            without archived sources is returned as it is.
+    """
+    archived = {
+        source_file: split_archive_path(source_file.path)
+        for source_file in program.source_files
+    }
+    if not any(archived.values()):
+        return program
+    target_path = Path(target_path)
+    target_path.mkdir(parents=True, exist_ok=True)
+    files: Dict[str, bytes] = {}
+    pending = [split for split in archived.values() if split is not None]
+    while pending:
+        archive_path, name = pending.pop()
+        if name in files:
+            continue
+        archive = open_archive(archive_path)
+        files[name] = archive.read(name)
+        pending.extend(
+            (archive_path, included) for included in find_includes(
+                name, files[name], archive.names()
+            )
+        )
+    write_files(files, target_path)
+    extracted = type(program)(target_path, index=program.index)
+    extracted.collect_source(
+        source_file.path if split is None else target_path / split[1]
+        for source_file, split in archived.items()
+    )
+    if program.entry_point is not None:
+        split = split_archive_path(program.entry_point.path)
+        extracted.set_entry_point(
+            program.entry_point.path if split is None
+            else target_path / split[1]
+        )
+    return extracted
@@ -1,13 +1,256 @@
 """Module which contains the components that represent a cpp program."""
 
+import io
 import re
+import mmap
 from os import PathLike
-from typing import List, Tuple, Union, Optional
+from typing import (
+    List, Pattern, Sequence, Tuple, Union, Optional, TYPE_CHECKING
+)
 
+from autograde.components.archive import open_source, split_archive_path
 from autograde.components.program import Program, Source
 
+if TYPE_CHECKING:
+    from autograde.components.index import ParseIndex
 
-def get_functions(source_code: str) -> List[Tuple[str, str, Tuple[str, ...]]]:
+
+Function = Tuple[str, str, Tuple[str, ...]]
+
+TOKEN_PATTERN = re.compile(
+    r'(?P<space>\s+)'
+    r'|(?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))'
+    r'|(?P<preprocessor>\#(?:\\\n|//[^\n]*|/\*.*?(?:\*/|\Z)'
+    r'|"(?:\\.|[^"\\\n])*"|[^\n])*)'
+    r'|(?P<string>(?:u8|[uUL])?R"(?P<delim>[^()\\\s]{0,16})\(.*?\)(?P=delim)"'
+    r'|(?:u8|[uUL])?"(?:\\.|[^"\\\n])*"'
+    r"|(?:u8|[uUL])?'(?:\\.|[^'\\\n])*')"
+    r'|(?P<word>[A-Za-z_]\w*|\d[\w.\']*)'
+    r'|(?P<punct>::|->|&&|>>|.)',
+    flags=re.DOTALL
+)
+SCOPE_KEYWORDS = {"namespace", "class", "struct", "union"}
+ACCESS_KEYWORDS = {"public", "private", "protected"}
+DECLARATION_SKIP = re.compile(r'[^{};"\'/#]*')
+BODY_SKIP = re.compile(r'[^{}"\'/#]*')
+MAIN_PATTERN = re.compile(rb'\bmain\b')
+
+
+def _join_tokens(
+        source_code: str, tokens: List[Tuple[str, str, int, int]]) -> str:
+    """Returns the text of tokens separated as they are in the source.
+
+    Whitespace and comments between two tokens become a single space.
+    """
+    parts = []
+    for i, (_, text, start, _) in enumerate(tokens):
+        if i > 0 and tokens[i - 1][3] != start:
+            parts.append(" ")
+        parts.append(text)
+    return "".join(parts)
+
+
+def _split_arguments(
+        source_code: str, tokens: List[Tuple[str, str, int, int]]
+) -> Tuple[str, ...]:
+    """Splits the tokens of a parameter list at its top level commas."""
+    args = []
+    current: List[Tuple[str, str, int, int]] = []
+    depth = 0
+    for token in tokens:
+        text = token[1]
+        if text in "([{<":
+            depth += 1
+        elif text in ")]}>":
+            depth = max(depth - 1, 0)
+        elif text == ">>":
+            depth = max(depth - 2, 0)
+        elif text == "," and depth == 0:
+            args.append(_join_tokens(source_code, current))
+            current = []
+            continue
+        current.append(token)
+    args.append(_join_tokens(source_code, current))
+    return tuple(arg for arg in args if arg)
+
+
+def _parse_function(
+        source_code: str, statement: List[Tuple[str, str, int, int]]
+) -> Optional[Function]:
+    """Returns the signature of a function definition or None.
+
+    Constructors and destructors have no return type so they are None like
+    any other definition without one.
+
+    args:
+        source_code: The source code the tokens come from.
+        statement: The tokens from the start of a declaration up to the
+            opening brace of its body.
+    """
+    if statement and statement[0][1] == "template":
+        angle_depth = 0
+        for i, (_, text, _, _) in enumerate(statement):
+            angle_depth += {"<": 1, ">": -1, ">>": -2}.get(text, 0)
+            if i > 0 and angle_depth <= 0:
+                statement = statement[i + 1:]
+                break
+    angle_depth = 0
+    open_index = None
+    for i, (kind, text, _, _) in enumerate(statement):
+        if text == "<" and i > 0 and statement[i - 1][0] == "word":
+            angle_depth += 1
+        elif text in (">", ">>") and angle_depth:
+            angle_depth = max(angle_depth - len(text), 0)
+        elif text == "(" and angle_depth == 0:
+            open_index = i
+            break
+    if open_index is None:
+        return None
+    name_start = open_index - 1
+    while name_start >= 0 and statement[name_start][0] == "punct":
+        name_start -= 1
+    if name_start < 0 or statement[name_start][0] != "word":
+        return None
+    if name_start != open_index - 1 and statement[name_start][1] != "operator":
+        return None
+    while (name_start >= 2 and statement[name_start - 1][1] == "::"
+           and statement[name_start - 2][0] == "word"):
+        name_start -= 2
+    return_type = statement[:name_start]
+    if not return_type or return_type[-1][1] == "~" or any(
+            token[1] in ("=", "(", ")") for token in return_type):
+        return None
+    depth = 0
+    close_index = None
+    for i in range(open_index, len(statement)):
+        text = statement[i][1]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if depth == 0:
+                close_index = i
+                break
+    if close_index is None:
+        return None
+    return (
+        _join_tokens(source_code, return_type),
+        _join_tokens(source_code, statement[name_start:open_index]),
+        _split_arguments(source_code, statement[open_index + 1:close_index])
+    )
+
+
+def _skip_to_code(
+        source_code: str, pos: int, skip_pattern: Pattern,
+        comments: List[str]) -> int:
+    """Returns the position of the next character skip_pattern stops at.
+
+    Runs of characters matched by skip_pattern are skipped in bulk. Comments,
+    literals and preprocessor directives are skipped whole so that braces
+    and semicolons inside of them are ignored. The comments of a directive
+    are still appended to comments.
+
+    args:
+        source_code: Source code that is compliant with C++ standard.
+        pos: The position to start at.
+        skip_pattern: Matches the characters that can be skipped.
+        comments: A list that skipped comments are appended to.
+    returns:
+        The position of a character that isn't skipped or the end of the
+            source code.
+    """
+    end = len(source_code)
+    while True:
+        pos = skip_pattern.match(source_code, pos).end()
+        if pos >= end or source_code[pos] in "{};":
+            return pos
+        if source_code[pos] == '"' and source_code[pos - 1:pos] == "R":
+            match = TOKEN_PATTERN.match(source_code, pos - 1)
+        else:
+            match = TOKEN_PATTERN.match(source_code, pos)
+        if match.lastgroup == "comment":
+            comments.append(match.group(0).strip())
+        elif match.lastgroup == "preprocessor":
+            comments.extend(
+                token.group(0).strip()
+                for token in TOKEN_PATTERN.finditer(
+                    source_code, match.start() + 1, match.end()
+                )
+                if token.lastgroup == "comment"
+            )
+        if match.lastgroup in ("comment", "string", "preprocessor"):
+            pos = max(match.end(), pos + 1)
+        else:
+            pos += 1
+
+
+def _tokenize_statement(
+        source_code: str, start: int, end: int
+) -> List[Tuple[str, str, int, int]]:
+    """Returns the code tokens of a declaration between start and end.
+
+    A leading access specifier such as "public:" is dropped.
+    """
+    statement = [
+        (match.lastgroup, match.group(0), match.start(), match.end())
+        for match in TOKEN_PATTERN.finditer(source_code, start, end)
+        if match.lastgroup not in ("space", "comment", "preprocessor")
+    ]
+    while (len(statement) >= 2 and statement[0][1] in ACCESS_KEYWORDS
+           and statement[1][1] == ":"):
+        statement = statement[2:]
+    return statement
+
+
+def scan_source(source_code: str) -> Tuple[List[Function], List[str]]:
+    """Gets the functions and comments from source code in one pass.
+
+    Only declarations that end in an opening brace are tokenized. Bodies of
+    functions are skipped by tracking brace depth so that only definitions at
+    namespace or class scope are reported.
+
+    args:
+        source_code: Source code that is compliant with C++ standard.
+    returns:
+        A list of functions and a list of comments extracted from the source
+            code.
+    """
+    functions: List[Function] = []
+    comments: List[str] = []
+    end = len(source_code)
+    pos = statement_start = 0
+    while True:
+        pos = _skip_to_code(source_code, pos, DECLARATION_SKIP, comments)
+        if pos >= end:
+            break
+        if source_code[pos] != "{":
+            pos = statement_start = pos + 1
+            continue
+        statement = _tokenize_statement(source_code, statement_start, pos)
+        pos += 1
+        first_word = next(
+            (t[1] for t in statement if t[1] != "template"), None
+        )
+        is_scope = (
+            (first_word in SCOPE_KEYWORDS
+             and not any(t[1] == "(" for t in statement))
+            or (first_word == "extern" and len(statement) == 2)
+        )
+        if not is_scope:
+            function = _parse_function(source_code, statement)
+            if function is not None:
+                functions.append(function)
+            depth = 1
+            while depth and pos < end:
+                pos = _skip_to_code(source_code, pos, BODY_SKIP, comments)
+                if pos < end:
+                    depth += {"{": 1, "}": -1}.get(source_code[pos], 0)
+                    pos += 1
+        statement_start = pos
+    return functions, comments
+
+
+def get_functions(source_code: str) -> List[Function]:
     """Gets the functions from source code.
 
     args:
@@ -15,21 +258,7 @@ def get_functions(source_code: str) -> List[Tuple[str, str, Tuple[str, ...]]]:
     returns:
         A list of functions extracted from the source code.
     """
-    function_pattern = re.compile(
-        r'([a-z|A-Z][a-z|A-Z|0-9|_|<|>|\*]+?)\s+' # Represents the return type
-        r'([a-z|A-Z][a-z|A-Z|0-9|_]*?)\s*'  # Represents the function name
-        r'\((.*?)\)'  # represents the function arguments
-        r'\s*{.*?}',  # Represents the body of the function
-        flags=re.DOTALL
-    )
-    functions = []
-    for match in function_pattern.finditer(source_code):
-        return_type, name, args = match.group(1, 2, 3)
-        args_tuple: Tuple[str, ...] = tuple(
-            [arg.strip() for arg in args.split(',') if arg]
-        )
-        functions.append((return_type, name, args_tuple))
-    return functions
+    return scan_source(source_code)[0]
 
 
 def get_comments(source_code: str) -> List[str]:
@@ -40,15 +269,34 @@ def get_comments(source_code: str) -> List[str]:
     returns:
         A list for comments extracted from the source code.
     """
-    comment_pattern = re.compile(
-        r'(//.*?\n|/\*.*?\*/)',
-        flags=re.DOTALL
+    return scan_source(source_code)[1]
+
+
+def has_main(functions: Sequence[Function]) -> bool:
+    """Returns True if one of the functions is the main function."""
+    return any(
+        return_type == 'int' and name == 'main'
+        for return_type, name, _ in functions
     )
-    comments = [
-        match.group(0).strip()
-        for match in comment_pattern.finditer(source_code)
-    ]
-    return comments
+
+
+def may_define_main(path: PathLike) -> bool:
+    """Returns False if a file can't contain a main function.
+
+    The file is memory mapped and searched for the word main without being
+    decoded or parsed. A True result only means that the file is worth
+    parsing. A file inside of an archive is searched in memory.
+    """
+    if split_archive_path(path) is not None:
+        with open_source(path) as source:
+            return MAIN_PATTERN.search(source.read()) is not None
+    with open(path, 'rb') as source:
+        try:
+            with mmap.mmap(
+                    source.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                return MAIN_PATTERN.search(content) is not None
+        except ValueError:
+            return False
 
 
 class CppSource(Source):
@@ -60,17 +308,40 @@ class CppSource(Source):
         _comments: A sequence of comments extracted from the source code.
     """
 
-    def __init__(self, *path_to_source: Union[str, PathLike]):
-        super().__init__(*path_to_source)
-        self._functions: Optional[Tuple[str, str, Tuple[str, ...]]] = None
+    def __init__(
+            self, *path_to_source: Union[str, PathLike],
+            index: Optional["ParseIndex"] = None):
+        super().__init__(*path_to_source, index=index)
+        self._functions: Optional[Tuple[Function, ...]] = None
         self._comments: Optional[Tuple[str]] = None
+        self._is_entry_point: Optional[bool] = None
 
     def load(self):
-        """Reads the source file and extracts all the information needed."""
-        with self.path.open('rt') as cpp_source:
-            code = ''.join(cpp_source)
-            self._functions = tuple(get_functions(code))
-            self._comments = tuple(get_comments(code))
+        """Reads the source file and extracts all the information needed.
+
+        If the source has an index and the file hasn't changed since it was
+        indexed then the file isn't parsed at all. Files inside of archives
+        are read from the archive and aren't indexed.
+        """
+        index = self.index
+        if index is not None and split_archive_path(self.path) is not None:
+            index = None
+        if index is not None:
+            entry = index.lookup(self.path)
+            if entry is not None:
+                self._functions, self._comments, self._is_entry_point = entry
+                return
+        with io.TextIOWrapper(open_source(self.path)) as cpp_source:
+            code = cpp_source.read()
+        functions, comments = scan_source(code)
+        self._functions = tuple(functions)
+        self._comments = tuple(comments)
+        self._is_entry_point = has_main(self._functions)
+        if index is not None:
+            index.store(
+                self.path, self._functions, self._comments,
+                self._is_entry_point
+            )
 
     @property
     def functions(self):
@@ -87,11 +358,17 @@ class CppSource(Source):
         return self._comments
 
     def is_entry_point(self) -> bool:
-        """See base class."""
-        for return_type, name, _ in self.functions:
-            if return_type == 'int' and name == 'main':
-                return True
-        return False
+        """See base class.
+
+        Files that don't mention main anywhere are ruled out without being
+        parsed so their functions and comments stay unloaded.
+        """
+        if self._is_entry_point is None:
+            if may_define_main(self.path):
+                self.load()
+            else:
+                self._is_entry_point = False
+        return self._is_entry_point
 
 
 class CppProgram(Program):
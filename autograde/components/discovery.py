@@ -0,0 +1,91 @@
+"""Module that contains functions for finding source files on disk."""
+
+import os
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from os import PathLike
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from autograde.components.archive import is_archive, open_archive
+
+DEFAULT_IGNORE = (
+    ".*", "node_modules", "__pycache__", "build", "cmake-build-*", "*.dSYM"
+)
+
+
+def is_ignored(name: str, ignore: Sequence[str]) -> bool:
+    """Returns True if a file or directory name matches an ignore pattern."""
+    return any(fnmatch(name, pattern) for pattern in ignore)
+
+
+def discover_sources(
+        root: PathLike, extensions: Sequence[str],
+        ignore: Sequence[str] = DEFAULT_IGNORE) -> List[Path]:
+    """Finds every file under root that ends in one of the extensions.
+
+    The tree is walked once with os.scandir for all of the extensions.
+    Directories and files whose names match an ignore pattern are skipped and
+    symbolic links to directories aren't followed. If root is a zip or tar
+    archive then its index is searched instead and the files are named by
+    their paths inside of root, see autograde.components.archive.
+
+    args:
+        root: The directory or archive to search.
+        extensions: The extensions of the files to find such as ".cpp".
+        ignore: Glob patterns of names to skip.
+    returns:
+        A sorted list of the paths of the files found.
+    """
+    extensions = tuple(extensions)
+    if is_archive(root) and os.path.isfile(root):
+        return sorted(
+            Path(root, name) for name in open_archive(root).names()
+            if name.endswith(extensions) and not any(
+                is_ignored(part, ignore) for part in name.split("/")
+            )
+        )
+    found = []
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except (NotADirectoryError, FileNotFoundError, PermissionError):
+            continue
+        with entries:
+            for entry in entries:
+                if is_ignored(entry.name, ignore):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(extensions) and entry.is_file():
+                        found.append(Path(entry.path))
+                except OSError:
+                    continue
+    return sorted(found)
+
+
+def discover_many(
+        roots: Iterable[PathLike], extensions: Sequence[str],
+        ignore: Sequence[str] = DEFAULT_IGNORE,
+        max_workers: Optional[int] = None) -> Dict[Path, List[Path]]:
+    """Finds the source files under many directories in parallel.
+
+    Walking a tree mostly waits on the filesystem so the trees are walked
+    from a pool of threads.
+
+    args:
+        roots: The directories to search.
+        extensions: The extensions of the files to find.
+        ignore: Glob patterns of names to skip.
+        max_workers: The number of trees to walk at once.
+    returns:
+        A map from each root to the paths of the files found under it.
+    """
+    roots = [Path(root) for root in roots]
+    with ThreadPoolExecutor(max_workers) as executor:
+        found = executor.map(
+            lambda root: discover_sources(root, extensions, ignore), roots
+        )
+        return dict(zip(roots, found))
@@ -0,0 +1,136 @@
+"""Module that contains a persistent index of parsed source files."""
+
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from os import PathLike
+from collections import namedtuple
+from typing import List, Optional, Sequence, Tuple
+
+IndexEntry = namedtuple(
+    "IndexEntry", ["functions", "comments", "is_entry_point"]
+)
+
+
+def _digest(path: Path) -> str:
+    """Returns the sha256 hex digest of a file's content."""
+    with path.open("rb") as source:
+        return hashlib.sha256(source.read()).hexdigest()
+
+
+class ParseIndex(object):
+    """An SQLite index of the functions and comments found in source files.
+
+    An entry is valid while the file's size and modification time are
+    unchanged. If only the modification time changed then the file is hashed
+    and the entry is kept when the content is the same. The database is opened
+    lazily in each process and thread that uses the index since SQLite
+    connections can't be shared between threads.
+
+    attributes:
+        path: The path to the SQLite database.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sources ("
+        "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT, "
+        "functions TEXT, comments TEXT, is_entry_point INTEGER)"
+    )
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it if needed."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Only the thread that opened a connection uses it, close may
+            # be called from any thread.
+            connection = sqlite3.connect(
+                str(self.path), timeout=30, isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(self.SCHEMA)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def lookup(self, source_path: PathLike) -> Optional[IndexEntry]:
+        """Returns the entry of a source file if it is still valid.
+
+        args:
+            source_path: The path to the source file.
+        returns:
+            The functions, comments and entry point flag of the file or None
+                if the file isn't indexed or has changed.
+        """
+        source_path = Path(source_path).resolve()
+        try:
+            stat = source_path.stat()
+        except OSError:
+            return None
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, digest, functions, comments, "
+            "is_entry_point FROM sources WHERE path = ?", (str(source_path),)
+        ).fetchone()
+        if row is None or row[0] != stat.st_size:
+            return None
+        if row[1] != stat.st_mtime_ns:
+            if row[2] != _digest(source_path):
+                return None
+            self.connection.execute(
+                "UPDATE sources SET mtime_ns = ? WHERE path = ?",
+                (stat.st_mtime_ns, str(source_path))
+            )
+        functions = tuple(
+            (return_type, name, tuple(args))
+            for return_type, name, args in json.loads(row[3])
+        )
+        return IndexEntry(functions, tuple(json.loads(row[4])), bool(row[5]))
+
+    def store(
+            self, source_path: PathLike,
+            functions: Sequence[Tuple[str, str, Tuple[str, ...]]],
+            comments: Sequence[str], is_entry_point: bool):
+        """Stores what was parsed from a source file.
+
+        args:
+            source_path: The path to the source file.
+            functions: The function signatures found in the file.
+            comments: The comments found in the file.
+            is_entry_point: True if the file can be a program's entry point.
+        """
+        source_path = Path(source_path).resolve()
+        stat = source_path.stat()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(source_path), stat.st_size, stat.st_mtime_ns,
+                _digest(source_path), json.dumps(functions),
+                json.dumps(comments), int(is_entry_point)
+            )
+        )
+
+    def close(self):
+        """Closes the connections of every thread to the database."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def __getstate__(self):
+        """Leaves out the connections so the index can be sent to processes."""
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        """Restores an index sent to another process without connections."""
+        self.__init__(state["path"])
@@ -2,14 +2,24 @@
 from pathlib import Path
 from os import PathLike
 from abc import abstractmethod
-from typing import Union, Optional, Set, Tuple
+from typing import (
+    Iterable, Union, Optional, Sequence, Set, Tuple, TYPE_CHECKING
+)
+
+from autograde.components.discovery import DEFAULT_IGNORE, discover_sources
+
+if TYPE_CHECKING:
+    from autograde.components.index import ParseIndex
 
 
 class Source(object):
     """Represents a source file of a program."""
 
-    def __init__(self, *path_to_source: Union[str, PathLike]):
+    def __init__(
+            self, *path_to_source: Union[str, PathLike],
+            index: Optional["ParseIndex"] = None):
         self.path = Path(*path_to_source)
+        self.index = index
 
     @property
     @abstractmethod
@@ -45,10 +55,17 @@ class Source(object):
 class Program(object):
     """Represents that state of a program."""
 
-    def __init__(self, *build_paths: PathLike):
+    def __init__(
+            self, *build_paths: PathLike,
+            index: Optional["ParseIndex"] = None):
         self.entry_point: Optional[Source] = None
         self.build_paths: Set[Path] = {Path(sp) for sp in build_paths}
         self.source_files: Set[Source] = set()
+        self.index = index
+
+    def make_source(self, path: PathLike) -> Source:
+        """Returns a source of the program's type that shares its index."""
+        return self.source_type(path, index=self.index)
 
     def set_entry_point(self, source_file: Optional[PathLike] = None):
         """Sets the entry point for the program.
@@ -59,7 +76,7 @@ class Program(object):
                 point from the current source files.
         """
         if source_file is not None:
-            self.entry_point = self.source_type(source_file)
+            self.entry_point = self.make_source(source_file)
         else:
             self.entry_point = next(
                 (sf for sf in self.source_files if sf.is_entry_point()), None
@@ -82,14 +99,30 @@ class Program(object):
         """
         self.source_files.add(source_file)
 
-    def collect_source(self):
-        """Collect all source files from build paths. """
+    def collect_source(
+            self, source_paths: Optional[Iterable[PathLike]] = None,
+            ignore: Sequence[str] = DEFAULT_IGNORE):
+        """Collect all source files from build paths.
+
+        args:
+            source_paths: Paths of source files that were already discovered,
+                for example by discover_many. If None then the build paths
+                are searched. A build path may be a zip or tar archive.
+            ignore: Glob patterns of file and directory names to skip when
+                searching the build paths.
+        """
+        if source_paths is None:
+            source_paths = [
+                path for build_path in self.build_paths
+                for path in discover_sources(
+                    build_path, self.get_extensions(), ignore
+                )
+            ]
         new_build_paths = set()
-        for build_path in self.build_paths:
-            for ext in self.get_extensions():
-                for path in build_path.rglob(f"*{ext}"):
-                    new_build_paths.add(path.parent)
-                    self.source_files.add(self.source_type(path))
+        for path in source_paths:
+            path = Path(path)
+            new_build_paths.add(path.parent)
+            self.source_files.add(self.make_source(path))
         self.build_paths.update(new_build_paths)
 
     def __repr__(self):
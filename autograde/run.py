@@ -19,6 +19,16 @@ def get_args():
     parser.add_argument(
         "--use_container", action="store_true",
         help="Use a container to compile and run the program.")
+    parser.add_argument(
+        "--backend", default="scons",
+        choices=["scons", "direct", "incremental"],
+        help="Compile with scons or by calling the compiler directly.")
+    parser.add_argument(
+        "--timeout", default=None, type=float,
+        help="Seconds the program may run before it is killed.")
+    parser.add_argument(
+        "--output_limit", default=None, type=int,
+        help="Bytes of output the program may write before it is killed.")
     return parser.parse_args()
 
 
@@ -26,7 +36,8 @@ def main():
     args = get_args()
     program_results = run_program(
         args.program_path, program_input=args.program_input,
-        use_container=args.use_container
+        use_container=args.use_container, backend=args.backend,
+        timeout=args.timeout, output_limit=args.output_limit
     )
     display([(args.program_path, program_results)])
 
@@ -0,0 +1,57 @@
+/*
+ * Runs a command and reports the peak resident set size of the command
+ * alone.
+ *
+ * usage: rss_shim <fd> <command> [args...]
+ *
+ * Linux keeps the peak of the process a program was forked from across
+ * exec, so a program started straight from python reports at least the
+ * size of python. This shim is small, so the program it forks starts from
+ * the shim's size instead. Once the program exits its peak in kilobytes is
+ * written to fd and the shim exits like the program did.
+ */
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <sys/resource.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+int main(int argc, char **argv) {
+    if (argc < 3) {
+        fprintf(stderr, "usage: %s <fd> <command> [args...]\n", argv[0]);
+        return 127;
+    }
+    int fd = atoi(argv[1]);
+    pid_t pid = fork();
+    if (pid <= 0) {
+        /* The program runs in place of the shim if it can't fork, for
+           example under a process limit, and its peak isn't reported. */
+        close(fd);
+        execvp(argv[2], argv + 2);
+        perror(argv[2]);
+        _exit(127);
+    }
+    /* Only the program keeps its streams so they close when it exits. */
+    close(STDIN_FILENO);
+    close(STDOUT_FILENO);
+    close(STDERR_FILENO);
+    int status;
+    struct rusage usage;
+    while (wait4(pid, &status, 0, &usage) < 0) {
+        if (errno != EINTR) {
+            return 127;
+        }
+    }
+    dprintf(fd, "%ld\n", usage.ru_maxrss);
+    close(fd);
+    if (WIFSIGNALED(status)) {
+        struct rlimit no_core = {0, 0};
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        raise(WTERMSIG(status));
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 127;
+}
@@ -1,3 +1,7 @@
 
-from autograde.tools.build import create_scons, compile_cpp, clean_cpp
-from autograde.tools.execute import execute_program
+from autograde.tools.build import (
+    create_scons, compile_cpp, compile_cpp_async, clean_cpp
+)
+from autograde.tools.driver import compile_cpp_direct
+from autograde.tools.execute import execute_program, execute_program_async
+from autograde.tools.pch import PrecompiledHeader
@@ -1,41 +1,72 @@
 """Module that contains functions for building and/or compiling programs."""
 
+import re
 import json
 import shutil
+import asyncio
 import subprocess
+from functools import partial
+from time import monotonic
 from pathlib import Path
 from os import PathLike
 import autograde
 from autograde.components.program import Program
 from autograde.components.cpp_components import CppProgram
-from autograde.tools.result import CompileResult, Result
-from typing import Optional, Tuple
+from autograde.tools.cache import CompileCache, ObjectCache, program_key
+from autograde.tools.driver import (
+    compile_cpp_direct, compile_cpp_direct_async, find_compiler,
+    get_build_sources, get_object_paths, get_translation_units, run_command,
+    run_command_async
+)
+from autograde.tools.metrics import combine_metrics
+from autograde.tools.incremental import compile_cpp_incremental
+from autograde.tools.pch import PrecompiledHeader
+from autograde.tools.result import CompileResult, PhaseMetrics, Result
+from typing import Optional, Sequence, Tuple
 
+# scons --debug=time prints how long each command took and the totals of the
+# build, which are taken out of the output it is compiled with.
+SCONS_COMMAND = ["scons", "--debug=time"]
+SCONS_TIME_PATTERN = re.compile(
+    r"^(?:Command execution time: .*|Total ([\w ]+) time: ([\d.]+) seconds)"
+    r"(?:\n|$)", re.M
+)
 
-def create_scons(program: Program, target_dir: PathLike) -> Tuple[Path, Path]:
+
+def create_scons(
+        program: Program, target_dir: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        unity: bool = False) -> Tuple[Path, Path]:
     """Returns a path a newly created scons file for a target program.
 
     args:
         program: A program to create a scons file for.
+        compiler: The compiler for scons to use. If None then scons finds one.
+        flags: Extra flags to give the compiler.
+        pch: A precompiled header to use for the sources that it fits.
+        unity: Build every translation unit as one. See get_build_sources.
     """
     sconstruct_template = Path(autograde.__file__).parent
     sconstruct_template = sconstruct_template / "templates" / "SConstruct"
     target_dir = Path(target_dir)
     build_info_file = target_dir / 'build_info.json'
-    other_sources = program.source_files - {program.entry_point}
-    dependencies = []
-    if program.entry_point is not None:
-        dependencies.append((
-            str(target_dir / program.entry_point.path.stem),
-            str(program.entry_point.path.resolve())
-        ))
-    dependencies.extend([
-        (str(target_dir / sf.path.stem), str(sf.path.resolve()))
-        for sf in other_sources
-    ])
+    sources = get_build_sources(program, target_dir.resolve(), unity=unity)
+    dependencies = [
+        (str(obj), str(source))
+        for source, obj in zip(sources, get_object_paths(sources, target_dir))
+    ]
+    source_flags = {}
+    if pch is not None:
+        source_flags = {
+            str(source): pch.get_flags(source, compiler, flags)
+            for source in sources
+        }
     build_info = {
         "source_files": dependencies, "executable": None,
-        "entry_point": None
+        "entry_point": None, "compiler": compiler,
+        "flags": list(flags or []), "source_flags": source_flags
     }
     if program.entry_point is not None:
         absolute_path = program.entry_point.path.resolve()
@@ -49,36 +80,280 @@ def create_scons(program: Program, target_dir: PathLike) -> Tuple[Path, Path]:
 
 
 def compile_cpp(
-        program: CppProgram, target_path: PathLike) -> CompileResult:
+        program: CppProgram, target_path: PathLike,
+        flags: Optional[Sequence[str]] = None,
+        cache: Optional[CompileCache] = None,
+        backend: str = "scons",
+        pch: Optional[PrecompiledHeader] = None,
+        unity: bool = False,
+        object_cache: Optional[ObjectCache] = None) -> CompileResult:
     """Compile a cpp program using the system's compiler.
 
     Compiles a C++ program using the system's compiler. The compiler is found
     by SCONS. The entry point is used to name the executable.
 
+    The "direct" backend calls the compiler without scons which avoids
+    starting scons for every program. See compile_cpp_direct. The
+    "incremental" backend also calls the compiler directly but only rebuilds
+    what changed since the last build in target_path. See
+    compile_cpp_incremental.
+
     args:
         program: Represents the program which you want to compile. Should
             have an entry point.
         target_path: The path to store the final executable.
+        flags: Extra flags to give the compiler.
+        cache: A cache to look up the program in before compiling and store
+            the result in after compiling.
+        backend: Either "scons", "direct" or "incremental".
+        pch: A precompiled header to use for the translation units that
+            include all of its headers. Programs compiled with other flags
+            than the header was built with don't use it.
+        unity: Compile a program with many translation units as a single
+            one that includes them all so headers they share are parsed
+            once. If that fails, for example because two files define
+            static functions with the same name, then the program is
+            compiled per file.
+        object_cache: A cache of the objects of translation units keyed on
+            their preprocessed source, so files that programs share are
+            compiled once. Only the "direct" backend can use it since the
+            other backends manage their own objects.
 
     Returns:
         A CompileResult Namedtuple which consists of the path to the
-            executable, output from stdout, output from stderr, and the
-            return code.
+            executable, output from stdout, output from stderr, the return
+            code, the metrics of compiling and the mode it was built in. A
+            program found in the cache only has the wall time of looking it
+            up.
+    """
+    if backend not in COMPILE_BACKENDS:
+        raise ValueError(f"Unknown compile backend: {backend}")
+    if object_cache is not None and backend != "direct":
+        raise ValueError(f"Compile backend can't use objects: {backend}")
+    start = monotonic()
+    target_path = Path(target_path).resolve()
+    compiler = find_compiler()
+    key = None
+    if cache is not None:
+        key = program_key(
+            program, compiler, flags, backend=backend, unity=unity, pch=pch
+        )
+        compile_result = cache.get(key, target_path)
+        if compile_result is not None:
+            return compile_result._replace(
+                metrics=PhaseMetrics(monotonic() - start)
+            )
+    build = partial(
+        COMPILE_BACKENDS[backend], program, target_path, compiler=compiler,
+        flags=flags, pch=pch,
+        **({} if object_cache is None else {"object_cache": object_cache})
+    )
+    if unity and len(get_translation_units(program)) > 1:
+        compile_result = build(unity=True)._replace(mode="unity")
+        if compile_result.return_code != 0:
+            compile_result = unity_fallback(
+                start, compile_result, build(unity=False)
+            )
+    else:
+        compile_result = build()
+    if cache is not None:
+        cache.put(key, compile_result)
+    return compile_result
+
+
+def unity_fallback(
+        start: float, unity_result: CompileResult,
+        compile_result: CompileResult) -> CompileResult:
+    """Returns the result of a per file build that followed a unity build.
+
+    The output of the failed unity build is dropped and its metrics are
+    added to the metrics of the per file build.
+    """
+    return compile_result._replace(
+        mode="unity_fallback",
+        metrics=combine_metrics(
+            monotonic() - start,
+            (unity_result.metrics, compile_result.metrics)
+        )
+    )
+
+
+def scons_result(
+        executable: Optional[Path], stdout: str, stderr: str,
+        return_code: int, metrics: Optional[PhaseMetrics]) -> CompileResult:
+    """Returns the CompileResult of running SCONS_COMMAND.
+
+    The timings are removed from stdout and the time scons spent outside of
+    the commands it ran, starting up and reading the build, is kept as the
+    overhead of its metrics.
+    """
+    command_time = None
+    for match in SCONS_TIME_PATTERN.finditer(stdout):
+        if match.group(1) == "command execution":
+            command_time = float(match.group(2))
+    stdout = SCONS_TIME_PATTERN.sub("", stdout)
+    if metrics is not None and command_time is not None:
+        metrics = metrics._replace(
+            overhead=max(metrics.wall - command_time, 0.0)
+        )
+    if return_code != 0:
+        executable = None
+    return CompileResult(
+        executable, stdout, stderr, return_code, metrics=metrics
+    )
+
+
+def compile_cpp_scons(
+        program: CppProgram, target_path: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        unity: bool = False) -> CompileResult:
+    """Compile a cpp program with scons.
+
+    args:
+        program: Represents the program which you want to compile.
+        target_path: The path to store the final executable.
+        compiler: The compiler for scons to use.
+        flags: Extra flags to give the compiler.
+        pch: A precompiled header to use for the sources that it fits.
+        unity: Build every translation unit as one.
+
+    Returns:
+        A CompileResult of compiling the program.
     """
     target_path = Path(target_path).resolve()
     executable: Optional[Path] = None
     if program.entry_point is not None:
         executable = target_path / program.entry_point.path.name
         executable = executable.with_suffix(".exe")
-    scons_path, info_file = create_scons(program, target_path)
-    proc_status = subprocess.run(
-        ['scons'], shell=True, cwd=target_path, capture_output=True, text=True
+    scons_path, info_file = create_scons(
+        program, target_path, compiler=compiler, flags=flags, pch=pch,
+        unity=unity
     )
-    if proc_status.returncode != 0:
-        executable = None
-    return CompileResult(
-        executable, proc_status.stdout, proc_status.stderr,
-        proc_status.returncode)
+    return scons_result(
+        executable, *run_command(SCONS_COMMAND, target_path, echo=False)
+    )
+
+
+COMPILE_BACKENDS = {
+    "scons": compile_cpp_scons, "direct": compile_cpp_direct,
+    "incremental": compile_cpp_incremental
+}
+
+
+async def compile_cpp_async(
+        program: CppProgram, target_path: PathLike,
+        flags: Optional[Sequence[str]] = None,
+        cache: Optional[CompileCache] = None,
+        backend: str = "direct",
+        pch: Optional[PrecompiledHeader] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        unity: bool = False,
+        object_cache: Optional[ObjectCache] = None) -> CompileResult:
+    """Compile a cpp program like compile_cpp from an event loop.
+
+    Only the "direct" and "scons" backends can be awaited. The compile
+    cache is read and written in a thread like the other file operations.
+
+    args:
+        program: Represents the program which you want to compile.
+        target_path: The path to store the final executable.
+        flags: Extra flags to give the compiler.
+        cache: A cache to look up the program in before compiling and store
+            the result in after compiling.
+        backend: Either "direct" or "scons".
+        pch: A precompiled header to use for the translation units that
+            include all of its headers.
+        semaphore: A semaphore that each compiler process holds while it
+            runs to limit how many run at once.
+        unity: Compile the program as a single translation unit and fall
+            back to compiling it per file if that fails.
+        object_cache: A cache of the objects of translation units. Only the
+            "direct" backend can use it.
+
+    Returns:
+        A CompileResult of compiling the program. Its metrics only have the
+            wall time.
+    """
+    if backend not in ASYNC_COMPILE_BACKENDS:
+        raise ValueError(f"Compile backend can't be awaited: {backend}")
+    if object_cache is not None and backend != "direct":
+        raise ValueError(f"Compile backend can't use objects: {backend}")
+    start = monotonic()
+    target_path = Path(target_path).resolve()
+    compiler = find_compiler()
+    key = None
+    if cache is not None:
+        key = await asyncio.to_thread(
+            program_key, program, compiler, flags, backend=backend,
+            unity=unity, pch=pch
+        )
+        compile_result = await asyncio.to_thread(
+            cache.get, key, target_path
+        )
+        if compile_result is not None:
+            return compile_result._replace(
+                metrics=PhaseMetrics(monotonic() - start)
+            )
+    build = partial(
+        ASYNC_COMPILE_BACKENDS[backend], program, target_path,
+        compiler=compiler, flags=flags, pch=pch, semaphore=semaphore,
+        **({} if object_cache is None else {"object_cache": object_cache})
+    )
+    if unity and len(get_translation_units(program)) > 1:
+        compile_result = (await build(unity=True))._replace(mode="unity")
+        if compile_result.return_code != 0:
+            compile_result = unity_fallback(
+                start, compile_result, await build(unity=False)
+            )
+    else:
+        compile_result = await build()
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, compile_result)
+    return compile_result
+
+
+async def compile_cpp_scons_async(
+        program: CppProgram, target_path: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        unity: bool = False) -> CompileResult:
+    """Compile a cpp program with scons from an event loop.
+
+    args:
+        program: Represents the program which you want to compile.
+        target_path: The path to store the final executable.
+        compiler: The compiler for scons to use.
+        flags: Extra flags to give the compiler.
+        pch: A precompiled header to use for the sources that it fits.
+        semaphore: A semaphore to hold while scons runs.
+        unity: Build every translation unit as one.
+
+    Returns:
+        A CompileResult of compiling the program.
+    """
+    target_path = Path(target_path).resolve()
+    executable: Optional[Path] = None
+    if program.entry_point is not None:
+        executable = target_path / program.entry_point.path.name
+        executable = executable.with_suffix(".exe")
+    create_scons(
+        program, target_path, compiler=compiler, flags=flags, pch=pch,
+        unity=unity
+    )
+    return scons_result(
+        executable, *await run_command_async(
+            SCONS_COMMAND, target_path, echo=False, semaphore=semaphore
+        )
+    )
+
+
+ASYNC_COMPILE_BACKENDS = {
+    "scons": compile_cpp_scons_async, "direct": compile_cpp_direct_async
+}
 
 
 def clean_cpp(target_path: PathLike):
@@ -88,8 +363,7 @@ def clean_cpp(target_path: PathLike):
         target_path: The path to clean of build files.
     """
     proc_status = subprocess.run(
-        ['scons', '-c'], shell=True, cwd=target_path, capture_output=True,
-        text=True
+        ['scons', '-c'], cwd=target_path, capture_output=True, text=True
     )
     return Result(
         proc_status.stdout, proc_status.stderr, proc_status.returncode
@@ -0,0 +1,378 @@
+"""Module that contains a content addressed cache for compiled programs."""
+
+import json
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+from pathlib import Path
+from os import PathLike
+from time import time_ns
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from autograde.components.archive import open_source
+from autograde.components.program import Program
+from autograde.tools.driver import get_compiler_identity
+from autograde.tools.pch import PrecompiledHeader
+from autograde.tools.result import CompileResult
+
+CacheStats = namedtuple(
+    "CacheStats", ["hits", "misses", "entries", "size"]
+)
+
+
+def hash_file(path: PathLike) -> str:
+    """Returns the sha256 hex digest of a file's content.
+
+    The file may be inside of an archive.
+    """
+    digest = hashlib.sha256()
+    with open_source(path) as source:
+        for block in iter(lambda: source.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_sources(paths: Iterable[PathLike]) -> List[Tuple[str, str]]:
+    """Returns a sorted list of relative names and content hashes of files.
+
+    The names are relative to the common parent of all the paths so that the
+    same set of files hashes identically regardless of where it lives.
+
+    args:
+        paths: The paths to the files to hash.
+    returns:
+        A sorted list of tuples of the relative name and the hash of a file.
+    """
+    paths = [Path(path).resolve() for path in paths]
+    if not paths:
+        return []
+    root = Path(os.path.commonpath([str(path.parent) for path in paths]))
+    return sorted(
+        (path.relative_to(root).as_posix(), hash_file(path))
+        for path in paths
+    )
+
+
+def program_key(
+        program: Program, compiler: str,
+        flags: Optional[Sequence[str]] = None,
+        backend: str = "scons", unity: bool = False,
+        pch: Optional[PrecompiledHeader] = None) -> str:
+    """Returns a key that identifies a compiled program.
+
+    args:
+        program: The program to create a key for.
+        compiler: The compiler used to compile the program.
+        flags: The flags given to the compiler.
+        backend: The backend that compiles the program.
+        unity: Whether the program is compiled as a single translation unit.
+        pch: The precompiled header the program is compiled with.
+    returns:
+        A hex digest of the source content, compiler identity, flags and the
+            way the program is built.
+    """
+    entry_point = None
+    if program.entry_point is not None:
+        entry_point = program.entry_point.path.name
+    key_info = {
+        "sources": hash_sources(sf.path for sf in program.source_files),
+        "entry_point": entry_point,
+        "compiler": get_compiler_identity(compiler),
+        "flags": list(flags or []),
+        "backend": backend,
+        "unity": unity,
+        "pch": None if pch is None else sorted(pch.headers),
+    }
+    key_data = json.dumps(key_info, sort_keys=True).encode()
+    return hashlib.sha256(key_data).hexdigest()
+
+
+class DirectoryCache(object):
+    """A size bounded on disk cache of entries.
+
+    Each entry is a directory named after its key which contains a json file
+    named RESULT_NAME and the files stored with it. Entries are evicted in
+    least recently used order once the cache grows beyond max_size bytes.
+
+    attributes:
+        path: The directory that holds the cache.
+        max_size: The maximum size of the cache in bytes.
+        hits: The number of lookups that found an entry.
+        misses: The number of lookups that did not find an entry.
+    """
+
+    RESULT_NAME = "result.json"
+
+    def __init__(self, path: PathLike, max_size: int = 1 << 30):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _touch(path: Path):
+        """Marks an entry as used now.
+
+        The time is given explicitly since the filesystem's own clock is too
+        coarse to order entries used in quick succession.
+        """
+        now = time_ns()
+        os.utime(path, ns=(now, now))
+
+    def _entry_path(self, key: str) -> Path:
+        """Returns the directory of an entry."""
+        return self.path / key[:2] / key
+
+    def _store(self, key: str, result: Dict[str, Any], files: Iterable[Path]):
+        """Stores an entry of a json result and copies of files.
+
+        args:
+            key: The key of the entry.
+            result: The json serializable result of the entry.
+            files: The files to copy into the entry.
+        """
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        staging_path = Path(tempfile.mkdtemp(dir=entry_path.parent))
+        try:
+            for path in files:
+                shutil.copy2(path, staging_path / path.name)
+            with (staging_path / self.RESULT_NAME).open("wt") as rf:
+                json.dump(result, rf)
+            self._touch(staging_path / self.RESULT_NAME)
+            os.replace(staging_path, entry_path)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(staging_path, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Tuple[int, int, Path]]:
+        """Returns the last access time, size and path of each entry."""
+        entries = []
+        for result_file in self.path.glob(f"*/*/{self.RESULT_NAME}"):
+            entry_path = result_file.parent
+            try:
+                size = sum(
+                    path.stat().st_size for path in entry_path.iterdir()
+                )
+                entries.append(
+                    (result_file.stat().st_mtime_ns, size, entry_path)
+                )
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        """Removes the least recently used entries until under max_size."""
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+
+    def stats(self) -> CacheStats:
+        """Returns the hit and miss counts along with the cache's size."""
+        entries = self.entries()
+        return CacheStats(
+            self.hits, self.misses, len(entries),
+            sum(size for _, size, _ in entries)
+        )
+
+
+class CompileCache(DirectoryCache):
+    """A persistent on disk cache of compiled programs.
+
+    Each entry is stored in a directory named after its key which contains the
+    compiled executable, if any, and the json encoded CompileResult.
+    """
+
+    def get(self, key: str, target_path: PathLike) -> Optional[CompileResult]:
+        """Returns the cached CompileResult for a key.
+
+        The cached executable is copied into target_path.
+
+        args:
+            key: The key of the entry.
+            target_path: The directory to copy the executable into.
+        returns:
+            The CompileResult of the entry or None if there isn't an entry.
+        """
+        entry_path = self._entry_path(key)
+        result_file = entry_path / self.RESULT_NAME
+        try:
+            with result_file.open("rt") as rf:
+                result = json.load(rf)
+            executable = None
+            if result["executable"] is not None:
+                executable = Path(target_path) / result["executable"]
+                shutil.copy2(entry_path / result["executable"], executable)
+            self._touch(result_file)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CompileResult(
+            executable, result["stdout"], result["stderr"],
+            result["return_code"], cached=True,
+            mode=result.get("mode", "per_file")
+        )
+
+    def put(self, key: str, compile_result: CompileResult):
+        """Stores a CompileResult and its executable in the cache.
+
+        args:
+            key: The key of the entry.
+            compile_result: The result to store.
+        """
+        executable = compile_result.executable
+        result = {
+            "executable": None if executable is None else executable.name,
+            "stdout": compile_result.stdout,
+            "stderr": compile_result.stderr,
+            "return_code": compile_result.return_code,
+            "mode": compile_result.mode,
+        }
+        self._store(key, result, [] if executable is None else [executable])
+
+
+class ObjectCache(DirectoryCache):
+    """A persistent on disk cache of compiled translation units.
+
+    Objects are keyed on the preprocessed translation unit along with the
+    compiler and flags like ccache, so an object compiled for one program is
+    reused by every program with an identical translation unit no matter
+    where its files live. Only objects that compiled without any diagnostics
+    are stored so that a hit never replays another program's warnings.
+
+    Lookups are counted in memory and added to a json file of counts in the
+    cache's directory by flush so that the counts include every process
+    that shares the cache. See stats.
+    """
+
+    RESULT_NAME = "object.json"
+    COUNTS_NAME = "counts.json"
+
+    def __init__(self, path: PathLike, max_size: int = 1 << 30):
+        super().__init__(path, max_size=max_size)
+        self._lock = threading.Lock()
+        self._unflushed = {"hits": 0, "misses": 0}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Copies the cache without its lock or counts for another process."""
+        return {"path": self.path, "max_size": self.max_size}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__init__(**state)
+
+    def key(
+            self, preprocessed: str, compiler: str,
+            flags: Optional[Sequence[str]] = None) -> str:
+        """Returns the key of a translation unit.
+
+        args:
+            preprocessed: The output of preprocessing the translation unit
+                without line markers.
+            compiler: The compiler that compiles it.
+            flags: The flags it is compiled with.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [get_compiler_identity(compiler), list(flags or [])]
+        ).encode())
+        digest.update(b"\0")
+        digest.update(preprocessed.encode())
+        return digest.hexdigest()
+
+    def _count(self, name: str):
+        """Adds a lookup to the count in name."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._unflushed[name] += 1
+
+    def _read_counts(self) -> Dict[str, int]:
+        """Returns the counts in the cache's directory."""
+        try:
+            with (self.path / self.COUNTS_NAME).open("rt") as cf:
+                counts = json.load(cf)
+            return {name: int(counts[name]) for name in self._unflushed}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {name: 0 for name in self._unflushed}
+
+    def flush(self):
+        """Adds the lookups counted since the last flush to the counts file.
+
+        The file is replaced as a whole while holding a lock on the cache's
+        directory so that concurrent flushes don't lose each other's counts.
+        """
+        with self._lock:
+            unflushed = self._unflushed
+            self._unflushed = {name: 0 for name in unflushed}
+        if not any(unflushed.values()):
+            return
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            lock_fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            counts = self._read_counts()
+            fd, partial_path = tempfile.mkstemp(dir=self.path)
+            try:
+                with os.fdopen(fd, "wt") as cf:
+                    json.dump({
+                        name: count + unflushed[name]
+                        for name, count in counts.items()
+                    }, cf)
+                os.replace(partial_path, self.path / self.COUNTS_NAME)
+            except OSError:
+                os.unlink(partial_path)
+        except OSError:
+            pass
+        finally:
+            os.close(lock_fd)
+
+    def get(self, key: str, object_path: PathLike) -> bool:
+        """Copies the cached object for a key to object_path.
+
+        returns:
+            True if the object was in the cache.
+        """
+        entry_path = self._entry_path(key)
+        result_file = entry_path / self.RESULT_NAME
+        try:
+            with result_file.open("rt") as rf:
+                result = json.load(rf)
+            shutil.copy2(entry_path / result["object"], object_path)
+            self._touch(result_file)
+        except (OSError, ValueError, KeyError):
+            self._count("misses")
+            return False
+        self._count("hits")
+        return True
+
+    def put(self, key: str, object_path: PathLike):
+        """Stores a compiled object in the cache."""
+        object_path = Path(object_path)
+        self._store(key, {"object": object_path.name}, [object_path])
+
+    def stats(self) -> CacheStats:
+        """Returns the lookups counted by every process and the cache's size.
+
+        The lookups of this process are flushed first. The counts keep
+        growing between runs so the counts of one run are the difference of
+        the stats from before and after it.
+        """
+        self.flush()
+        counts = self._read_counts()
+        entries = self.entries()
+        return CacheStats(
+            counts["hits"], counts["misses"], len(entries),
+            sum(size for _, size, _ in entries)
+        )
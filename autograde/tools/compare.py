@@ -0,0 +1,345 @@
+"""Module that contains comparators that check output while it streams.
+
+A comparator is fed a program's stdout as it is read. As soon as the output
+can no longer match the expected output feed returns False so the program
+can be killed instead of running to completion, and finish returns a Verdict
+that says where the output went wrong.
+"""
+
+import re
+import codecs
+from abc import abstractmethod
+from collections import Counter, namedtuple
+from typing import Dict, List, Optional, Tuple, Type
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_TOLERANCE = 1e-6
+# The number of characters a token or line may grow past the longest expected
+# one before it is a mismatch, so output without separators isn't buffered.
+PARTIAL_SLACK = 64
+NUMBER_PATTERN = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+# position is the 1 based line of the first mismatch for the "exact" and
+# "lineset" modes and the 1 based token for the "whitespace" and "numeric"
+# modes. It is None if the output passed.
+Verdict = namedtuple(
+    "Verdict",
+    ["passed", "mode", "position", "expected", "actual", "message"],
+    defaults=(None, None, None, "")
+)
+
+
+class Comparator(object):
+    """Compares output with the expected output while it streams.
+
+    The output is decoded as UTF-8 with universal newlines like the stdout of
+    an ExecuteResult.
+
+    attributes:
+        mode: The name of the comparison.
+        expected: The expected output.
+        verdict: The verdict of the first mismatch or None.
+    """
+
+    mode = ""
+
+    def __init__(self, expected: str):
+        self.expected = expected.replace("\r\n", "\n").replace("\r", "\n")
+        self.verdict: Optional[Verdict] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._carriage_return = False
+
+    def feed(self, data: bytes) -> bool:
+        """Compares the next chunk of output.
+
+        returns:
+            False once the output can no longer match.
+        """
+        if self.verdict is None:
+            self._feed_text(self._decode(data))
+        return self.verdict is None
+
+    def finish(self) -> Verdict:
+        """Compares the end of the output and returns the verdict."""
+        if self.verdict is None:
+            self._feed_text(self._decode(b"", final=True))
+        if self.verdict is None:
+            self._finish()
+        if self.verdict is None:
+            self.verdict = Verdict(True, self.mode)
+        return self.verdict
+
+    def fail(
+            self, position: int, expected: Optional[str],
+            actual: Optional[str], message: str):
+        """Records the first mismatch."""
+        if self.verdict is None:
+            self.verdict = Verdict(
+                False, self.mode, position, expected, actual, message
+            )
+
+    def _decode(self, data: bytes, final: bool = False) -> str:
+        """Decodes a chunk turning \\r\\n and \\r into \\n across chunks."""
+        text = self._decoder.decode(data, final)
+        if self._carriage_return:
+            text = "\r" + text
+        self._carriage_return = text.endswith("\r") and not final
+        if self._carriage_return:
+            text = text[:-1]
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    @abstractmethod
+    def _feed_text(self, text: str):
+        """Compares the next chunk of decoded output."""
+
+    @abstractmethod
+    def _finish(self):
+        """Compares what is left once the output has ended."""
+
+
+class ExactComparator(Comparator):
+    """Passes output that is exactly the expected output."""
+
+    mode = "exact"
+
+    def __init__(self, expected: str):
+        super().__init__(expected)
+        self._offset = 0
+
+    def _line(self, offset: int) -> int:
+        return self.expected.count("\n", 0, offset) + 1
+
+    def _feed_text(self, text: str):
+        expected = self.expected[self._offset:self._offset + len(text)]
+        if expected != text:
+            index = next(
+                (i for i, (a, b) in enumerate(zip(expected, text)) if a != b),
+                len(expected)
+            )
+            offset = self._offset + index
+            start = self.expected.rfind("\n", 0, offset) + 1
+            end = self.expected.find("\n", offset)
+            actual_end = text.find("\n", index)
+            self.fail(
+                self._line(offset),
+                self.expected[start:None if end < 0 else end],
+                self.expected[start:offset] + text[
+                    index:None if actual_end < 0 else actual_end
+                ],
+                "output differs" if index < len(expected)
+                else "output is longer than expected"
+            )
+        self._offset += len(text)
+
+    def _finish(self):
+        if self._offset < len(self.expected):
+            self.fail(
+                self._line(self._offset), self.expected[self._offset:][:80],
+                None, "output ended early"
+            )
+
+
+class WhitespaceComparator(Comparator):
+    """Passes output whose whitespace separated tokens are the expected."""
+
+    mode = "whitespace"
+
+    def __init__(self, expected: str):
+        super().__init__(expected)
+        self._expected_tokens = self.expected.split()
+        self._longest = max(map(len, self._expected_tokens), default=0)
+        self._count = 0
+        self._partial = ""
+
+    def _feed_text(self, text: str):
+        text = self._partial + text
+        tokens = text.split()
+        self._partial = ""
+        if tokens and not text[-1].isspace():
+            self._partial = tokens.pop()
+        self._compare_tokens(tokens)
+        if len(self._partial) > self._longest + PARTIAL_SLACK:
+            self.fail(
+                self._count + 1, None, self._partial[:80],
+                "token is longer than expected"
+            )
+
+    def _compare_tokens(self, tokens: List[str]):
+        for token in tokens:
+            if self._count >= len(self._expected_tokens):
+                self.fail(
+                    self._count + 1, None, token,
+                    "output is longer than expected"
+                )
+                return
+            expected = self._expected_tokens[self._count]
+            self._count += 1
+            if not self._compare_token(expected, token):
+                return
+
+    def _compare_token(self, expected: str, actual: str) -> bool:
+        """Compares a token and returns False on a mismatch."""
+        if expected != actual:
+            self.fail(self._count, expected, actual, "token differs")
+            return False
+        return True
+
+    def _finish(self):
+        if self._partial:
+            self._compare_tokens([self._partial])
+        if self.verdict is None and self._count < len(self._expected_tokens):
+            self.fail(
+                self._count + 1, self._expected_tokens[self._count], None,
+                "output ended early"
+            )
+
+
+class NumericComparator(WhitespaceComparator):
+    """Passes output whose numbers are close to the expected numbers.
+
+    Tokens that are numbers in both outputs pass if
+    |actual - expected| <= tolerance + tolerance * |expected| and other tokens
+    must be equal. Numbers are compared in batches of batch_size which are
+    vectorized with numpy when it is installed, so a mismatch is found at the
+    latest batch_size numbers after it was written.
+
+    attributes:
+        tolerance: The absolute and relative tolerance.
+        batch_size: The number of numbers compared at once.
+    """
+
+    mode = "numeric"
+
+    def __init__(
+            self, expected: str, tolerance: float = DEFAULT_TOLERANCE,
+            batch_size: int = 4096):
+        super().__init__(expected)
+        self.tolerance = tolerance
+        self.batch_size = batch_size
+        self._batch: List[Tuple[int, str, str]] = []
+
+    def _compare_token(self, expected: str, actual: str) -> bool:
+        expected_number = NUMBER_PATTERN.fullmatch(expected)
+        actual_number = NUMBER_PATTERN.fullmatch(actual)
+        if expected_number is None or actual_number is None:
+            if expected != actual:
+                self._compare_batch()
+                self.fail(self._count, expected, actual, "token differs")
+                return False
+            return True
+        self._batch.append((self._count, expected, actual))
+        if len(self._batch) >= self.batch_size:
+            return self._compare_batch()
+        return True
+
+    def _compare_batch(self) -> bool:
+        """Compares the batched numbers and returns False on a mismatch."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return True
+        expected = [float(number) for _, number, _ in batch]
+        actual = [float(number) for _, _, number in batch]
+        if numpy is not None:
+            close = numpy.isclose(
+                actual, expected, rtol=self.tolerance, atol=self.tolerance
+            )
+            if close.all():
+                return True
+            index = int(numpy.argmin(close))
+        else:
+            index = next(
+                (
+                    i for i, (a, b) in enumerate(zip(actual, expected))
+                    if not (a == b or abs(a - b) <= self.tolerance * (
+                        1 + abs(b)
+                    ))
+                ),
+                None
+            )
+            if index is None:
+                return True
+        position, expected_token, actual_token = batch[index]
+        self.fail(
+            position, expected_token, actual_token,
+            f"number differs by more than {self.tolerance}"
+        )
+        return False
+
+    def _finish(self):
+        super()._finish()
+        self._compare_batch()
+
+
+class LineSetComparator(Comparator):
+    """Passes output with the expected lines in any order.
+
+    Trailing whitespace and blank lines are ignored and every line must
+    appear as many times as it is expected.
+    """
+
+    mode = "lineset"
+
+    def __init__(self, expected: str):
+        super().__init__(expected)
+        self._remaining = Counter(
+            line.rstrip() for line in self.expected.split("\n")
+            if line.strip()
+        )
+        self._longest = max(map(len, self._remaining), default=0)
+        self._line = 0
+        self._partial = ""
+
+    def _feed_text(self, text: str):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._compare_line(line)
+        if len(self._partial) > self._longest + PARTIAL_SLACK:
+            self.fail(
+                self._line + 1, None, self._partial[:80],
+                "line is longer than expected"
+            )
+
+    def _compare_line(self, line: str):
+        self._line += 1
+        line = line.rstrip()
+        if not line or self.verdict is not None:
+            return
+        if self._remaining[line] <= 0:
+            self.fail(self._line, None, line, "unexpected line")
+            return
+        self._remaining[line] -= 1
+
+    def _finish(self):
+        if self._partial:
+            self._compare_line(self._partial)
+        missing = next(iter(+self._remaining), None)
+        if missing is not None:
+            self.fail(self._line + 1, missing, None, "missing line")
+
+
+COMPARATORS: Dict[str, Type[Comparator]] = {
+    "exact": ExactComparator, "whitespace": WhitespaceComparator,
+    "numeric": NumericComparator, "lineset": LineSetComparator
+}
+
+
+def make_comparator(
+        mode: str, expected: str,
+        tolerance: float = DEFAULT_TOLERANCE) -> Comparator:
+    """Returns a comparator for expected output.
+
+    args:
+        mode: "exact", "whitespace", "numeric" or "lineset".
+        expected: The expected output.
+        tolerance: The tolerance of the "numeric" mode.
+    """
+    if mode not in COMPARATORS:
+        raise ValueError(f"Unknown compare mode: {mode}")
+    if mode == "numeric":
+        return NumericComparator(expected, tolerance=tolerance)
+    return COMPARATORS[mode](expected)
@@ -4,39 +4,93 @@ A module that has functions to compile and execute programs with containers."""
 import json
 import subprocess
 from itertools import chain
+from pathlib import Path
 from autograde.components.cpp_components import CppProgram
 from autograde.tools.result import CompileResult, ExecuteResult
 
-from typing import Optional, Tuple
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+def make_build_info(
+        program: CppProgram, build_path_map: Mapping[Path, str],
+        program_input: Optional[str] = None,
+        timeout: Optional[float] = None, output_limit: Optional[int] = None
+        ) -> Dict[str, Any]:
+    """Returns the description of a job for a container.
+
+    args:
+        program: A cpp program that can be compiled.
+        build_path_map: A map from the program's build paths to where they
+            are mounted in the container.
+        program_input: Input to give the program.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
+    returns:
+        A json serializable dictionary describing the job.
+    """
+    entry_path = program.entry_point.path
+    source_files = [
+        f"{build_path_map[source_file.path.parent]}/{source_file.path.name}"
+        for source_file in program.source_files
+    ]
+    return {
+        "source_files": source_files,
+        "program_input": program_input,
+        "timeout": timeout,
+        "output_limit": output_limit,
+        "entry_point": f"{build_path_map[entry_path.parent]}/{entry_path.name}"
+    }
+
+
+def parse_result(
+        result: Optional[Mapping[str, Any]]
+        ) -> Tuple[Optional[CompileResult], Optional[ExecuteResult]]:
+    """Returns the compile and execute results from a container's output.
+
+    args:
+        result: The decoded json output of a container.
+    """
+    compile_result = execute_result = None
+    if result is not None:
+        compile_result = CompileResult(
+            None, result["compile"]["stdout"], result["compile"]["stderr"],
+            result["compile"]["return_code"]
+        )
+        if result["execute"] is not None:
+            execute_result = ExecuteResult(
+                result["execute"]["stdout"], result["execute"]["stderr"],
+                result["execute"]["return_code"],
+                timed_out=result["execute"].get("timed_out", False),
+                truncated=result["execute"].get("truncated", False)
+            )
+    return (compile_result, execute_result)
 
 
 def compile_run_cpp(
-        program: CppProgram, program_input: Optional[str] = None
+        program: CppProgram, program_input: Optional[str] = None,
+        timeout: Optional[float] = None, output_limit: Optional[int] = None
         ) -> Tuple[Optional[CompileResult], Optional[ExecuteResult]]:
     """Compiles and runs a cpp program and returns the result.
 
     args:
         program: A cpp program that can be compiled.
+        program_input: Input to give the program.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
     returns:
         Returns a result which contains stdout and stderr for
         compiling and running steps of the program.
     """
     if program.entry_point is None:
         return (None, None)
-    entry_path = program.entry_point.path
     build_path_map = {
         build_path: f"/build/build_{i}"
         for i, build_path in enumerate(program.build_paths)
     }
-    source_files = [
-        f"{build_path_map[source_file.path.parent]}/{source_file.path.name}"
-        for source_file in program.source_files
-    ]
-    build_info = {
-        "source_files": source_files,
-        "program_input": program_input,
-        "entry_point": f"{build_path_map[entry_path.parent]}/{entry_path.name}"
-    }
+    build_info = make_build_info(
+        program, build_path_map, program_input=program_input,
+        timeout=timeout, output_limit=output_limit
+    )
     volumes = [
         ("-v", f"{bpath.resolve()}:{mpath}:ro")
         for bpath, mpath in build_path_map.items()
@@ -48,17 +102,7 @@ def compile_run_cpp(
     proc_status = subprocess.run(
         command, capture_output=True, text=True
     )
-    result = compile_result = execute_result = None
+    result = None
     if proc_status.stdout:
         result = json.loads(proc_status.stdout)
-    if result is not None:
-        compile_result = CompileResult(
-            None, result["compile"]["stdout"], result["compile"]["stderr"],
-            result["compile"]["return_code"]
-        )
-        if result["execute"] is not None:
-            execute_result = ExecuteResult(
-                result["execute"]["stdout"], result["execute"]["stderr"],
-                result["execute"]["return_code"]
-            )
-    return (compile_result, execute_result)
+    return parse_result(result)
@@ -0,0 +1,81 @@
+"""Module that contains functions for finding identical submissions."""
+
+import json
+import hashlib
+from pathlib import Path
+from os import PathLike
+from typing import Dict, List, Mapping, Sequence
+
+from autograde.components.archive import open_source
+
+
+def normalize_source(data: bytes) -> bytes:
+    """Returns source code without differences that don't change it.
+
+    Line endings are made \\n, trailing whitespace is removed from every line
+    and a leading byte order mark and trailing blank lines are dropped.
+    """
+    if data.startswith(b"\xef\xbb\xbf"):
+        data = data[3:]
+    lines = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+    return b"\n".join(line.rstrip() for line in lines).rstrip(b"\n")
+
+
+def source_fingerprint(
+        program_path: PathLike, source_paths: Sequence[PathLike]) -> str:
+    """Returns a digest of a program's normalized sources.
+
+    Two programs have the same fingerprint if their source files have the
+    same names relative to the program's folder and the same normalized
+    content.
+
+    args:
+        program_path: The folder that holds the program.
+        source_paths: The program's source files.
+    returns:
+        A hex digest of the program's sources.
+    """
+    program_path = Path(program_path).resolve()
+    sources = []
+    for source_path in source_paths:
+        source_path = Path(source_path).resolve()
+        try:
+            name = source_path.relative_to(program_path).as_posix()
+        except ValueError:
+            name = source_path.name
+        with open_source(source_path) as source:
+            digest = hashlib.sha256(
+                normalize_source(source.read())
+            ).hexdigest()
+        sources.append((name, digest))
+    return hashlib.sha256(
+        json.dumps(sorted(sources)).encode()
+    ).hexdigest()
+
+
+def group_duplicates(
+        programs: Mapping[Path, Sequence[Path]]) -> Dict[Path, List[Path]]:
+    """Groups programs that have identical sources.
+
+    Programs without source files are never duplicates.
+
+    args:
+        programs: A map from the paths of programs to their source files.
+    returns:
+        A map from the first path of each group in the order of programs to
+            the other paths in its group. Every program is in exactly one
+            group so unique programs map to an empty list.
+    """
+    groups: Dict[Path, List[Path]] = {}
+    first: Dict[str, Path] = {}
+    for program_path, source_paths in programs.items():
+        if not source_paths:
+            groups[program_path] = []
+            continue
+        fingerprint = source_fingerprint(program_path, source_paths)
+        if fingerprint in first:
+            groups[first[fingerprint]].append(program_path)
+        else:
+            first[fingerprint] = program_path
+            groups[program_path] = []
+    return groups
@@ -0,0 +1,381 @@
+"""Module that hands the programs of a batch out to workers on other hosts.
+
+A coordinator keeps a queue of jobs, each the source files of one program,
+in a multiprocessing manager that workers connect to over TCP. A worker
+takes jobs, writes their sources into its own directory, runs them and sends
+the results back. Workers heartbeat while they run so a job leased to a
+worker that stopped answering is handed to another worker, up to
+max_attempts times.
+
+Jobs and results are pickled so the coordinator and every worker must share
+an authkey and trust each other.
+"""
+
+import os
+import time
+import queue
+import shutil
+import socket
+import threading
+import traceback
+from collections import namedtuple, deque
+from multiprocessing.managers import BaseManager
+from os import PathLike
+from pathlib import Path
+from typing import (
+    Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+)
+
+from autograde.components.archive import open_source
+
+# files maps the names of a program's source files relative to its folder
+# to their content. attempt counts from 1.
+Job = namedtuple("Job", ["job_id", "name", "files", "attempt"])
+# result is None if every attempt failed and errors holds why each failed.
+JobResult = namedtuple("JobResult", ["job_id", "result", "errors"])
+Address = Tuple[str, int]
+
+
+def parse_address(address: str) -> Address:
+    """Returns the host and port of an address written as host:port."""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Address isn't host:port: {address}")
+    return host, int(port)
+
+
+def pack_program(
+        program_path: PathLike,
+        source_paths: Sequence[PathLike]) -> Dict[str, bytes]:
+    """Returns a program's source files by their names in its folder.
+
+    Source files outside of the program's folder are named by their file
+    name. A program that is an archive is named by the paths in it.
+    """
+    program_path = Path(program_path).resolve()
+    files = {}
+    for source_path in source_paths:
+        source_path = Path(source_path).resolve()
+        try:
+            name = source_path.relative_to(program_path).as_posix()
+        except ValueError:
+            name = source_path.name
+        with open_source(source_path) as source:
+            files[name] = source.read()
+    return files
+
+
+def unpack_program(files: Mapping[str, bytes], path: PathLike) -> List[Path]:
+    """Writes the files made by pack_program into path.
+
+    raises:
+        ValueError: If a name would be written outside of path.
+    returns:
+        The paths of the files that were written.
+    """
+    path = Path(path).resolve()
+    paths = []
+    for name, data in files.items():
+        file_path = (path / name).resolve()
+        if path not in file_path.parents:
+            raise ValueError(f"Source file is outside of the program: {name}")
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(data)
+        paths.append(file_path)
+    return paths
+
+
+class Coordinator(object):
+    """The queue of jobs that workers take from and return results to.
+
+    It lives in the manager's server process and every method may be called
+    at once from the threads that serve the workers.
+
+    attributes:
+        lease_timeout: The number of seconds a worker may go without being
+            heard from before its jobs are handed to other workers.
+        max_attempts: The number of times a job is tried before it fails.
+    """
+
+    def __init__(self, lease_timeout: float = 30, max_attempts: int = 3):
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._settings: Dict[str, Any] = {}
+        self._jobs: Dict[int, Job] = {}
+        self._pending: Deque[int] = deque()
+        self._leases: Dict[int, str] = {}
+        self._errors: Dict[int, List[str]] = {}
+        self._seen: Dict[str, float] = {}
+        self._done: set = set()
+        self._closed = False
+        self._results: queue.Queue = queue.Queue()
+        self._condition = threading.Condition()
+
+    def configure(self, settings: Mapping[str, Any]):
+        """Sets the keyword arguments every job is run with."""
+        with self._condition:
+            self._settings = dict(settings)
+
+    def settings(self) -> Dict[str, Any]:
+        """Returns the keyword arguments every job is run with."""
+        return self._settings
+
+    def add_job(self, name: str, files: Mapping[str, bytes]) -> int:
+        """Queues a program and returns the id of its job."""
+        with self._condition:
+            job_id = len(self._jobs)
+            self._jobs[job_id] = Job(job_id, name, dict(files), 0)
+            self._errors[job_id] = []
+            self._pending.append(job_id)
+            self._condition.notify()
+        return job_id
+
+    def close(self):
+        """Marks that no more jobs will be added."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def finished(self) -> bool:
+        """Returns True once every job of a closed queue has a result."""
+        with self._condition:
+            return self._closed and len(self._done) == len(self._jobs)
+
+    def heartbeat(self, worker_id: str):
+        """Marks that a worker is alive."""
+        with self._condition:
+            self._seen[worker_id] = time.monotonic()
+
+    def _reap(self):
+        """Takes the jobs back from workers that weren't heard from."""
+        now = time.monotonic()
+        for job_id, worker_id in list(self._leases.items()):
+            if now - self._seen.get(worker_id, now) > self.lease_timeout:
+                self._retry(job_id, f"{worker_id} stopped responding")
+
+    def _retry(self, job_id: int, error: str):
+        """Queues a failed job again or fails it after max_attempts."""
+        del self._leases[job_id]
+        self._errors[job_id].append(error)
+        if self._jobs[job_id].attempt >= self.max_attempts:
+            self._finish(job_id, None)
+        else:
+            self._pending.appendleft(job_id)
+            self._condition.notify()
+
+    def _finish(self, job_id: int, result: Any):
+        """Records the result of a job and drops its sources."""
+        self._jobs[job_id] = self._jobs[job_id]._replace(files={})
+        self._done.add(job_id)
+        self._results.put(JobResult(job_id, result, self._errors[job_id]))
+        self._condition.notify_all()
+
+    def get_job(self, worker_id: str, timeout: float = 1) -> Optional[Job]:
+        """Leases the next job to a worker.
+
+        args:
+            worker_id: The worker that takes the job.
+            timeout: The number of seconds to wait for a job.
+        returns:
+            The job or None if there wasn't one within timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._seen[worker_id] = time.monotonic()
+            while True:
+                self._reap()
+                if self._pending:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (
+                        self._closed and len(self._done) == len(self._jobs)):
+                    return None
+                self._condition.wait(min(remaining, self.lease_timeout))
+            job_id = self._pending.popleft()
+            job = self._jobs[job_id]._replace(
+                attempt=self._jobs[job_id].attempt + 1
+            )
+            self._jobs[job_id] = job
+            self._leases[job_id] = worker_id
+            return job
+
+    def put_result(self, worker_id: str, job_id: int, result: Any):
+        """Records the result of a job from the worker that leased it.
+
+        Results of leases that were already taken back are dropped.
+        """
+        with self._condition:
+            self._seen[worker_id] = time.monotonic()
+            if self._leases.get(job_id) == worker_id:
+                del self._leases[job_id]
+                self._finish(job_id, result)
+
+    def fail(self, worker_id: str, job_id: int, error: str):
+        """Records that a worker couldn't run a job so it is retried."""
+        with self._condition:
+            self._seen[worker_id] = time.monotonic()
+            if self._leases.get(job_id) == worker_id:
+                self._retry(job_id, f"{worker_id}: {error}")
+
+    def next_result(self, timeout: float = 1) -> Optional[JobResult]:
+        """Returns the next finished job or None if none finish in time."""
+        with self._condition:
+            self._reap()
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+_coordinator: Optional[Coordinator] = None
+
+
+def set_coordinator(lease_timeout: float, max_attempts: int):
+    """Creates the coordinator of the manager's server process."""
+    global _coordinator
+    _coordinator = Coordinator(lease_timeout, max_attempts)
+
+
+def get_coordinator() -> Coordinator:
+    """Returns the coordinator of the manager's server process."""
+    return _coordinator
+
+
+class CoordinatorManager(BaseManager):
+    """A manager that serves a Coordinator to workers over TCP."""
+
+
+CoordinatorManager.register("coordinator", callable=get_coordinator)
+
+
+def start_coordinator(
+        address: Address, authkey: bytes, lease_timeout: float = 30,
+        max_attempts: int = 3) -> CoordinatorManager:
+    """Starts a coordinator in a server process that listens on address.
+
+    args:
+        address: The host and port to listen on. Port 0 picks a free port
+            which is found in the manager's address.
+        authkey: The key workers authenticate with.
+        lease_timeout: See Coordinator.
+        max_attempts: See Coordinator.
+    returns:
+        The started manager. Its coordinator method returns a proxy of the
+            coordinator and shutdown stops it.
+    """
+    manager = CoordinatorManager(address=address, authkey=authkey)
+    manager.start(set_coordinator, (lease_timeout, max_attempts))
+    return manager
+
+
+def connect_coordinator(
+        address: Address, authkey: bytes, retry_timeout: float = 0
+) -> Any:
+    """Returns a proxy of the coordinator at address.
+
+    args:
+        address: The host and port of the coordinator.
+        authkey: The key to authenticate with.
+        retry_timeout: The number of seconds to keep retrying to connect to
+            a coordinator that hasn't started yet.
+    """
+    deadline = time.monotonic() + retry_timeout
+    while True:
+        manager = CoordinatorManager(address=address, authkey=authkey)
+        try:
+            manager.connect()
+            return manager.coordinator()
+        except ConnectionRefusedError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_worker(
+        address: Address, authkey: bytes,
+        run: Callable[[Path, List[Path], Dict[str, Any]], Any],
+        work_path: PathLike, jobs: int = 1,
+        worker_id: Optional[str] = None, heartbeat: float = 5,
+        retry_timeout: float = 0) -> int:
+    """Runs jobs from a coordinator until it has no more.
+
+    Each job is written into its own directory in work_path which is removed
+    once its result is sent. A job that raises is reported to the
+    coordinator with its traceback so it is retried.
+
+    args:
+        address: The host and port of the coordinator.
+        authkey: The key to authenticate with.
+        run: Runs a job given the program's folder, its source files and
+            the coordinator's settings and returns a picklable result.
+        work_path: The directory to write the programs into.
+        jobs: The number of jobs to run at once.
+        worker_id: The name of the worker. Defaults to the host and process.
+        heartbeat: The number of seconds between heartbeats. It should be
+            well below the coordinator's lease_timeout.
+        retry_timeout: See connect_coordinator.
+    returns:
+        The number of jobs that were run.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    coordinator = connect_coordinator(address, authkey, retry_timeout)
+    work_path = Path(work_path)
+    stopped = threading.Event()
+    counts = [0] * jobs
+    settings: List[Dict[str, Any]] = []
+    settings_lock = threading.Lock()
+
+    def get_settings() -> Dict[str, Any]:
+        # The settings are configured before the first job is added so they
+        # are fetched with the first job.
+        with settings_lock:
+            if not settings:
+                settings.append(coordinator.settings())
+            return settings[0]
+
+    def beat():
+        while not stopped.wait(heartbeat):
+            try:
+                coordinator.heartbeat(worker_id)
+            except (OSError, EOFError):
+                return
+
+    def run_job(job: Job):
+        job_path = work_path / f"{worker_id}-{job.job_id}-{job.attempt}"
+        program_path = job_path / job.name
+        try:
+            source_paths = unpack_program(job.files, program_path)
+            result = run(program_path, source_paths, get_settings())
+        except Exception:
+            coordinator.fail(worker_id, job.job_id, traceback.format_exc())
+            return False
+        finally:
+            shutil.rmtree(job_path, ignore_errors=True)
+        coordinator.put_result(worker_id, job.job_id, result)
+        return True
+
+    def work(slot: int):
+        try:
+            while not stopped.is_set():
+                job = coordinator.get_job(worker_id)
+                if job is not None:
+                    counts[slot] += run_job(job)
+                elif coordinator.finished():
+                    return
+        except (OSError, EOFError):
+            # The coordinator went away.
+            return
+
+    heart = threading.Thread(target=beat, daemon=True)
+    heart.start()
+    threads = [
+        threading.Thread(target=work, args=(slot,)) for slot in range(jobs)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        stopped.set()
+    return sum(counts)
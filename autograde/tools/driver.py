@@ -0,0 +1,458 @@
+"""Module that contains functions for calling the C++ compiler directly."""
+
+import os
+import shlex
+import asyncio
+import shutil
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from time import monotonic
+from pathlib import Path
+from os import PathLike
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from autograde.components.program import Program
+from autograde.tools.execute import decode_output
+from autograde.tools.metrics import (
+    combine_metrics, read_output, start_process, wait_process
+)
+from autograde.tools.result import CompileResult, PhaseMetrics
+
+if TYPE_CHECKING:
+    from autograde.tools.cache import ObjectCache
+    from autograde.tools.pch import PrecompiledHeader
+
+CommandOutput = Tuple[str, str, int, Optional[PhaseMetrics]]
+
+TRANSLATION_UNIT_SUFFIXES = (".cpp", ".cc", ".cxx", ".c++", ".C")
+UNITY_DIR = ".unity"
+
+
+def find_compiler() -> str:
+    """Returns the name of the C++ compiler found on the system.
+
+    The CXX environment variable takes precedence over the compilers found on
+    the path.
+    """
+    if os.environ.get("CXX"):
+        return os.environ["CXX"]
+    for compiler in ("g++", "clang++", "c++"):
+        if shutil.which(compiler) is not None:
+            return compiler
+    return "g++"
+
+
+@lru_cache(maxsize=None)
+def get_compiler_identity(compiler: str) -> str:
+    """Returns a string that identifies the compiler and its version.
+
+    args:
+        compiler: The name or path of the compiler.
+    returns:
+        The resolved path of the compiler followed by the first line its
+            version output.
+    """
+    compiler_path = shutil.which(compiler) or compiler
+    try:
+        proc_status = subprocess.run(
+            [compiler_path, "--version"], capture_output=True, text=True
+        )
+        version = next(iter(proc_status.stdout.splitlines()), "")
+    except OSError:
+        version = ""
+    return f"{Path(compiler_path).resolve()}:{version}"
+
+
+def get_translation_units(program: Program) -> List[Path]:
+    """Returns the source files of a program that are compiled to objects.
+
+    The entry point is always first so that the order is stable.
+
+    args:
+        program: The program whose translation units to find.
+    returns:
+        The resolved paths of the program's translation units.
+    """
+    sources = sorted(
+        program.source_files - {program.entry_point}, key=lambda sf: sf.path
+    )
+    if program.entry_point is not None:
+        sources.insert(0, program.entry_point)
+    return [
+        sf.path.resolve() for sf in sources
+        if sf.path.suffix in TRANSLATION_UNIT_SUFFIXES
+    ]
+
+
+def write_unity_source(sources: Sequence[Path], target_path: Path) -> Path:
+    """Writes a translation unit that includes every translation unit.
+
+    The file is kept in a hidden directory of target_path so it is never
+    collected as a source of the program. It is only rewritten when the
+    translation units change so that builds that check timestamps don't
+    rebuild it.
+
+    args:
+        sources: The resolved paths of the translation units.
+        target_path: The directory that holds the build files.
+    returns:
+        The path to the unity translation unit.
+    """
+    unity_path = target_path / UNITY_DIR / "unity.cpp"
+    content = "".join(f'#include "{source}"\n' for source in sources)
+    try:
+        if unity_path.read_text() == content:
+            return unity_path
+    except OSError:
+        unity_path.parent.mkdir(parents=True, exist_ok=True)
+    unity_path.write_text(content)
+    return unity_path
+
+
+def get_build_sources(
+        program: Program, target_path: Path,
+        unity: bool = False) -> List[Path]:
+    """Returns the translation units to compile a program from.
+
+    args:
+        program: The program to compile.
+        target_path: The directory that holds the build files.
+        unity: Compile every translation unit as one. Programs with a single
+            translation unit are compiled as they are.
+    returns:
+        The program's translation units or the unity translation unit.
+    """
+    sources = get_translation_units(program)
+    if unity and len(sources) > 1:
+        return [write_unity_source(sources, target_path)]
+    return sources
+
+
+def get_object_paths(
+        sources: Sequence[Path], target_path: Path) -> List[Path]:
+    """Returns a unique object file path in target_path for each source.
+
+    args:
+        sources: The translation units to name objects for.
+        target_path: The directory that holds the object files.
+    returns:
+        The object paths in the same order as sources.
+    """
+    objects = []
+    used = set()
+    for source in sources:
+        obj = target_path / f"{source.stem}.o"
+        index = 1
+        while obj in used:
+            obj = target_path / f"{source.stem}_{index}.o"
+            index += 1
+        used.add(obj)
+        objects.append(obj)
+    return objects
+
+
+def get_command_line(command: Sequence[str]) -> str:
+    """Returns a command as a shell command line ending in a newline."""
+    return " ".join(shlex.quote(str(part)) for part in command) + "\n"
+
+
+def run_command(
+        command: Sequence[str], cwd: PathLike, echo: bool = True
+) -> CommandOutput:
+    """Runs a command and returns its output in the style of scons.
+
+    The command line is echoed at the top of stdout like scons does.
+
+    args:
+        command: The command to run.
+        cwd: The directory to run the command in.
+        echo: Echo the command line at the top of stdout.
+    returns:
+        The stdout, stderr, return code and metrics of the command. The
+            metrics are None if the command couldn't be started.
+    """
+    command_line = get_command_line(command) if echo else ""
+    start = monotonic()
+    try:
+        process = start_process(
+            command, cwd=cwd, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError as error:
+        return (command_line, f"{error}\n", 127, None)
+    stdout, stderr = read_output(process)
+    metrics = wait_process(process, start)
+    return (
+        f"{command_line}{decode_output(stdout)}", decode_output(stderr),
+        process.returncode, metrics
+    )
+
+
+async def run_command_async(
+        command: Sequence[str], cwd: PathLike, echo: bool = True,
+        semaphore: Optional[asyncio.Semaphore] = None
+) -> CommandOutput:
+    """Runs a command from an event loop like run_command.
+
+    The event loop reaps the process itself so only the wall time of the
+    command is measured and its cpu times and peak memory are None.
+
+    args:
+        command: The command to run.
+        cwd: The directory to run the command in.
+        echo: Echo the command line at the top of stdout.
+        semaphore: A semaphore to hold while the command runs to limit how
+            many commands run at once.
+    returns:
+        The stdout, stderr, return code and metrics of the command.
+    """
+    command_line = get_command_line(command) if echo else ""
+    async with semaphore or contextlib.nullcontext():
+        start = monotonic()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *(str(part) for part in command), cwd=cwd,
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except OSError as error:
+            return (command_line, f"{error}\n", 127, None)
+        stdout, stderr = await process.communicate()
+        metrics = PhaseMetrics(monotonic() - start)
+    return (
+        f"{command_line}{decode_output(stdout)}", decode_output(stderr),
+        process.returncode, metrics
+    )
+
+
+def add_metrics(
+        first: Optional[PhaseMetrics],
+        second: Optional[PhaseMetrics]) -> PhaseMetrics:
+    """Returns the metrics of two processes that ran one after the other."""
+    return combine_metrics(
+        sum(metric.wall for metric in (first, second) if metric is not None),
+        (first, second)
+    )
+
+
+def compile_object(
+        compiler: str, flags: Sequence[str], source: Path, obj: Path,
+        target_path: Path, pch_flags: Sequence[str] = (),
+        object_cache: Optional["ObjectCache"] = None) -> CommandOutput:
+    """Compiles a translation unit to an object unless it is cached.
+
+    With a cache the translation unit is preprocessed first to find its
+    key. The command line of a cached object is echoed as if it was run.
+
+    args:
+        compiler: The compiler to use.
+        flags: Extra flags to give the compiler.
+        source: The translation unit to compile.
+        obj: The path of the object to compile it to.
+        target_path: The directory to run the compiler in.
+        pch_flags: The flags that use a precompiled header.
+        object_cache: A cache of objects shared by every program.
+    returns:
+        The stdout, stderr, return code and metrics like run_command.
+    """
+    command = [*flags, *pch_flags, "-o", obj, "-c", source]
+    if object_cache is None:
+        return run_command([compiler, *command], target_path)
+    preprocessed = run_command(
+        [compiler, *flags, *pch_flags, "-E", "-P", source], target_path,
+        echo=False
+    )
+    if preprocessed[2] != 0:
+        return run_command([compiler, *command], target_path)
+    key = object_cache.key(preprocessed[0], compiler, flags)
+    if object_cache.get(key, obj):
+        return (
+            get_command_line([compiler, *command]), "", 0, preprocessed[3]
+        )
+    stdout, stderr, return_code, metrics = run_command(
+        [compiler, *command], target_path
+    )
+    if return_code == 0 and not stderr:
+        object_cache.put(key, obj)
+    return (
+        stdout, stderr, return_code, add_metrics(preprocessed[3], metrics)
+    )
+
+
+async def compile_object_async(
+        compiler: str, flags: Sequence[str], source: Path, obj: Path,
+        target_path: Path, pch_flags: Sequence[str] = (),
+        object_cache: Optional["ObjectCache"] = None,
+        semaphore: Optional[asyncio.Semaphore] = None) -> CommandOutput:
+    """Compiles a translation unit like compile_object from an event loop.
+
+    The object cache is read and written in a thread so that copying objects
+    doesn't block the event loop.
+    """
+    command = [*flags, *pch_flags, "-o", obj, "-c", source]
+    if object_cache is None:
+        return await run_command_async(
+            [compiler, *command], target_path, semaphore=semaphore
+        )
+    preprocessed = await run_command_async(
+        [compiler, *flags, *pch_flags, "-E", "-P", source], target_path,
+        echo=False, semaphore=semaphore
+    )
+    if preprocessed[2] != 0:
+        return await run_command_async(
+            [compiler, *command], target_path, semaphore=semaphore
+        )
+    key = object_cache.key(preprocessed[0], compiler, flags)
+    if await asyncio.to_thread(object_cache.get, key, obj):
+        return (
+            get_command_line([compiler, *command]), "", 0, preprocessed[3]
+        )
+    stdout, stderr, return_code, metrics = await run_command_async(
+        [compiler, *command], target_path, semaphore=semaphore
+    )
+    if return_code == 0 and not stderr:
+        await asyncio.to_thread(object_cache.put, key, obj)
+    return (
+        stdout, stderr, return_code, add_metrics(preprocessed[3], metrics)
+    )
+
+
+def compile_cpp_direct(
+        program: Program, target_path: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        max_workers: Optional[int] = None,
+        pch: Optional["PrecompiledHeader"] = None,
+        unity: bool = False,
+        object_cache: Optional["ObjectCache"] = None) -> CompileResult:
+    """Compile a cpp program by calling the compiler without scons.
+
+    Each translation unit is compiled to an object in parallel and then the
+    objects are linked into an executable named after the entry point.
+
+    args:
+        program: Represents the program which you want to compile. Should
+            have an entry point.
+        target_path: The path to store the object files and executable.
+        compiler: The compiler to use. If None then one is found.
+        flags: Extra flags to give the compiler.
+        max_workers: The number of translation units to compile at once.
+        pch: A precompiled header to use for the translation units that it
+            fits.
+        unity: Compile every translation unit as one. See get_build_sources.
+        object_cache: A cache of objects to reuse the translation units
+            that other programs share with this one from. See
+            compile_object.
+
+    Returns:
+        A CompileResult Namedtuple which consists of the path to the
+            executable, output from stdout, output from stderr, and the
+            return code.
+    """
+    start = monotonic()
+    target_path = Path(target_path).resolve()
+    compiler = compiler or find_compiler()
+    flags = list(flags or [])
+    sources = get_build_sources(program, target_path, unity=unity)
+    objects = get_object_paths(sources, target_path)
+    pch_flags = [
+        [] if pch is None else pch.get_flags(source, compiler, flags)
+        for source in sources
+    ]
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+        outputs = list(executor.map(
+            lambda job: compile_object(
+                compiler, flags, job[0], job[1], target_path,
+                pch_flags=job[2], object_cache=object_cache
+            ),
+            zip(sources, objects, pch_flags)
+        ))
+    if object_cache is not None:
+        object_cache.flush()
+    executable: Optional[Path] = None
+    if program.entry_point is not None:
+        executable = target_path / program.entry_point.path.name
+        executable = executable.with_suffix(".exe")
+    return_code = next((rc for _, _, rc, _ in outputs if rc != 0), 0)
+    if return_code == 0 and executable is not None:
+        outputs.append(run_command(
+            [compiler, *flags, "-o", executable, *objects], target_path
+        ))
+        return_code = outputs[-1][2]
+    if return_code != 0:
+        executable = None
+    return CompileResult(
+        executable, "".join(out for out, _, _, _ in outputs),
+        "".join(err for _, err, _, _ in outputs), return_code,
+        metrics=combine_metrics(
+            monotonic() - start, (metrics for _, _, _, metrics in outputs)
+        )
+    )
+
+
+async def compile_cpp_direct_async(
+        program: Program, target_path: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        pch: Optional["PrecompiledHeader"] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        unity: bool = False,
+        object_cache: Optional["ObjectCache"] = None) -> CompileResult:
+    """Compile a cpp program like compile_cpp_direct from an event loop.
+
+    args:
+        program: Represents the program which you want to compile.
+        target_path: The path to store the object files and executable.
+        compiler: The compiler to use. If None then one is found.
+        flags: Extra flags to give the compiler.
+        pch: A precompiled header to use for the translation units that it
+            fits.
+        semaphore: A semaphore that each compiler process holds while it
+            runs. If None then every translation unit is compiled at once.
+        unity: Compile every translation unit as one.
+        object_cache: A cache of objects shared by every program.
+
+    Returns:
+        A CompileResult of compiling the program. Its metrics only have the
+            wall time, see run_command_async.
+    """
+    start = monotonic()
+    target_path = Path(target_path).resolve()
+    compiler = compiler or find_compiler()
+    flags = list(flags or [])
+    sources = get_build_sources(program, target_path, unity=unity)
+    objects = get_object_paths(sources, target_path)
+    outputs = list(await asyncio.gather(*(
+        compile_object_async(
+            compiler, flags, source, obj, target_path,
+            pch_flags=[] if pch is None else pch.get_flags(
+                source, compiler, flags
+            ),
+            object_cache=object_cache, semaphore=semaphore
+        )
+        for source, obj in zip(sources, objects)
+    )))
+    if object_cache is not None:
+        await asyncio.to_thread(object_cache.flush)
+    executable: Optional[Path] = None
+    if program.entry_point is not None:
+        executable = target_path / program.entry_point.path.name
+        executable = executable.with_suffix(".exe")
+    return_code = next((rc for _, _, rc, _ in outputs if rc != 0), 0)
+    if return_code == 0 and executable is not None:
+        outputs.append(await run_command_async(
+            [compiler, *flags, "-o", executable, *objects], target_path,
+            semaphore=semaphore
+        ))
+        return_code = outputs[-1][2]
+    if return_code != 0:
+        executable = None
+    return CompileResult(
+        executable, "".join(out for out, _, _, _ in outputs),
+        "".join(err for _, err, _, _ in outputs), return_code,
+        metrics=combine_metrics(
+            monotonic() - start, (metrics for _, _, _, metrics in outputs)
+        )
+    )
@@ -1,28 +1,348 @@
 
-
+import os
+import signal
+import asyncio
+import contextlib
+import selectors
 import subprocess
+from collections import deque
 from os import PathLike
 from pathlib import Path
+from time import monotonic
+from typing import Optional, Union
+
+from autograde.tools.compare import Comparator
+from autograde.tools.metrics import READ_SIZE, start_process, wait_process
+from autograde.tools.result import ExecuteResult, PhaseMetrics
+from autograde.tools.sandbox import (
+    ResourceLimits, get_limit_hit, make_preexec_fn
+)
+
+
+class RingBuffer(object):
+    """A buffer that keeps only the most recent bytes written to it.
+
+    attributes:
+        capacity: The maximum number of bytes kept.
+        dropped: The number of bytes dropped to stay within capacity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.dropped = 0
+        self._chunks: deque = deque()
+        self._size = 0
+
+    def write(self, data: bytes):
+        """Appends data to the buffer dropping the oldest bytes if full."""
+        if len(data) > self.capacity:
+            self.dropped += len(data) - self.capacity
+            data = data[len(data) - self.capacity:]
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.capacity:
+            oldest = self._chunks.popleft()
+            excess = self._size - self.capacity
+            if len(oldest) > excess:
+                self._chunks.appendleft(oldest[excess:])
+                oldest = oldest[:excess]
+            self._size -= len(oldest)
+            self.dropped += len(oldest)
+
+    def getvalue(self) -> bytes:
+        """Returns the bytes kept in the buffer."""
+        return b"".join(self._chunks)
+
+
+def decode_output(data: bytes) -> str:
+    """Decodes output with universal newlines like subprocess does."""
+    text = data.decode(errors="replace")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def kill_process_group(
+        process: Union[subprocess.Popen, asyncio.subprocess.Process]):
+    """Kills a process started in its own session and all of its children."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
 
-from autograde.tools.result import ExecuteResult
+
+def execute_program_stream(
+        executable_path: PathLike, cwd: PathLike,
+        program_input: Optional[str] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        buffer_size: int = 1 << 24,
+        limits: Optional[ResourceLimits] = None,
+        comparator: Optional[Comparator] = None) -> ExecuteResult:
+    """Executes a program while streaming its output into bounded buffers.
+
+    The program runs in its own process group so that it and anything it
+    starts are killed together once a limit is hit or its output can no
+    longer match. Each of stdout and stderr keeps only its last buffer_size
+    bytes.
+
+    args:
+        executable_path: The program to execute.
+        cwd: The folder to execute the program from.
+        program_input: Input to give the program. If None then the program's
+            stdin is empty.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes the program may write to stdout
+            and stderr combined.
+        buffer_size: The number of bytes kept of each of stdout and stderr.
+        limits: Resource limits to apply to the program with setrlimit.
+        comparator: A comparator to feed stdout to as it is read. The
+            program is killed as soon as the comparator finds a mismatch.
+    returns:
+        Returns the result of running the program. timed_out is set if the
+            program was killed for running too long and truncated is set if
+            any output was not kept. metrics holds the wall time, cpu times
+            and peak memory of the program and its children. limit_hit
+            names the resource limit the program ran into, if any. verdict
+            is the comparator's verdict.
+    """
+    executable_path = Path(executable_path)
+    stdin = subprocess.DEVNULL if program_input is None else subprocess.PIPE
+    start = monotonic()
+    process = start_process(
+        [executable_path.resolve()], cwd=cwd, stdin=stdin,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=None if limits is None else make_preexec_fn(limits)
+    )
+    deadline = None if timeout is None else monotonic() + timeout
+    buffers = {
+        process.stdout: RingBuffer(buffer_size),
+        process.stderr: RingBuffer(buffer_size),
+    }
+    pending_input = memoryview(
+        b"" if program_input is None else program_input.encode()
+    )
+    timed_out = over_limit = mismatched = False
+    output_size = 0
+    with selectors.DefaultSelector() as selector:
+        for stream in buffers:
+            selector.register(stream, selectors.EVENT_READ)
+        if process.stdin is not None:
+            os.set_blocking(process.stdin.fileno(), False)
+            selector.register(process.stdin, selectors.EVENT_WRITE)
+        while selector.get_map():
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+            for key, _ in selector.select(remaining):
+                if key.fileobj is process.stdin:
+                    try:
+                        written = os.write(key.fd, pending_input[:READ_SIZE])
+                        pending_input = pending_input[written:]
+                    except BrokenPipeError:
+                        pending_input = pending_input[:0]
+                    if not pending_input:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                    continue
+                data = os.read(key.fd, READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                buffers[key.fileobj].write(data)
+                output_size += len(data)
+                if (comparator is not None and key.fileobj is process.stdout
+                        and not comparator.feed(data)):
+                    mismatched = True
+            if output_limit is not None and output_size > output_limit:
+                over_limit = True
+                break
+            if mismatched:
+                break
+    if timed_out or over_limit or mismatched:
+        kill_process_group(process)
+    remaining = None if deadline is None else max(deadline - monotonic(), 0)
+    metrics = wait_process(process, start, remaining)
+    if metrics is None:
+        timed_out = True
+        kill_process_group(process)
+        metrics = wait_process(process, start)
+    for stream in (process.stdin, process.stdout, process.stderr):
+        if stream is not None:
+            stream.close()
+    stdout, stderr = (
+        decode_output(buffers[stream].getvalue())
+        for stream in (process.stdout, process.stderr)
+    )
+    truncated = over_limit or any(
+        buffer.dropped for buffer in buffers.values()
+    )
+    limit_hit = None
+    if limits is not None and not (timed_out or over_limit or mismatched):
+        limit_hit = get_limit_hit(
+            limits, process.returncode, stderr, metrics=metrics
+        )
+    return ExecuteResult(
+        stdout, stderr, process.returncode, timed_out=timed_out,
+        truncated=truncated, metrics=metrics, limit_hit=limit_hit,
+        verdict=None if comparator is None else comparator.finish()
+    )
 
 
 def execute_program(
         executable_path: PathLike, cwd: PathLike,
-        program_input=None) -> ExecuteResult:
+        program_input=None, timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+        comparator: Optional[Comparator] = None) -> ExecuteResult:
     """Executes the program indicated on the path.
 
     args:
         executable_path: The program to execute.
         cwd: The folder to execute the program from.
+        program_input: Input to give the program.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
+        limits: Resource limits to apply to the program.
+        comparator: A comparator to check stdout with while it streams.
     returns:
         Returns the result of running the program.
     """
-    executable_path = Path(executable_path)
-    proc_status = subprocess.run(
-        [str(executable_path.resolve())], cwd=cwd,
-        capture_output=True, text=True, input=program_input
+    return execute_program_stream(
+        executable_path, cwd, program_input=program_input, timeout=timeout,
+        output_limit=output_limit, limits=limits, comparator=comparator
     )
+
+
+async def execute_program_async(
+        executable_path: PathLike, cwd: PathLike,
+        program_input: Optional[str] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        buffer_size: int = 1 << 24,
+        limits: Optional[ResourceLimits] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        comparator: Optional[Comparator] = None) -> ExecuteResult:
+    """Executes a program like execute_program_stream from an event loop.
+
+    The program is killed with its process group once it runs past the
+    timeout, writes more than output_limit bytes or its output can no longer
+    match. The event loop reaps the
+    program so only its wall time is measured.
+
+    args:
+        executable_path: The program to execute.
+        cwd: The folder to execute the program from.
+        program_input: Input to give the program. If None then the program's
+            stdin is empty.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes the program may write to stdout
+            and stderr combined.
+        buffer_size: The number of bytes kept of each of stdout and stderr.
+        limits: Resource limits to apply to the program with setrlimit.
+        semaphore: A semaphore to hold while the program runs to limit how
+            many programs run at once.
+        comparator: A comparator to feed stdout to as it is read.
+    returns:
+        Returns the result of running the program.
+    """
+    async with semaphore or contextlib.nullcontext():
+        return await _execute_async(
+            Path(executable_path), cwd, program_input, timeout,
+            output_limit, buffer_size, limits, comparator
+        )
+
+
+async def _execute_async(
+        executable_path: Path, cwd: PathLike, program_input: Optional[str],
+        timeout: Optional[float], output_limit: Optional[int],
+        buffer_size: int, limits: Optional[ResourceLimits],
+        comparator: Optional[Comparator]) -> ExecuteResult:
+    """Executes a program for execute_program_async."""
+    stdin = subprocess.DEVNULL if program_input is None else subprocess.PIPE
+    start = monotonic()
+    process = await asyncio.create_subprocess_exec(
+        str(executable_path.resolve()), cwd=cwd, stdin=stdin,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=None if limits is None else make_preexec_fn(limits)
+    )
+    stdout_buffer = RingBuffer(buffer_size)
+    stderr_buffer = RingBuffer(buffer_size)
+    state = {
+        "output_size": 0, "timed_out": False, "over_limit": False,
+        "mismatched": False
+    }
+
+    def stop(reason: str):
+        if not (state["timed_out"] or state["over_limit"]
+                or state["mismatched"]):
+            state[reason] = True
+            kill_process_group(process)
+
+    async def read(stream: asyncio.StreamReader, buffer: RingBuffer):
+        # Output is read until the end even after a kill so that the pipes
+        # are closed once the process group is gone.
+        while True:
+            data = await stream.read(READ_SIZE)
+            if not data:
+                return
+            if state["over_limit"] or state["mismatched"]:
+                continue
+            buffer.write(data)
+            state["output_size"] += len(data)
+            if output_limit is not None and (
+                    state["output_size"] > output_limit):
+                stop("over_limit")
+            elif (comparator is not None and buffer is stdout_buffer
+                    and not comparator.feed(data)):
+                stop("mismatched")
+
+    async def write(data: bytes):
+        try:
+            process.stdin.write(data)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        process.stdin.close()
+
+    timer = None
+    if timeout is not None:
+        timer = asyncio.get_running_loop().call_later(
+            timeout, stop, "timed_out"
+        )
+    try:
+        tasks = [
+            read(process.stdout, stdout_buffer),
+            read(process.stderr, stderr_buffer)
+        ]
+        if process.stdin is not None:
+            tasks.append(write(program_input.encode()))
+        await asyncio.gather(*tasks)
+        await process.wait()
+    except asyncio.CancelledError:
+        kill_process_group(process)
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+    metrics = PhaseMetrics(monotonic() - start)
+    stdout = decode_output(stdout_buffer.getvalue())
+    stderr = decode_output(stderr_buffer.getvalue())
+    timed_out, over_limit = state["timed_out"], state["over_limit"]
+    mismatched = state["mismatched"]
+    truncated = over_limit or bool(
+        stdout_buffer.dropped or stderr_buffer.dropped
+    )
+    limit_hit = None
+    if limits is not None and not (timed_out or over_limit or mismatched):
+        limit_hit = get_limit_hit(
+            limits, process.returncode, stderr, metrics=metrics
+        )
     return ExecuteResult(
-        proc_status.stdout, proc_status.stderr,
-        proc_status.returncode)
+        stdout, stderr, process.returncode, timed_out=timed_out,
+        truncated=truncated, metrics=metrics, limit_hit=limit_hit,
+        verdict=None if comparator is None else comparator.finish()
+    )
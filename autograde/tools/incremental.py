@@ -0,0 +1,186 @@
+"""Module that contains an incremental build of a program outside its sources.
+
+The objects, dependency files and executable of a program are kept in a build
+directory along with a manifest of the command each object was compiled with
+and the hashes of the files it was compiled from. A later build only compiles
+the translation units whose command, source or included headers changed and
+only links when an object changed.
+"""
+
+import os
+import re
+import json
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from os import PathLike
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+from autograde.components.program import Program
+from autograde.tools.cache import hash_file
+from autograde.tools.driver import (
+    find_compiler, get_compiler_identity, get_object_paths,
+    get_build_sources, run_command
+)
+from autograde.tools.metrics import combine_metrics
+from autograde.tools.result import CompileResult
+
+if TYPE_CHECKING:
+    from autograde.tools.pch import PrecompiledHeader
+
+MANIFEST_NAME = "incremental.json"
+DEPFILE_SEPARATOR = re.compile(r'(?<!\\)\s+')
+
+
+def read_depfile(path: PathLike) -> List[Path]:
+    """Returns the prerequisites listed in a make style dependency file.
+
+    args:
+        path: The path to a dependency file written by the compiler's -MMD.
+    returns:
+        The files that the object depends on, including its source.
+    """
+    with open(path, 'rt') as depfile:
+        content = depfile.read().replace("\\\n", " ")
+    _, _, prerequisites = content.partition(": ")
+    return [
+        Path(name.replace("\\ ", " "))
+        for name in DEPFILE_SEPARATOR.split(prerequisites.strip()) if name
+    ]
+
+
+def load_manifest(target_path: Path) -> Dict[str, Any]:
+    """Returns the manifest of the last build in target_path."""
+    try:
+        with (target_path / MANIFEST_NAME).open('rt') as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(target_path: Path, manifest: Dict[str, Any]):
+    """Replaces the manifest in target_path."""
+    partial_path = target_path / f"{MANIFEST_NAME}.{os.getpid()}"
+    with partial_path.open('wt') as partial:
+        json.dump(manifest, partial)
+    os.replace(partial_path, target_path / MANIFEST_NAME)
+
+
+def is_up_to_date(
+        obj: Path, command: Sequence[str],
+        entry: Optional[Dict[str, Any]]) -> bool:
+    """Returns True if an object was built by command from unchanged files.
+
+    args:
+        obj: The path to the object.
+        command: The command that would build the object.
+        entry: The manifest's entry for the object.
+    """
+    if entry is None or entry["command"] != list(command) or not obj.exists():
+        return False
+    try:
+        return all(
+            hash_file(path) == digest
+            for path, digest in entry["inputs"].items()
+        )
+    except OSError:
+        return False
+
+
+def compile_cpp_incremental(
+        program: Program, target_path: PathLike,
+        compiler: Optional[str] = None,
+        flags: Optional[Sequence[str]] = None,
+        max_workers: Optional[int] = None,
+        pch: Optional["PrecompiledHeader"] = None,
+        unity: bool = False) -> CompileResult:
+    """Compile a cpp program by only rebuilding what changed since last time.
+
+    args:
+        program: Represents the program which you want to compile. Should
+            have an entry point.
+        target_path: The build directory of the program. It should be
+            outside of the program's sources and kept between builds.
+        compiler: The compiler to use. If None then one is found.
+        flags: Extra flags to give the compiler.
+        max_workers: The number of translation units to compile at once.
+        pch: A precompiled header to use for the translation units that it
+            fits.
+        unity: Compile every translation unit as one. See get_build_sources.
+
+    Returns:
+        A CompileResult of the commands that were run. If nothing changed
+            then no commands are run and the last executable is returned.
+    """
+    start = monotonic()
+    target_path = Path(target_path).resolve()
+    target_path.mkdir(parents=True, exist_ok=True)
+    compiler = compiler or find_compiler()
+    flags = list(flags or [])
+    identity = get_compiler_identity(compiler)
+    sources = get_build_sources(program, target_path, unity=unity)
+    objects = get_object_paths(sources, target_path)
+    manifest = load_manifest(target_path)
+    if manifest.get("compiler") != identity:
+        manifest = {}
+    entries = manifest.get("objects", {})
+    commands = {
+        obj: [
+            str(part) for part in [
+                compiler, *flags,
+                *([] if pch is None else pch.get_flags(
+                    source, compiler, flags
+                )),
+                "-MMD", "-MF", obj.with_suffix(".d"), "-o", obj, "-c", source
+            ]
+        ]
+        for source, obj in zip(sources, objects)
+    }
+    stale = [
+        obj for obj in objects
+        if not is_up_to_date(obj, commands[obj], entries.get(str(obj)))
+    ]
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+        outputs = list(executor.map(
+            lambda obj: run_command(commands[obj], target_path), stale
+        ))
+    new_entries = {
+        str(obj): entries[str(obj)] for obj in objects if obj not in stale
+    }
+    for obj, (_, _, return_code, _) in zip(stale, outputs):
+        if return_code == 0:
+            new_entries[str(obj)] = {
+                "command": commands[obj],
+                "inputs": {
+                    str(target_path / path): hash_file(target_path / path)
+                    for path in read_depfile(obj.with_suffix(".d"))
+                }
+            }
+    executable: Optional[Path] = None
+    if program.entry_point is not None:
+        executable = target_path / program.entry_point.path.name
+        executable = executable.with_suffix(".exe")
+    return_code = next((rc for _, _, rc, _ in outputs if rc != 0), 0)
+    link_command = None
+    if return_code == 0 and executable is not None:
+        link_command = [
+            str(part)
+            for part in [compiler, *flags, "-o", executable, *objects]
+        ]
+        if (stale or not executable.exists()
+                or manifest.get("link") != link_command):
+            outputs.append(run_command(link_command, target_path))
+            return_code = outputs[-1][2]
+    if return_code != 0:
+        executable = None
+        link_command = None
+    save_manifest(target_path, {
+        "compiler": identity, "objects": new_entries, "link": link_command
+    })
+    return CompileResult(
+        executable, "".join(out for out, _, _, _ in outputs),
+        "".join(err for _, err, _, _ in outputs), return_code,
+        metrics=combine_metrics(
+            monotonic() - start, (metrics for _, _, _, metrics in outputs)
+        )
+    )
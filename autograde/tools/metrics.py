@@ -0,0 +1,265 @@
+"""Module that contains functions for measuring the phases of a run."""
+
+import os
+import math
+import errno
+import shutil
+import hashlib
+import resource
+import tempfile
+import contextlib
+import selectors
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from time import monotonic, sleep
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+)
+
+import autograde
+from autograde.tools.result import PhaseMetrics
+
+READ_SIZE = 1 << 16
+SHIM_TEMPLATE = Path(autograde.__file__).parent / "templates" / "rss_shim.c"
+
+
+def get_cache_dir() -> Path:
+    """Returns the directory that autograde keeps per user files in."""
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        cache_home = Path.home() / ".cache"
+    return Path(cache_home, "autograde")
+
+
+@lru_cache(maxsize=None)
+def get_rss_shim() -> Optional[Path]:
+    """Returns the path to the compiled rss_shim, compiling it if needed.
+
+    The shim is compiled once per version of its source with the C compiler
+    in $CC, or the first of cc, gcc and clang that is installed, into the
+    autograde directory of $XDG_CACHE_HOME. It is compiled to a temporary
+    file that replaces the shim as a whole so processes that compile it at
+    the same time don't see each other's partial files. Setting
+    AUTOGRADE_RSS_SHIM to 0 turns the shim off.
+
+    returns:
+        The path to the shim or None if it is turned off or couldn't be
+            compiled, in which case wait_process falls back to what wait4
+            reports.
+    """
+    if os.environ.get("AUTOGRADE_RSS_SHIM") == "0":
+        return None
+    source = SHIM_TEMPLATE.read_bytes()
+    shim_path = get_cache_dir() / (
+        f"rss_shim-{hashlib.sha256(source).hexdigest()[:16]}"
+    )
+    if os.access(shim_path, os.X_OK):
+        return shim_path
+    compiler = os.environ.get("CC") or next(
+        (
+            name for name in ("cc", "gcc", "clang")
+            if shutil.which(name) is not None
+        ),
+        None
+    )
+    if compiler is None:
+        return None
+    try:
+        shim_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(
+            prefix=f"{shim_path.name}.", dir=shim_path.parent
+        )
+        os.close(fd)
+    except OSError:
+        return None
+    try:
+        subprocess.run(
+            [compiler, "-O2", "-o", partial_path, str(SHIM_TEMPLATE)],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, check=True
+        )
+        os.chmod(partial_path, 0o755)
+        os.replace(partial_path, shim_path)
+    except (OSError, subprocess.CalledProcessError):
+        with contextlib.suppress(OSError):
+            os.unlink(partial_path)
+        return None
+    return shim_path
+
+
+def start_process(
+        command: Sequence[Any], **popen_args: Any) -> subprocess.Popen:
+    """Starts a command whose peak memory wait_process can measure.
+
+    The command is started through the rss_shim when it is available. A
+    command that can't be found raises like it does with Popen.
+
+    args:
+        command: The command to run.
+        popen_args: Keyword arguments for Popen.
+    raises:
+        FileNotFoundError: If the command isn't on the path.
+    """
+    command = [str(part) for part in command]
+    shim_path = get_rss_shim()
+    if shim_path is None:
+        return subprocess.Popen(command, **popen_args)
+    if os.sep not in command[0] and shutil.which(command[0]) is None:
+        raise FileNotFoundError(
+            errno.ENOENT, os.strerror(errno.ENOENT), command[0]
+        )
+    read_fd, write_fd = os.pipe()
+    try:
+        process = subprocess.Popen(
+            [str(shim_path), str(write_fd), *command], pass_fds=(write_fd,),
+            **popen_args
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+    process.rss_fd = read_fd
+    return process
+
+
+def read_shim_rss(process: subprocess.Popen) -> Optional[int]:
+    """Returns the peak memory the rss_shim of a reaped process reported.
+
+    returns:
+        The peak resident set size in kilobytes or None if the process
+            wasn't started through the shim or was killed before the
+            shim reported it.
+    """
+    read_fd = getattr(process, "rss_fd", None)
+    if read_fd is None:
+        return None
+    process.rss_fd = None
+    with open(read_fd, "rb") as report:
+        data = report.read()
+    try:
+        return int(data)
+    except ValueError:
+        return None
+
+
+def read_output(process: subprocess.Popen) -> Tuple[bytes, bytes]:
+    """Reads a process's stdout and stderr until both are closed.
+
+    Unlike Popen.communicate the process isn't waited for so that it can be
+    reaped by wait_process.
+    """
+    chunks: Dict[int, List[bytes]] = {
+        process.stdout.fileno(): [], process.stderr.fileno(): []
+    }
+    with selectors.DefaultSelector() as selector:
+        for stream in (process.stdout, process.stderr):
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                chunks[key.fd].append(data)
+    process.stdout.close()
+    process.stderr.close()
+    return tuple(b"".join(chunks[fd]) for fd in chunks)
+
+
+def wait_process(
+        process: subprocess.Popen, start: float,
+        timeout: Optional[float] = None) -> Optional[PhaseMetrics]:
+    """Waits for a process and returns what it and its children used.
+
+    The process is reaped with wait4 so the cpu times include every
+    descendant the process waited for. The peak resident set size is the
+    one the rss_shim reported for processes started through it. Otherwise
+    it is the one wait4 reports, which is at least the peak of the process
+    the program was forked from since Linux keeps it across exec. The
+    process's returncode is set as if Popen.wait had been called.
+
+    args:
+        process: The process to wait for.
+        start: The monotonic time the process was started at.
+        timeout: The number of seconds to wait. If None then wait forever.
+    returns:
+        The metrics of the process or None if it didn't exit in time.
+    """
+    deadline = None if timeout is None else monotonic() + timeout
+    delay = 0.0005
+    while True:
+        flags = 0 if deadline is None else os.WNOHANG
+        pid, status, usage = os.wait4(process.pid, flags)
+        if pid != 0:
+            break
+        if monotonic() >= deadline:
+            return None
+        sleep(min(delay, max(deadline - monotonic(), 0)))
+        delay = min(delay * 2, 0.01)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    max_rss = usage.ru_maxrss
+    if hasattr(process, "rss_fd"):
+        max_rss = read_shim_rss(process)
+    return PhaseMetrics(
+        monotonic() - start, usage.ru_utime, usage.ru_stime, max_rss
+    )
+
+
+def measure_call(
+        function: Callable[..., Any], *args: Any, **kwargs: Any
+) -> Tuple[Any, PhaseMetrics]:
+    """Calls a function and returns its result and what the call used.
+
+    The cpu times are those of the calling thread, so work the function
+    hands to other threads isn't counted. Peak memory isn't measured since
+    it would be the peak of the whole process.
+    """
+    start = monotonic()
+    before = resource.getrusage(resource.RUSAGE_THREAD)
+    result = function(*args, **kwargs)
+    after = resource.getrusage(resource.RUSAGE_THREAD)
+    return result, PhaseMetrics(
+        monotonic() - start, after.ru_utime - before.ru_utime,
+        after.ru_stime - before.ru_stime
+    )
+
+
+def sum_measured(values: Iterable[Optional[float]]) -> Optional[float]:
+    """Returns the sum of the values that were measured or None."""
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def combine_metrics(
+        wall: float, metrics: Iterable[Optional[PhaseMetrics]]
+) -> PhaseMetrics:
+    """Returns the metrics of a phase made up of many processes.
+
+    args:
+        wall: The wall time of the whole phase.
+        metrics: The metrics of each process in the phase.
+    returns:
+        The cpu times and overheads summed and the largest peak resident
+            set size. A value that no process measured is None.
+    """
+    metrics = [metric for metric in metrics if metric is not None]
+    peaks = [
+        metric.max_rss for metric in metrics if metric.max_rss is not None
+    ]
+    return PhaseMetrics(
+        wall, sum_measured(metric.user for metric in metrics),
+        sum_measured(metric.sys for metric in metrics),
+        max(peaks) if peaks else None,
+        sum_measured(metric.overhead for metric in metrics)
+    )
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Returns the q-th percentile of values using the nearest rank."""
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
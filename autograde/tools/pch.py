@@ -0,0 +1,116 @@
+"""Module that contains a precompiled header shared by a batch of programs."""
+
+import os
+import re
+import hashlib
+from pathlib import Path
+from os import PathLike
+from typing import List, Optional, Sequence, Set
+
+from autograde.tools.driver import (
+    find_compiler, get_compiler_identity, run_command
+)
+from autograde.tools.result import Result
+
+DEFAULT_PCH_HEADERS = ("iostream", "string", "vector", "map")
+INCLUDE_PATTERN = re.compile(r'^[ \t]*#[ \t]*include[ \t]*<([^>\n]+)>', re.M)
+
+
+def get_system_includes(source_path: PathLike) -> Set[str]:
+    """Returns the names of the <...> headers that a source file includes."""
+    with open(source_path, 'rt', errors='replace') as source:
+        return set(INCLUDE_PATTERN.findall(source.read()))
+
+
+class PrecompiledHeader(object):
+    """A precompiled header for a set of includes common to a batch.
+
+    The header is built once with build and then given to the compiler with
+    -include for every translation unit that includes all of the headers
+    itself, so a program never sees declarations it didn't ask for. A
+    translation unit that misses a header or that is compiled with another
+    compiler or other flags is compiled normally.
+
+    Headers are kept in a directory named after the compiler, flags and
+    includes so that a directory can be shared by many batches.
+
+    attributes:
+        headers: The names of the headers that are precompiled.
+        compiler: The compiler the header is built with.
+        flags: The flags the header is built with.
+        header_path: The path to the header that includes every header.
+    """
+
+    def __init__(
+            self, path: PathLike, headers: Sequence[str] = DEFAULT_PCH_HEADERS,
+            compiler: Optional[str] = None,
+            flags: Optional[Sequence[str]] = None):
+        self.headers = tuple(headers)
+        self.compiler = compiler or find_compiler()
+        self.flags = tuple(flags or ())
+        self._identity = get_compiler_identity(self.compiler)
+        digest = hashlib.sha256("\0".join(
+            (self._identity, *self.flags, "", *self.headers)
+        ).encode()).hexdigest()
+        self.header_path = (
+            Path(path).resolve() / f"pch-{digest[:16]}" / "autograde_pch.h"
+        )
+
+    @property
+    def compiled_path(self) -> Path:
+        """Returns the path the compiler looks for the built header at."""
+        suffix = ".pch" if "clang" in self._identity else ".gch"
+        return self.header_path.with_name(self.header_path.name + suffix)
+
+    @property
+    def ready(self) -> bool:
+        """Returns True if the header has been built."""
+        return self.compiled_path.exists()
+
+    def build(self) -> Result:
+        """Builds the header unless it was already built.
+
+        returns:
+            The Result of running the compiler.
+        """
+        if self.ready:
+            return Result("", "", 0)
+        self.header_path.parent.mkdir(parents=True, exist_ok=True)
+        self.header_path.write_text("".join(
+            f"#include <{header}>\n" for header in self.headers
+        ))
+        partial_path = self.compiled_path.with_name(
+            f"{self.compiled_path.name}.{os.getpid()}"
+        )
+        stdout, stderr, return_code, _ = run_command(
+            [
+                self.compiler, *self.flags, "-x", "c++-header",
+                self.header_path, "-o", partial_path
+            ],
+            self.header_path.parent
+        )
+        if return_code == 0:
+            os.replace(partial_path, self.compiled_path)
+        elif partial_path.exists():
+            partial_path.unlink()
+        return Result(stdout, stderr, return_code)
+
+    def get_flags(
+            self, source_path: PathLike, compiler: str,
+            flags: Optional[Sequence[str]] = None) -> List[str]:
+        """Returns the flags that use the header for a translation unit.
+
+        args:
+            source_path: The translation unit being compiled.
+            compiler: The compiler it is compiled with.
+            flags: The flags it is compiled with.
+        returns:
+            The flags to add to the compile command which are empty if the
+                header can't be used.
+        """
+        if (compiler != self.compiler or tuple(flags or ()) != self.flags
+                or not self.ready):
+            return []
+        if not set(self.headers) <= get_system_includes(source_path):
+            return []
+        return ["-include", str(self.header_path)]
@@ -0,0 +1,241 @@
+"""A module that keeps a pool of long lived containers to run programs in."""
+
+import os
+import json
+import queue
+import select
+import subprocess
+import threading
+from uuid import uuid4
+from pathlib import Path
+from os import PathLike
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from autograde.components.cpp_components import CppProgram
+from autograde.tools.container import make_build_info, parse_result
+from autograde.tools.result import CompileResult, ExecuteResult
+
+
+class WorkerError(Exception):
+    """Raised when a worker container stops answering."""
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when a worker container doesn't reply in time."""
+
+
+class ContainerWorker(object):
+    """A long lived container that answers jobs over its stdin and stdout.
+
+    attributes:
+        name: The name of the container.
+        jobs: The number of jobs the worker has run.
+    """
+
+    def __init__(
+            self, command: Sequence[str], mount_path: Path, mount_point: str,
+            image: str):
+        self.name = f"autograde-worker-{uuid4().hex[:12]}"
+        self.jobs = 0
+        self._command = list(command)
+        self._process = subprocess.Popen(
+            [
+                *self._command, "run", "-i", "--rm", "--name", self.name,
+                "-v", f"{mount_path}:{mount_point}:ro", image, "--serve"
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True, bufsize=1
+        )
+
+    def request(
+            self, message: Dict[str, Any],
+            timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Sends a message to the worker and returns its reply.
+
+        args:
+            message: The message to send.
+            timeout: The number of seconds to wait for a reply.
+        raises:
+            WorkerTimeout: If the worker doesn't reply in time.
+            WorkerError: If the worker stopped.
+        """
+        try:
+            self._process.stdin.write(json.dumps(message) + "\n")
+            self._process.stdin.flush()
+            readable, _, _ = select.select(
+                [self._process.stdout], [], [], timeout
+            )
+            if not readable:
+                raise WorkerTimeout(
+                    f"{self.name} did not reply in {timeout} seconds."
+                )
+            line = self._process.stdout.readline()
+        except (OSError, ValueError) as error:
+            raise WorkerError(f"{self.name} failed: {error}") from error
+        if not line:
+            raise WorkerError(f"{self.name} did not reply.")
+        return json.loads(line)
+
+    def is_healthy(self, timeout: float) -> bool:
+        """Returns True if the worker answers a ping within timeout."""
+        if self._process.poll() is not None:
+            return False
+        try:
+            return self.request({"type": "ping"}, timeout)["type"] == "pong"
+        except (WorkerError, ValueError, KeyError):
+            return False
+
+    def stop(self, timeout: float = 5):
+        """Stops the worker and removes its container."""
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            subprocess.run(
+                [*self._command, "kill", self.name],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+
+
+class ContainerPool(object):
+    """A pool of long lived containers that compile and run programs.
+
+    Every program run through the pool must be inside of mount_path which is
+    mounted read only into each container at mount_point. Workers are started
+    lazily, checked with a ping before each job and replaced once they have
+    run max_jobs jobs or stop answering. A worker that doesn't finish a job
+    within the job's timeout and job_margin seconds is killed, so a stuck
+    compile or program can't hang the pool.
+
+    attributes:
+        mount_path: The directory that holds the programs.
+        size: The maximum number of workers.
+        max_jobs: The number of jobs after which a worker is recycled.
+        job_margin: The number of seconds a job may take on top of its
+            timeout to compile the program. If None then jobs never expire.
+    """
+
+    def __init__(
+            self, mount_path: PathLike, size: Optional[int] = None,
+            image: str = "cpp-container", max_jobs: int = 100,
+            command: Sequence[str] = ("docker",), mount_point: str = "/build",
+            health_timeout: float = 10, job_margin: Optional[float] = 120):
+        self.mount_path = Path(mount_path).resolve()
+        self.size = size or os.cpu_count()
+        self.max_jobs = max_jobs
+        self.job_margin = job_margin
+        self.image = image
+        self.command = list(command)
+        self.mount_point = mount_point
+        self.health_timeout = health_timeout
+        self._idle: queue.Queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._workers: set = set()
+        self._lock = threading.Lock()
+
+    def _start_worker(self) -> ContainerWorker:
+        """Starts a new worker and tracks it."""
+        worker = ContainerWorker(
+            self.command, self.mount_path, self.mount_point, self.image
+        )
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _stop_worker(self, worker: ContainerWorker, timeout: float = 5):
+        """Stops a worker and forgets it. See ContainerWorker.stop."""
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop(timeout)
+
+    def _acquire(self) -> ContainerWorker:
+        """Returns a healthy worker that isn't due to be recycled."""
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            return self._start_worker()
+        if (worker.jobs >= self.max_jobs
+                or not worker.is_healthy(self.health_timeout)):
+            self._stop_worker(worker)
+            return self._start_worker()
+        return worker
+
+    def _container_path(self, path: Path) -> str:
+        """Returns where a host path is found inside of the containers."""
+        relative_path = path.resolve().relative_to(self.mount_path)
+        if relative_path == Path():
+            return self.mount_point
+        return f"{self.mount_point}/{relative_path.as_posix()}"
+
+    def run(
+            self, program: CppProgram, program_input: Optional[str] = None,
+            timeout: Optional[float] = None,
+            output_limit: Optional[int] = None, retries: int = 1
+            ) -> Tuple[Optional[CompileResult], Optional[ExecuteResult]]:
+        """Compiles and runs a cpp program in one of the pool's workers.
+
+        args:
+            program: A cpp program inside of the pool's mount_path.
+            program_input: Input to give the program.
+            timeout: The number of seconds the program may run for.
+            output_limit: The number of bytes of output the program may
+                write.
+            retries: The number of times to retry the job on a new worker if
+                a worker dies while running it. A job that expired isn't
+                retried.
+        returns:
+            Returns the results of the compiling and running steps of the
+                program in the same form as compile_run_cpp. A job that
+                expired has a failed compile result whose stderr says why.
+        """
+        if program.entry_point is None:
+            return (None, None)
+        build_paths = {sf.path.parent for sf in program.source_files}
+        build_paths.add(program.entry_point.path.parent)
+        build_path_map = {
+            build_path: self._container_path(build_path)
+            for build_path in build_paths
+        }
+        build_info = make_build_info(
+            program, build_path_map, program_input=program_input,
+            timeout=timeout, output_limit=output_limit
+        )
+        deadline = None
+        if self.job_margin is not None:
+            deadline = (timeout or 0) + self.job_margin
+        with self._slots:
+            for attempt in range(retries + 1):
+                worker = self._acquire()
+                try:
+                    result = worker.request(
+                        {"type": "job", "build_info": build_info}, deadline
+                    )
+                except WorkerTimeout as error:
+                    self._stop_worker(worker, timeout=0)
+                    return (CompileResult(None, "", str(error), -1), None)
+                except WorkerError:
+                    self._stop_worker(worker)
+                    if attempt == retries:
+                        raise
+                    continue
+                worker.jobs += 1
+                self._idle.put(worker)
+                return parse_result(result)
+
+    def close(self):
+        """Stops every worker in the pool."""
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._stop_worker(worker)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def __enter__(self) -> "ContainerPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
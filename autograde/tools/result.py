@@ -4,11 +4,32 @@ from collections import namedtuple
 from typing import List
 
 _Result = namedtuple("_Result", ["stdout", "stderr", "return_code"])
+# mode is how the program was built: "per_file", "unity" or
+# "unity_fallback" when a unity build failed and it was built per file.
+# parse_metrics are the metrics of finding and parsing the program's sources
+# before it was compiled.
 _CompileResult = namedtuple(
-    "_CompileResult", ["executable", "stdout", "stderr", "return_code"]
+    "_CompileResult",
+    [
+        "executable", "stdout", "stderr", "return_code", "cached", "metrics",
+        "mode", "parse_metrics"
+    ],
+    defaults=(False, None, "per_file", None)
 )
 _ExecuteResult = namedtuple(
-    "_ExecuteResult", ["stdout", "stderr", "return_code"]
+    "_ExecuteResult",
+    [
+        "stdout", "stderr", "return_code", "timed_out", "truncated",
+        "metrics", "limit_hit", "verdict"
+    ],
+    defaults=(False, False, None, None, None)
+)
+# The wall and cpu times are in seconds and max_rss is in kilobytes. overhead
+# is the part of wall that a build tool such as scons spent outside of the
+# commands it ran. Values that weren't measured are None.
+PhaseMetrics = namedtuple(
+    "PhaseMetrics", ["wall", "user", "sys", "max_rss", "overhead"],
+    defaults=(None, None, None, None)
 )
 
 
@@ -0,0 +1,110 @@
+"""Module that contains resource limits for the programs that are executed.
+
+The limits are applied with setrlimit in the child process before the program
+is started so a program can't use more than its share of the host even
+without a container.
+"""
+
+import signal
+import resource
+from collections import namedtuple
+from typing import Callable, Optional, Tuple
+
+from autograde.tools.result import PhaseMetrics
+
+# cpu_time is in seconds and memory and file_size are in bytes. A limit that
+# is None isn't applied.
+ResourceLimits = namedtuple(
+    "ResourceLimits",
+    ["cpu_time", "memory", "file_size", "processes", "open_files"],
+    defaults=(None, None, None, None, None)
+)
+
+LIMIT_RESOURCES = {
+    "memory": resource.RLIMIT_AS,
+    "file_size": resource.RLIMIT_FSIZE,
+    "processes": resource.RLIMIT_NPROC,
+    "open_files": resource.RLIMIT_NOFILE,
+}
+# A program killed with a peak memory of at least this fraction of its memory
+# limit is taken to have run out of memory.
+MEMORY_EXHAUSTED_FRACTION = 0.9
+# Messages that the C and C++ runtimes print when a limit makes a call fail.
+LIMIT_MESSAGES = {
+    "memory": ("std::bad_alloc", "Cannot allocate memory", "out of memory"),
+    "processes": ("Resource temporarily unavailable",),
+    "open_files": ("Too many open files",),
+}
+
+
+def get_cpu_limits(cpu_time: float) -> Tuple[int, int]:
+    """Returns the soft and hard RLIMIT_CPU of a cpu_time limit."""
+    soft_limit = max(int(cpu_time), 1)
+    return soft_limit, soft_limit + 1
+
+
+def make_preexec_fn(limits: ResourceLimits) -> Callable[[], None]:
+    """Returns a function that applies limits to the process it runs in.
+
+    The function is meant for the preexec_fn of subprocess.Popen. The soft
+    limit of cpu_time is one second below the hard limit so the program gets
+    SIGXCPU before it is killed. Core dumps are always disabled.
+
+    The process limit counts every process of the user that runs the program
+    so it should be above the number of processes that user already runs.
+    Limits aren't enforced on processes run by root.
+    """
+    def set_limits():
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if limits.cpu_time is not None:
+            resource.setrlimit(
+                resource.RLIMIT_CPU, get_cpu_limits(limits.cpu_time)
+            )
+        for name, limit in LIMIT_RESOURCES.items():
+            value = getattr(limits, name)
+            if value is not None:
+                resource.setrlimit(limit, (value, value))
+    return set_limits
+
+
+def get_limit_hit(
+        limits: ResourceLimits, return_code: int, stderr: str,
+        metrics: Optional[PhaseMetrics] = None) -> Optional[str]:
+    """Returns the name of the limit a program ran into or None.
+
+    The cpu_time and file_size limits are found from the signal that stopped
+    the program. The other limits only make calls in the program fail so
+    they are found from the error the runtime printed.
+
+    SIGKILL is also sent by the OOM killer and by anything that stops a
+    program early, so it only counts as the hard cpu_time limit when the
+    program's cpu time reached it. Otherwise it counts as the memory limit
+    if the program's peak memory was close to that limit.
+
+    args:
+        limits: The limits the program ran with.
+        return_code: The return code of the program.
+        stderr: What the program wrote to stderr.
+        metrics: The metrics of running the program. Without its cpu time
+            and peak memory a SIGKILL isn't put down to a limit.
+    """
+    if limits.cpu_time is not None and return_code == -signal.SIGXCPU:
+        return "cpu_time"
+    if return_code == -signal.SIGKILL and metrics is not None:
+        if (limits.cpu_time is not None and metrics.user is not None
+                and metrics.sys is not None
+                and metrics.user + metrics.sys
+                >= get_cpu_limits(limits.cpu_time)[1]):
+            return "cpu_time"
+        if (limits.memory is not None and metrics.max_rss is not None
+                and metrics.max_rss * 1024
+                >= limits.memory * MEMORY_EXHAUSTED_FRACTION):
+            return "memory"
+    if limits.file_size is not None and return_code == -signal.SIGXFSZ:
+        return "file_size"
+    if return_code != 0:
+        for name, messages in LIMIT_MESSAGES.items():
+            if getattr(limits, name) is not None and any(
+                    message in stderr for message in messages):
+                return name
+    return None
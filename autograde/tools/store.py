@@ -0,0 +1,278 @@
+"""Module that contains an append only store of the results of batch runs."""
+
+import os
+import gzip
+import json
+import hashlib
+from pathlib import Path
+from os import PathLike
+from time import time
+from typing import (
+    Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+)
+
+from autograde.tools.cache import hash_sources
+from autograde.tools.compare import Verdict
+from autograde.tools.result import CompileResult, ExecuteResult, PhaseMetrics
+from autograde.tools.testcase import CaseResult, TestCase
+
+Text = Union[str, Dict[str, Any]]
+
+
+def make_fingerprint(
+        source_paths: Iterable[PathLike], **settings: Any) -> str:
+    """Returns a digest of a program's sources and what it is run with.
+
+    args:
+        source_paths: The paths to the program's source files.
+        settings: Json serializable values that change the program's results
+            such as its input.
+    returns:
+        A hex digest that changes if a source or setting changes.
+    """
+    fingerprint_data = json.dumps(
+        {"sources": hash_sources(source_paths), "settings": settings},
+        sort_keys=True, default=str
+    ).encode()
+    return hashlib.sha256(fingerprint_data).hexdigest()
+
+
+class ResultStore(object):
+    """A JSONL file of the results of compiling and running programs.
+
+    Each result is appended as one json line as soon as it is recorded so a
+    batch never holds more than one result in memory and an interrupted batch
+    keeps every result recorded before it stopped. Output longer than
+    inline_limit bytes is gzipped into a blob named after its hash and the
+    line refers to the blob instead, so identical outputs are stored once.
+
+    A program that is recorded more than once is described by its last line.
+    Programs are identified by their resolved path.
+
+    attributes:
+        path: The directory that holds the store.
+        inline_limit: The number of bytes of output kept inside of a line.
+    """
+
+    RESULTS_NAME = "results.jsonl"
+
+    def __init__(self, path: PathLike, inline_limit: int = 4096):
+        self.path = Path(path)
+        self.inline_limit = inline_limit
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def results_path(self) -> Path:
+        """Returns the path to the JSONL file."""
+        return self.path / self.RESULTS_NAME
+
+    def _blob_path(self, digest: str) -> Path:
+        """Returns the path of a blob."""
+        return self.path / "blobs" / digest[:2] / f"{digest}.gz"
+
+    def put_text(self, text: Optional[str]) -> Optional[Text]:
+        """Returns text or a reference to a blob that holds it."""
+        if text is None:
+            return None
+        data = text.encode()
+        if len(data) <= self.inline_limit:
+            return text
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            partial_path = blob_path.with_name(f"{digest}.{os.getpid()}")
+            partial_path.write_bytes(gzip.compress(data))
+            os.replace(partial_path, blob_path)
+        return {"blob": digest, "size": len(data)}
+
+    def get_text(self, value: Optional[Text]) -> Optional[str]:
+        """Returns the text stored by put_text."""
+        if not isinstance(value, dict):
+            return value
+        return gzip.decompress(
+            self._blob_path(value["blob"]).read_bytes()
+        ).decode()
+
+    def _encode_execute(
+            self, execute_result: ExecuteResult) -> Dict[str, Any]:
+        """Returns a json serializable ExecuteResult."""
+        return {
+            "stdout": self.put_text(execute_result.stdout),
+            "stderr": self.put_text(execute_result.stderr),
+            "return_code": execute_result.return_code,
+            "timed_out": execute_result.timed_out,
+            "truncated": execute_result.truncated,
+            "metrics": encode_metrics(execute_result.metrics),
+            "limit_hit": execute_result.limit_hit,
+            "verdict": None if execute_result.verdict is None else (
+                execute_result.verdict._asdict()
+            )
+        }
+
+    def record(
+            self, program_path: PathLike,
+            run_result: Tuple[Any, Optional[CompileResult], Any],
+            **fields: Any) -> Dict[str, Any]:
+        """Appends the result of compiling and running a program.
+
+        args:
+            program_path: The path to the program.
+            run_result: The program, its CompileResult and either its
+                ExecuteResult or a list of the CaseResults of its test cases.
+            fields: Extra json serializable fields to keep with the result.
+        returns:
+            The line that was appended.
+        """
+        program, compile_result, execute_result = run_result
+        entry_point = getattr(program, "entry_point", None)
+        line: Dict[str, Any] = {
+            "path": str(Path(program_path).resolve()),
+            "entry_point": None if entry_point is None else str(
+                entry_point.path
+            ),
+            "time": time(), "compile": None, "execute": None, "cases": None,
+            **fields
+        }
+        if compile_result is not None:
+            executable = compile_result.executable
+            line["compile"] = {
+                "executable": None if executable is None else str(executable),
+                "stdout": self.put_text(compile_result.stdout),
+                "stderr": self.put_text(compile_result.stderr),
+                "return_code": compile_result.return_code,
+                "cached": compile_result.cached,
+                "metrics": encode_metrics(compile_result.metrics),
+                "mode": compile_result.mode,
+                "parse_metrics": encode_metrics(compile_result.parse_metrics)
+            }
+        if isinstance(execute_result, list):
+            line["cases"] = [
+                {
+                    "name": case.name, "passed": case_passed,
+                    "execute": self._encode_execute(case_execute_result)
+                }
+                for case, case_execute_result, case_passed in execute_result
+            ]
+        elif execute_result is not None:
+            line["execute"] = self._encode_execute(execute_result)
+        data = (json.dumps(line) + "\n").encode()
+        with self.results_path.open("a+b") as results:
+            if results.seek(0, os.SEEK_END) > 0:
+                results.seek(-1, os.SEEK_END)
+                if results.read(1) != b"\n":
+                    # The last write was cut short so end its line.
+                    data = b"\n" + data
+            results.write(data)
+        return line
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Yields every line in the order they were recorded.
+
+        A line that was cut short by an interrupted write is skipped.
+        """
+        try:
+            results = self.results_path.open("rt")
+        except FileNotFoundError:
+            return
+        with results:
+            for line in results:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def latest(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the last line recorded for each program path."""
+        return {line["path"]: line for line in self.records()}
+
+    def find(self, program_path: PathLike) -> Optional[Dict[str, Any]]:
+        """Returns the last line recorded for a program or None."""
+        return self.latest().get(str(Path(program_path).resolve()))
+
+    def failures(self) -> List[Dict[str, Any]]:
+        """Returns the latest lines of programs that didn't succeed.
+
+        A program fails if it has no compile result, didn't compile, exited
+        with an error, hit a limit or failed a test case.
+        """
+        return [line for line in self.latest().values() if not passed(line)]
+
+    def load(
+            self, line: Dict[str, Any]
+    ) -> Tuple[
+            Optional[CompileResult],
+            Union[None, ExecuteResult, List[CaseResult]]]:
+        """Returns the results that a line describes with their output.
+
+        The test cases of case results only have their names.
+
+        args:
+            line: A line from records.
+        returns:
+            The CompileResult and the ExecuteResult or CaseResults.
+        """
+        compile_result = None
+        if line["compile"] is not None:
+            compiled = line["compile"]
+            executable = compiled["executable"]
+            compile_result = CompileResult(
+                None if executable is None else Path(executable),
+                self.get_text(compiled["stdout"]),
+                self.get_text(compiled["stderr"]), compiled["return_code"],
+                cached=compiled["cached"],
+                metrics=decode_metrics(compiled.get("metrics")),
+                mode=compiled.get("mode", "per_file"),
+                parse_metrics=decode_metrics(compiled.get("parse_metrics"))
+            )
+        execute_result: Union[None, ExecuteResult, List[CaseResult]] = None
+        if line["cases"] is not None:
+            execute_result = [
+                CaseResult(
+                    TestCase(case["name"], None, None),
+                    self._decode_execute(case["execute"]), case["passed"]
+                )
+                for case in line["cases"]
+            ]
+        elif line["execute"] is not None:
+            execute_result = self._decode_execute(line["execute"])
+        return compile_result, execute_result
+
+    def _decode_execute(self, executed: Dict[str, Any]) -> ExecuteResult:
+        """Returns the ExecuteResult encoded by _encode_execute."""
+        return ExecuteResult(
+            self.get_text(executed["stdout"]),
+            self.get_text(executed["stderr"]), executed["return_code"],
+            timed_out=executed["timed_out"], truncated=executed["truncated"],
+            metrics=decode_metrics(executed.get("metrics")),
+            limit_hit=executed.get("limit_hit"),
+            verdict=None if executed.get("verdict") is None else Verdict(
+                **executed["verdict"]
+            )
+        )
+
+
+def encode_metrics(
+        metrics: Optional[PhaseMetrics]) -> Optional[Dict[str, float]]:
+    """Returns json serializable PhaseMetrics."""
+    return None if metrics is None else metrics._asdict()
+
+
+def decode_metrics(
+        metrics: Optional[Dict[str, float]]) -> Optional[PhaseMetrics]:
+    """Returns the PhaseMetrics encoded by encode_metrics."""
+    return None if metrics is None else PhaseMetrics(**metrics)
+
+
+def passed(line: Dict[str, Any]) -> bool:
+    """Returns True if a recorded program compiled and ran successfully."""
+    if line["compile"] is None or line["compile"]["return_code"] != 0:
+        return False
+    if line["cases"] is not None:
+        return all(case["passed"] for case in line["cases"])
+    executed = line["execute"]
+    return (
+        executed is not None and executed["return_code"] == 0
+        and not executed["timed_out"] and not executed["truncated"]
+        and executed.get("limit_hit") is None
+    )
@@ -0,0 +1,211 @@
+"""Module that contains functions for running a program against test cases."""
+
+import json
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from os import PathLike
+from typing import List, Optional, Sequence
+
+from autograde.tools.compare import (
+    DEFAULT_TOLERANCE, Comparator, make_comparator
+)
+from autograde.tools.execute import execute_program, execute_program_async
+from autograde.tools.result import ExecuteResult
+from autograde.tools.sandbox import ResourceLimits
+
+TestCase = namedtuple("TestCase", ["name", "input", "expected_output"])
+CaseResult = namedtuple("CaseResult", ["case", "execute_result", "passed"])
+
+
+def load_test_cases(path: PathLike) -> List[TestCase]:
+    """Loads test cases from a directory or a manifest file.
+
+    A directory holds pairs of files named <case>.in and <case>.out. A case
+    without an .out file only checks that the program exits successfully.
+
+    A manifest is a json list of objects with a "name" and either an "input"
+    string or an "input_file" path and optionally either an "expected_output"
+    string or an "output_file" path. File paths are relative to the manifest.
+
+    args:
+        path: The path to a directory of test cases or a manifest.
+    returns:
+        A list of test cases sorted by name.
+    """
+    path = Path(path)
+    test_cases = []
+    if path.is_dir():
+        for input_file in path.glob("*.in"):
+            output_file = input_file.with_suffix(".out")
+            expected_output = None
+            if output_file.exists():
+                expected_output = output_file.read_text()
+            test_cases.append(TestCase(
+                input_file.stem, input_file.read_text(), expected_output
+            ))
+    else:
+        with path.open("rt") as manifest_file:
+            manifest = json.load(manifest_file)
+        for i, case in enumerate(manifest):
+            program_input = case.get("input")
+            if "input_file" in case:
+                program_input = (path.parent / case["input_file"]).read_text()
+            expected_output = case.get("expected_output")
+            if "output_file" in case:
+                expected_output = (
+                    path.parent / case["output_file"]
+                ).read_text()
+            test_cases.append(TestCase(
+                case.get("name", str(i)), program_input, expected_output
+            ))
+    return sorted(test_cases, key=lambda case: case.name)
+
+
+def check_output(
+        test_case: TestCase, execute_result: ExecuteResult) -> bool:
+    """Returns True if the result of executing a program passes a test case.
+
+    The verdict of a program that was executed with a comparator decides
+    whether its output passes. Otherwise the output must be exactly the
+    expected output.
+
+    args:
+        test_case: The test case the program was executed with.
+        execute_result: The result of executing the program.
+    """
+    if (execute_result.timed_out or execute_result.truncated
+            or execute_result.limit_hit is not None):
+        return False
+    if test_case.expected_output is None:
+        return bool(execute_result)
+    if execute_result.verdict is not None:
+        return execute_result.verdict.passed
+    return execute_result.stdout == test_case.expected_output
+
+
+def get_comparator(
+        test_case: TestCase, compare: str,
+        tolerance: float) -> Optional[Comparator]:
+    """Returns a comparator for a test case's expected output or None."""
+    if test_case.expected_output is None:
+        return None
+    return make_comparator(
+        compare, test_case.expected_output, tolerance=tolerance
+    )
+
+
+def run_test_case(
+        executable_path: PathLike, cwd: PathLike, test_case: TestCase,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+        compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE) -> CaseResult:
+    """Runs an executable with the input of a test case and checks it.
+
+    The output is compared while it streams and the program is killed at
+    the first mismatch.
+
+    args:
+        executable_path: The program to execute.
+        cwd: The folder to execute the program from.
+        test_case: The test case to run.
+        timeout: The number of seconds the program may run for.
+        output_limit: The number of bytes of output the program may write.
+        limits: Resource limits to apply to the program.
+        compare: How the output is compared with the expected output,
+            "exact", "whitespace", "numeric" or "lineset". See
+            make_comparator.
+        tolerance: The tolerance of the "numeric" comparison.
+    returns:
+        The result of executing the program and whether it passed.
+    """
+    execute_result = execute_program(
+        executable_path, cwd, program_input=test_case.input,
+        timeout=timeout, output_limit=output_limit, limits=limits,
+        comparator=get_comparator(test_case, compare, tolerance)
+    )
+    return CaseResult(
+        test_case, execute_result, check_output(test_case, execute_result)
+    )
+
+
+def run_test_cases(
+        executable_path: PathLike, cwd: PathLike,
+        test_cases: Sequence[TestCase],
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+        compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE) -> List[CaseResult]:
+    """Runs an already compiled executable against many test cases.
+
+    The executions are spread over a pool of threads since each one mostly
+    waits on its child process.
+
+    args:
+        executable_path: The program to execute.
+        cwd: The folder to execute the program from.
+        test_cases: The test cases to run.
+        max_workers: The number of test cases to run at once.
+        timeout: The number of seconds each execution may run for.
+        output_limit: The number of bytes of output each execution may write.
+        limits: Resource limits to apply to each execution.
+        compare: How the output is compared. See run_test_case.
+        tolerance: The tolerance of the "numeric" comparison.
+    returns:
+        A result for each test case in the same order as test_cases.
+    """
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(
+            lambda test_case: run_test_case(
+                executable_path, cwd, test_case, timeout=timeout,
+                output_limit=output_limit, limits=limits, compare=compare,
+                tolerance=tolerance
+            ),
+            test_cases
+        ))
+
+
+async def run_test_cases_async(
+        executable_path: PathLike, cwd: PathLike,
+        test_cases: Sequence[TestCase],
+        timeout: Optional[float] = None,
+        output_limit: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        compare: str = "exact",
+        tolerance: float = DEFAULT_TOLERANCE) -> List[CaseResult]:
+    """Runs an executable against many test cases from an event loop.
+
+    args:
+        executable_path: The program to execute.
+        cwd: The folder to execute the program from.
+        test_cases: The test cases to run.
+        timeout: The number of seconds each execution may run for.
+        output_limit: The number of bytes of output each execution may write.
+        limits: Resource limits to apply to each execution.
+        semaphore: A semaphore that each execution holds while it runs.
+        compare: How the output is compared. See run_test_case.
+        tolerance: The tolerance of the "numeric" comparison.
+    returns:
+        A result for each test case in the same order as test_cases.
+    """
+    execute_results = await asyncio.gather(*(
+        execute_program_async(
+            executable_path, cwd, program_input=test_case.input,
+            timeout=timeout, output_limit=output_limit, limits=limits,
+            semaphore=semaphore,
+            comparator=get_comparator(test_case, compare, tolerance)
+        )
+        for test_case in test_cases
+    ))
+    return [
+        CaseResult(
+            test_case, execute_result, check_output(test_case, execute_result)
+        )
+        for test_case, execute_result in zip(test_cases, execute_results)
+    ]
@@ -0,0 +1,328 @@
+"""Module that watches a batch for programs whose source files change.
+
+Changes are read from inotify through ctypes where it is available and
+otherwise found by polling the size and modification time of every source
+file. Only files with a source extension in folders that discovery doesn't
+ignore are watched, so the build files written next to a program's sources
+never look like a change. A program that is an archive in the batch changes
+when the archive does.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from abc import abstractmethod
+from pathlib import Path
+from os import PathLike
+from typing import Dict, Iterator, Optional, Sequence, Set, Tuple
+
+from autograde.components.archive import is_archive
+from autograde.components.discovery import DEFAULT_IGNORE, is_ignored
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT = struct.Struct("iIII")
+
+
+class Watcher(object):
+    """Finds the program folders of a batch whose source files changed.
+
+    attributes:
+        batch_path: The directory that holds the programs.
+        extensions: The extensions of source files.
+        ignore: Glob patterns of names that aren't watched.
+    """
+
+    def __init__(
+            self, batch_path: PathLike, extensions: Sequence[str],
+            ignore: Sequence[str] = DEFAULT_IGNORE):
+        self.batch_path = Path(batch_path).resolve()
+        self.extensions = tuple(extensions)
+        self.ignore = tuple(ignore)
+
+    def is_watched(self, name: str) -> bool:
+        """Returns True if a file with the name can change a program."""
+        return name.endswith(self.extensions) or is_archive(name)
+
+    def program_folder(self, path: Path) -> Optional[Path]:
+        """Returns the program folder a path is in or None.
+
+        Paths that are ignored or directly in the batch aren't in a
+        program unless they are archives, which are programs themselves.
+        """
+        try:
+            parts = path.relative_to(self.batch_path).parts
+        except ValueError:
+            return None
+        if len(parts) < 2 and not (parts and is_archive(parts[0])):
+            return None
+        if any(is_ignored(part, self.ignore) for part in parts):
+            return None
+        return self.batch_path / parts[0]
+
+    @abstractmethod
+    def changes(self, timeout: Optional[float] = None) -> Set[Path]:
+        """Waits for changes and returns the program folders that changed.
+
+        args:
+            timeout: The number of seconds to wait. If None then it waits
+                until something changes.
+        returns:
+            The folders that changed since the last call, which is empty if
+                nothing changed within timeout.
+        """
+
+    def close(self):
+        """Stops watching."""
+
+    def __enter__(self) -> "Watcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    """A watcher that compares snapshots of the batch every interval.
+
+    A snapshot only stats the source files, it never reads them.
+
+    attributes:
+        interval: The number of seconds between snapshots.
+    """
+
+    def __init__(
+            self, batch_path: PathLike, extensions: Sequence[str],
+            ignore: Sequence[str] = DEFAULT_IGNORE, interval: float = 1):
+        super().__init__(batch_path, extensions, ignore)
+        self.interval = interval
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """Returns the modification time and size of every source file."""
+        snapshot = {}
+        stack = [os.fspath(self.batch_path)]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if is_ignored(entry.name, self.ignore):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif self.is_watched(entry.name):
+                            stat = entry.stat()
+                            snapshot[Path(entry.path)] = (
+                                stat.st_mtime_ns, stat.st_size
+                            )
+                    except OSError:
+                        continue
+        return snapshot
+
+    def changes(self, timeout: Optional[float] = None) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.snapshot()
+            changed = {
+                path for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            folders = {self.program_folder(path) for path in changed}
+            folders.discard(None)
+            if folders:
+                return folders
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            time.sleep(wait)
+
+
+class InotifyWatcher(Watcher):
+    """A watcher that reads changes from inotify.
+
+    Every directory in the batch that isn't ignored is watched and new
+    directories are watched as they appear. If the kernel's queue of events
+    overflows then every program is reported as changed.
+
+    raises:
+        OSError: If inotify isn't available.
+    """
+
+    def __init__(
+            self, batch_path: PathLike, extensions: Sequence[str],
+            ignore: Sequence[str] = DEFAULT_IGNORE):
+        super().__init__(batch_path, extensions, ignore)
+        try:
+            self._libc = ctypes.CDLL(
+                ctypes.util.find_library("c"), use_errno=True
+            )
+        except OSError as error:
+            raise OSError(errno.ENOSYS, "libc isn't available") from error
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify isn't available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            number = ctypes.get_errno()
+            raise OSError(number, os.strerror(number))
+        self._watches: Dict[int, Path] = {}
+        self._add_tree(self.batch_path)
+
+    def _add_watch(self, path: Path):
+        """Watches a directory."""
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), WATCH_MASK
+        )
+        if wd < 0:
+            number = ctypes.get_errno()
+            if number in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(number, os.strerror(number), str(path))
+        self._watches[wd] = path
+
+    def _add_tree(self, path: Path) -> Set[Path]:
+        """Watches a directory and the directories in it.
+
+        returns:
+            The source files already in the tree.
+        """
+        sources = set()
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            self._add_watch(directory)
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if is_ignored(entry.name, self.ignore):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(Path(entry.path))
+                        elif self.is_watched(entry.name):
+                            sources.add(Path(entry.path))
+                    except OSError:
+                        continue
+        return sources
+
+    def _read(self) -> Set[Path]:
+        """Reads the queued events and returns the paths that changed."""
+        changed: Set[Path] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                name = data[
+                    offset + EVENT.size:offset + EVENT.size + length
+                ].rstrip(b"\0")
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self._add_tree(self.batch_path))
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = directory / os.fsdecode(name)
+                if is_ignored(path.name, self.ignore):
+                    continue
+                if mask & IN_ISDIR:
+                    # The sources of a new directory are changes. A removed
+                    # directory's watch is dropped with IN_IGNORED.
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        changed.update(self._add_tree(path))
+                elif self.is_watched(path.name):
+                    changed.add(path)
+
+    def changes(self, timeout: Optional[float] = None) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = None
+            if deadline is not None:
+                wait = max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self._fd], [], [], wait)
+            if not readable:
+                return set()
+            folders = {self.program_folder(path) for path in self._read()}
+            folders.discard(None)
+            if folders:
+                return folders
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(
+        batch_path: PathLike, extensions: Sequence[str],
+        ignore: Sequence[str] = DEFAULT_IGNORE, polling: bool = False,
+        interval: float = 1) -> Watcher:
+    """Returns an inotify watcher or a polling watcher if it isn't available.
+
+    args:
+        batch_path: The directory that holds the programs.
+        extensions: The extensions of source files.
+        ignore: Glob patterns of names that aren't watched.
+        polling: Always poll, for example on network filesystems that
+            inotify doesn't see the changes of.
+        interval: The number of seconds between polls.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(batch_path, extensions, ignore)
+        except OSError:
+            pass
+    return PollingWatcher(batch_path, extensions, ignore, interval=interval)
+
+
+def debounce(watcher: Watcher, quiet: float = 0.5) -> Iterator[Set[Path]]:
+    """Yields the folders that changed once their changes settle.
+
+    A burst of changes, such as a submission being copied in file by file,
+    is yielded once after nothing changed for quiet seconds.
+
+    args:
+        watcher: The watcher to read changes from.
+        quiet: The number of seconds without changes that ends a burst.
+    """
+    while True:
+        changed = watcher.changes()
+        while True:
+            more = watcher.changes(quiet)
+            if not more:
+                break
+            changed |= more
+        yield changed
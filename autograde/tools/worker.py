@@ -0,0 +1,88 @@
+"""Module that contains the job loop run inside of long lived containers.
+
+A worker reads one json message per line from its input and writes one json
+message per line to its output. A message of type "ping" is answered with a
+"pong" and a message of type "job" is compiled, executed and answered with the
+same result that docker/run.py prints.
+"""
+
+import sys
+import json
+import tempfile
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Mapping, TextIO
+
+from autograde.components.cpp_components import CppProgram, CppSource
+from autograde.tools.build import compile_cpp
+from autograde.tools.execute import execute_program
+
+
+def run_job(
+        build_info: Mapping[str, Any], target_path: PathLike
+) -> Dict[str, Any]:
+    """Compiles and executes the program described by build_info.
+
+    args:
+        build_info: The description of the job made by make_build_info.
+        target_path: The directory to compile the program in.
+    returns:
+        A json serializable dictionary of the compile and execute results.
+    """
+    program = CppProgram()
+    for source_file in build_info["source_files"]:
+        program.add_source(CppSource(source_file))
+    program.set_entry_point(build_info["entry_point"])
+    compile_result = compile_cpp(
+        program, target_path, backend=build_info.get("backend", "scons")
+    )
+    result: Dict[str, Any] = {
+        "compile": {
+            "stdout": compile_result.stdout,
+            "stderr": compile_result.stderr,
+            "return_code": compile_result.return_code
+        },
+        "execute": None
+    }
+    if compile_result.executable is not None:
+        execute_result = execute_program(
+            compile_result.executable, cwd=target_path,
+            program_input=build_info["program_input"],
+            timeout=build_info.get("timeout"),
+            output_limit=build_info.get("output_limit"))
+        result["execute"] = {
+            "stdout": execute_result.stdout,
+            "stderr": execute_result.stderr,
+            "return_code": execute_result.return_code,
+            "timed_out": execute_result.timed_out,
+            "truncated": execute_result.truncated
+        }
+    return result
+
+
+def serve(input_stream: TextIO, output_stream: TextIO):
+    """Answers messages from input_stream until it is closed.
+
+    Each job is compiled in a fresh temporary directory so that jobs don't
+    see each other's build files.
+
+    args:
+        input_stream: The stream to read messages from.
+        output_stream: The stream to write replies to.
+    """
+    for line in input_stream:
+        if not line.strip():
+            continue
+        message = json.loads(line)
+        if message.get("type") == "ping":
+            reply: Dict[str, Any] = {"type": "pong"}
+        else:
+            with tempfile.TemporaryDirectory() as target_path:
+                reply = run_job(message["build_info"], Path(target_path))
+            reply["type"] = "result"
+        output_stream.write(json.dumps(reply) + "\n")
+        output_stream.flush()
+
+
+if __name__ == "__main__":
+    serve(sys.stdin, sys.stdout)
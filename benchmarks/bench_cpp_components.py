@@ -0,0 +1,103 @@
+"""Benchmarks the C++ scanner against the regex it replaced.
+
+Two shapes of source are generated. "definitions" is a file of small function
+definitions and "declarations" is a header of prototypes, which makes the old
+regex backtrack to the end of the file for every prototype.
+
+Run from the root of the repository with
+    python -m benchmarks.bench_cpp_components --lines 1000 4000
+"""
+import re
+import argparse
+from itertools import cycle, product
+from timeit import repeat
+
+from autograde.components.cpp_components import scan_source
+
+LEGACY_FUNCTION_PATTERN = re.compile(
+    r'([a-z|A-Z][a-z|A-Z|0-9|_|<|>|\*]+?)\s+'
+    r'([a-z|A-Z][a-z|A-Z|0-9|_]*?)\s*'
+    r'\((.*?)\)'
+    r'\s*{.*?}',
+    flags=re.DOTALL
+)
+LEGACY_COMMENT_PATTERN = re.compile(r'(//.*?\n|/\*.*?\*/)', flags=re.DOTALL)
+
+
+def legacy_scan(source_code: str):
+    """Scans the source twice with the regular expressions used before."""
+    functions = [
+        match.group(1, 2, 3)
+        for match in LEGACY_FUNCTION_PATTERN.finditer(source_code)
+    ]
+    comments = [
+        match.group(0).strip()
+        for match in LEGACY_COMMENT_PATTERN.finditer(source_code)
+    ]
+    return functions, comments
+
+
+def generate_declarations(num_lines: int) -> str:
+    """Returns a generated C++ header with about num_lines lines."""
+    types = cycle(["int", "float", "double", "long"])
+    lines = ["#pragma once", "// generated header"]
+    for i in range(num_lines):
+        lines.append(f"{next(types)} func_{i}({next(types)} a, int b);")
+    return "\n".join(lines) + "\n"
+
+
+def generate_definitions(num_lines: int) -> str:
+    """Returns generated C++ source code with about num_lines lines."""
+    types = cycle(["int", "float", "double", "long"])
+    lines = ["#include <iostream>", "// generated source"]
+    i = 0
+    while len(lines) < num_lines:
+        return_type = next(types)
+        lines.extend([
+            f"/* function {i} */",
+            f"{return_type} func_{i}({next(types)} a, {next(types)} b) {{",
+            "    for (int j = 0; j < 10; j++) {",
+            "        if (a > b) { a -= b; } else { b -= a; }",
+            "    }",
+            "    const char* text = \"} not a brace {\";",
+            f"    return a + b; // result {i}",
+            "}",
+        ])
+        i += 1
+    lines.append("int main() { return 0; }")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines", nargs="+", type=int, default=[1000, 2000, 4000],
+        help="Sizes in lines of the generated sources.")
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="Number of times to time each scan.")
+    args = parser.parse_args()
+    print(
+        f"{'shape':>12} {'lines':>8} {'legacy (s)':>12} {'scanner (s)':>12} "
+        f"{'speedup':>8}"
+    )
+    shapes = [
+        ("definitions", generate_definitions),
+        ("declarations", generate_declarations),
+    ]
+    for (shape, generate), num_lines in product(shapes, args.lines):
+        source_code = generate(num_lines)
+        legacy = min(repeat(
+            lambda: legacy_scan(source_code), number=1, repeat=args.repeat
+        ))
+        scanner = min(repeat(
+            lambda: scan_source(source_code), number=1, repeat=args.repeat
+        ))
+        print(
+            f"{shape:>12} {num_lines:>8} {legacy:>12.4f} {scanner:>12.4f} "
+            f"{legacy / scanner:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
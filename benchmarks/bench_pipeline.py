@@ -0,0 +1,295 @@
+"""Benchmarks each step of compiling and running a batch of programs.
+
+Synthetic batches are generated in a temporary directory. Every program has a
+main.cpp and files-1 pairs of unit_<n>.cpp and unit_<n>.h, each with about
+lines lines of small functions in the style of the generated code in
+tests/conftest.py. The steps timed are source collection, function and
+comment extraction, compiling, executing and running the whole batch both
+sequentially and concurrently.
+
+The timings are written to a json report. A report from another commit can be
+given with --compare to print the change of every benchmark and exit with an
+error if any of them got slower than --threshold.
+
+Run from the root of the repository with
+    python -m benchmarks.bench_pipeline --output report.json
+    python -m benchmarks.bench_pipeline --compare report.json
+"""
+import sys
+import json
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from itertools import cycle, product
+from pathlib import Path
+from statistics import mean, median
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from autograde.batch_run import batch_run_programs
+from autograde.components.cpp_components import (
+    CppProgram, get_comments, get_functions
+)
+from autograde.tools.build import compile_cpp
+from autograde.tools.driver import find_compiler, get_compiler_identity
+from autograde.tools.execute import execute_program
+
+CPP_TYPES = ["int", "float"]
+
+
+def generate_unit(unit: int, num_lines: int) -> str:
+    """Returns a translation unit of about num_lines lines of functions."""
+    signatures = cycle(
+        types for num_types in range(1, 5)
+        for types in product(CPP_TYPES, repeat=num_types)
+    )
+    lines = [f"// unit {unit}", f'#include "unit_{unit}.h"']
+    i = 0
+    while len(lines) < num_lines:
+        return_type, *arg_types = next(signatures)
+        args = ", ".join(f"{typ} a_{j}" for j, typ in enumerate(arg_types))
+        lines.extend([
+            f"/* function {i} of unit {unit} */",
+            f"{return_type} func_{unit}_{i}({args}) {{",
+            "    return 0;",
+            "}",
+        ])
+        i += 1
+    lines.extend([f"int unit_{unit}() {{", "    return 1;", "}"])
+    return "\n".join(lines) + "\n"
+
+
+def generate_program(path: Path, num_files: int, num_lines: int):
+    """Writes a program of num_files translation units into path."""
+    path.mkdir(parents=True)
+    units = range(1, num_files)
+    for unit in units:
+        Path(path, f"unit_{unit}.h").write_text(f"int unit_{unit}();\n")
+        Path(path, f"unit_{unit}.cpp").write_text(
+            generate_unit(unit, num_lines)
+        )
+    Path(path, "main.cpp").write_text(
+        "#include <iostream>\n"
+        + "".join(f'#include "unit_{unit}.h"\n' for unit in units)
+        + "int main() {\n    int total = 0;\n"
+        + "".join(f"    total += unit_{unit}();\n" for unit in units)
+        + "    std::cout << total << std::endl;\n    return 0;\n}\n"
+    )
+
+
+def generate_batch(
+        path: Path, num_submissions: int, num_files: int,
+        num_lines: int) -> Path:
+    """Writes a batch of num_submissions programs into path."""
+    for submission in range(num_submissions):
+        generate_program(
+            path / f"submission_{submission}", num_files, num_lines
+        )
+    return path
+
+
+def time_call(
+        function: Callable[[], Any], repeat: int,
+        setup: Optional[Callable[[], Any]] = None,
+        number: int = 1) -> Dict[str, Any]:
+    """Returns statistics of the seconds function takes to run.
+
+    args:
+        function: The function to time.
+        repeat: The number of times to time it.
+        setup: A function that is run untimed before each timing.
+        number: The number of calls to average over in each timing, for
+            functions too fast to time one call of.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        times.append((perf_counter() - start) / number)
+    return {
+        "min": min(times), "median": median(times), "mean": mean(times),
+        "times": times
+    }
+
+
+def load_program(path: Path) -> CppProgram:
+    """Returns the program in path with its sources and entry point set."""
+    program = CppProgram(path)
+    program.collect_source()
+    program.set_entry_point()
+    return program
+
+
+def run_benchmarks(
+        root: Path, num_submissions: int, num_files: int, num_lines: int,
+        repeat: int, backend: str) -> Dict[str, Dict[str, Any]]:
+    """Generates a batch in root and times each step on it."""
+    batch_path = generate_batch(
+        root / "batch", num_submissions, num_files, num_lines
+    )
+    program_path = batch_path / "submission_0"
+    build_path = root / "build"
+    sources = [
+        path.read_text() for path in sorted(program_path.glob("*.cpp"))
+    ]
+    program = load_program(program_path)
+
+    def clean_build():
+        shutil.rmtree(build_path, ignore_errors=True)
+        build_path.mkdir()
+
+    def clean_batch():
+        for path in batch_path.glob("*/*"):
+            if path.suffix not in (".cpp", ".h"):
+                path.unlink()
+
+    results = {
+        "collect_source": time_call(
+            lambda: CppProgram(program_path).collect_source(), repeat,
+            number=100
+        ),
+        "get_functions": time_call(
+            lambda: [get_functions(source) for source in sources], repeat,
+            number=20
+        ),
+        "get_comments": time_call(
+            lambda: [get_comments(source) for source in sources], repeat,
+            number=20
+        ),
+        "load_program": time_call(
+            lambda: load_program(program_path), repeat, number=20
+        ),
+        f"compile_cpp[{backend}]": time_call(
+            lambda: compile_cpp(program, build_path, backend=backend),
+            repeat, setup=clean_build
+        ),
+    }
+    executable = compile_cpp(program, build_path, backend=backend).executable
+    results["execute_program"] = time_call(
+        lambda: execute_program(executable, build_path), repeat, number=20
+    )
+    for concurrent in (False, True):
+        name = "concurrent" if concurrent else "sequential"
+        results[f"batch_run_programs[{name}]"] = time_call(
+            lambda: list(batch_run_programs(
+                batch_path, concurrent=concurrent, backend=backend
+            )),
+            repeat, setup=clean_batch
+        )
+    return results
+
+
+def get_commit() -> Optional[str]:
+    """Returns the commit of the repository the benchmarks ran from."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+        report: Dict[str, Any], baseline: Dict[str, Any],
+        threshold: float) -> List[str]:
+    """Prints the change of each benchmark and returns the regressions.
+
+    args:
+        report: The new report.
+        baseline: The report to compare against.
+        threshold: The fraction a benchmark's fastest time may grow by
+            before it is a regression. The fastest time is compared since it
+            is the least disturbed by other work on the machine.
+    returns:
+        The names of the benchmarks that regressed.
+    """
+    regressions = []
+    if report["parameters"] != baseline["parameters"]:
+        print("The baseline was run with other parameters:")
+        print(f"  {baseline['parameters']}")
+    print(f"{'benchmark':<36} {'baseline (s)':>12} {'new (s)':>12} "
+          f"{'change':>8}")
+    for name, timing in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["min"]
+        new = timing["min"]
+        change = new / old - 1 if old else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print(f"{name:<36} {old:>12.4f} {new:>12.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--submissions", type=int, default=8,
+        help="Number of programs in the generated batch.")
+    parser.add_argument(
+        "--files", type=int, default=4,
+        help="Number of translation units in each program.")
+    parser.add_argument(
+        "--lines", type=int, default=200,
+        help="Number of lines in each generated translation unit.")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Number of times to time each step.")
+    parser.add_argument(
+        "--backend", default="direct",
+        choices=["scons", "direct", "incremental"],
+        help="The compile backend to time.")
+    parser.add_argument(
+        "--output", type=Path, default=None,
+        help="Path to write the json report to.")
+    parser.add_argument(
+        "--compare", type=Path, default=None,
+        help="A json report to compare the results with.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="Fraction a fastest time may grow by before it is a "
+             "regression.")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        results = run_benchmarks(
+            Path(root), args.submissions, args.files, args.lines,
+            args.repeat, args.backend
+        )
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "compiler": get_compiler_identity(find_compiler()),
+        "parameters": {
+            "submissions": args.submissions, "files": args.files,
+            "lines": args.lines, "repeat": args.repeat,
+            "backend": args.backend
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with args.output.open("wt") as output:
+            json.dump(report, output, indent=2)
+    if args.compare is not None:
+        with args.compare.open("rt") as baseline:
+            regressions = compare(report, json.load(baseline), args.threshold)
+        if regressions:
+            sys.exit(1)
+    else:
+        for name, timing in results.items():
+            print(
+                f"{name:<36} min {timing['min']:>10.5f}s "
+                f"median {timing['median']:>10.5f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
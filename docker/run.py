@@ -4,44 +4,28 @@ import json
 import argparse
 from pathlib import Path
 
-from autograde import CppProgram
-from autograde.tools import compile_cpp, execute_program
+from autograde.tools.worker import run_job, serve
 
 
 def get_args():
     """Gets command line arguments for the script."""
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        'build_info', help='Path to the assignments.')
+        'build_info', help='Path to the assignments.', nargs='?')
+    parser.add_argument(
+        '--serve', action='store_true',
+        help='Answer json jobs from stdin until it is closed.')
     return parser.parse_args()
 
 
 def main():
     args = get_args()
+    if args.serve:
+        serve(sys.stdin, sys.stdout)
+        return
     target_path = Path()
-    build_path = Path("/", "build")
     build_info = json.loads(args.build_info)
-    program = CppProgram(*build_info["source_files"])
-    program.set_entry_point(build_info["entry_point"])
-    compile_result = compile_cpp(program, target_path)
-
-    result = {
-        "compile": {
-            "stdout": compile_result.stdout,
-            "stderr": compile_result.stderr,
-            "return_code": compile_result.return_code
-        },
-        "execute": None
-    }
-    if compile_result.executable is not None:
-        execute_result = execute_program(
-            compile_result.executable, cwd=target_path,
-            program_input=build_info["program_input"])
-        result["execute"] = {
-            "stdout": execute_result.stdout,
-            "stderr": execute_result.stderr,
-            "return_code": execute_result.return_code
-        }
+    result = run_job(build_info, target_path)
     print(json.dumps(result))
 
 
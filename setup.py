@@ -15,7 +15,7 @@ setup(
         'scons'
     ],
     extras_require={
-
+        'numeric': ['numpy']
     },
     description='A library whose purpose is to help with grading.',
     author='Adolfo Gonzalez III',
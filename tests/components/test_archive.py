@@ -0,0 +1,121 @@
+"""Tests the archive module's functions."""
+
+import tarfile
+import zipfile
+from pathlib import Path
+
+from autograde.components import CppProgram
+from autograde.components.archive import (
+    extract_program, find_includes, safe_name, split_archive_path
+)
+from autograde.components.discovery import discover_sources
+
+FILES = {
+    "src/main.cpp": '#include "util.hpp"\nint main() { return twice(1); }\n',
+    "src/util.hpp": '#include "../inc/base.hpp"\nint twice(int x);\n',
+    "src/util.cpp": (
+        '#include "util.hpp"\nint twice(int x) { return 2 * x; }\n'
+    ),
+    "inc/base.hpp": "#pragma once\n",
+    "inc/unused.hpp": "#pragma once\n",
+    "data/large.txt": "x" * 1000,
+    ".git/hook.cpp": "",
+}
+
+
+def make_zip(path):
+    """Writes FILES into a zip archive."""
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in FILES.items():
+            archive.writestr(name, content)
+    return path
+
+
+def make_tar(path):
+    """Writes FILES into a gzipped tar archive through a folder."""
+    folder = path.parent / "tar_files"
+    with tarfile.open(path, "w:gz") as archive:
+        for name, content in FILES.items():
+            file_path = folder / name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(content)
+            archive.add(file_path, arcname=name)
+    return path
+
+
+def test_safe_name():
+    """Tests that names can't leave the archive."""
+    assert safe_name("./src/../main.cpp") == "main.cpp"
+    assert safe_name("/abs/main.cpp") == "abs/main.cpp"
+    assert safe_name("../main.cpp") is None
+
+
+def test_find_includes():
+    """Tests that quoted includes resolve relative to the including file."""
+    assert find_includes(
+        "src/util.hpp", FILES["src/util.hpp"].encode(), FILES
+    ) == ["inc/base.hpp"]
+    assert find_includes(
+        "src/main.cpp", b"#include <vector>\n#include \"gone.hpp\"\n", FILES
+    ) == []
+
+
+def test_parse_archives(tmp_path):
+    """Tests that archived programs are discovered and parsed in place."""
+    for archive_path in (
+            make_zip(tmp_path / "alice.zip"),
+            make_tar(tmp_path / "bob.tar.gz")):
+        assert discover_sources(archive_path, [".cpp", ".hpp"]) == [
+            archive_path / "inc" / "base.hpp",
+            archive_path / "inc" / "unused.hpp",
+            archive_path / "src" / "main.cpp",
+            archive_path / "src" / "util.cpp",
+            archive_path / "src" / "util.hpp",
+        ]
+        assert split_archive_path(archive_path / "src" / "main.cpp") == (
+            archive_path, "src/main.cpp"
+        )
+        program = CppProgram(archive_path)
+        program.collect_source()
+        program.set_entry_point()
+        assert program.entry_point.path == archive_path / "src" / "main.cpp"
+    assert not (tmp_path / "src").exists()
+
+
+def test_extract_program(tmp_path):
+    """Tests that only the sources and their includes are extracted."""
+    archive_path = make_zip(tmp_path / "alice.zip")
+    program = CppProgram(archive_path)
+    program.collect_source(
+        archive_path / name for name in ("src/main.cpp", "src/util.cpp")
+    )
+    program.set_entry_point()
+    target_path = tmp_path / "build"
+    extracted = extract_program(program, target_path)
+    written = sorted(
+        path.relative_to(target_path).as_posix()
+        for path in target_path.rglob("*") if path.is_file()
+    )
+    assert written == [
+        ".archive_files.json", "inc/base.hpp", "src/main.cpp",
+        "src/util.cpp", "src/util.hpp"
+    ]
+    assert extracted.entry_point.path == target_path / "src" / "main.cpp"
+    assert extracted.index is program.index
+
+    program.source_files = {
+        source for source in program.source_files
+        if source.path.name == "main.cpp"
+    }
+    extract_program(program, target_path)
+    assert not (target_path / "src" / "util.cpp").exists()
+    assert (target_path / "src" / "util.hpp").exists()
+
+
+def test_extract_program_unarchived(tmp_path):
+    """Tests that a program on disk is left as it is."""
+    Path(tmp_path, "main.cpp").write_text("int main() { return 0; }\n")
+    program = CppProgram(tmp_path)
+    program.collect_source()
+    assert extract_program(program, tmp_path / "build") is program
+    assert not (tmp_path / "build").exists()
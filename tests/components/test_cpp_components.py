@@ -59,3 +59,115 @@ def test_cpp_program_collect(tmp_path, simple_source, simple_program):
     cpp_program.set_entry_point()
     assert cpp_program.source_files == source_files
     assert cpp_program.entry_point == components.CppSource(simple_program)
+
+
+def test_get_functions_nested_braces():
+    """Tests that nested braces don't end a function's body early."""
+    code = (
+        "int outer(int a) {\n"
+        "  if (a) { while (a) { a--; } }\n"
+        "  int inner(0);\n"
+        "  return a;\n"
+        "}\n"
+        "float after() { return 0; }\n"
+    )
+    assert components.get_functions(code) == [
+        ("int", "outer", ("int a",)), ("float", "after", ()),
+    ]
+
+
+def test_get_functions_skips_comments_and_strings():
+    """Tests that code inside comments and literals isn't matched."""
+    code = (
+        "// int commented() { return 0; }\n"
+        "/* int block() { return 0; } */\n"
+        "const char* text = \"int quoted() { }\";\n"
+        "char brace = '{';\n"
+        "int real() { return \"}\"[0]; }\n"
+    )
+    assert components.get_functions(code) == [("int", "real", ())]
+    assert components.get_comments(code) == [
+        "// int commented() { return 0; }", "/* int block() { return 0; } */"
+    ]
+
+
+def test_get_comments_preprocessor():
+    """Tests that comments on preprocessor lines are kept."""
+    code = (
+        "#include <x> // why\n"
+        "#define LIMIT 3 /* spans\n lines { */\n"
+        '#include "a//b.h"\n'
+        "int a; // b\n"
+        "int f() { return LIMIT; }\n"
+    )
+    assert components.get_comments(code) == [
+        "// why", "/* spans\n lines { */", "// b"
+    ]
+    assert components.get_functions(code) == [("int", "f", ())]
+
+
+def test_get_functions_scopes():
+    """Tests functions in namespaces and classes and qualified names."""
+    code = (
+        "#include <map>\n"
+        "namespace grade {\n"
+        "class Grader : public Base {\n"
+        "public:\n"
+        "  Grader() : total(0) {}\n"
+        "  int score(const std::map<int, int>& marks) const { return 0; }\n"
+        "private:\n"
+        "  int total;\n"
+        "};\n"
+        "}\n"
+        "template <typename T> T largest(T a, T b) { return a; }\n"
+        "int grade::Grader::curve(int amount) { return amount; }\n"
+    )
+    assert components.get_functions(code) == [
+        ("int", "score", ("const std::map<int, int>& marks",)),
+        ("T", "largest", ("T a", "T b")),
+        ("int", "grade::Grader::curve", ("int amount",)),
+    ]
+
+
+def test_get_functions_constructors():
+    """Tests that constructors and destructors are skipped alike."""
+    code = (
+        "class B {\n"
+        "public:\n"
+        "  B() {}\n"
+        "  virtual ~B() {}\n"
+        "  void run() {}\n"
+        "};\n"
+        "B::B(int a) {}\n"
+        "B::~B() {}\n"
+    )
+    assert components.get_functions(code) == [("void", "run", ())]
+
+
+def test_cpp_source_is_entry_point_prefilter(
+        tmp_path, simple_source, monkeypatch):
+    """Tests that files without main are ruled out without being parsed."""
+    empty = tmp_path / "empty.h"
+    empty.write_text("")
+    scanned = []
+    scan_source = components.scan_source
+    monkeypatch.setattr(
+        components, "scan_source",
+        lambda code: scanned.append(code) or scan_source(code)
+    )
+    for path in [simple_source, empty]:
+        cpp_source = components.CppSource(path)
+        assert not cpp_source.is_entry_point()
+        assert cpp_source._functions is None
+    assert not scanned
+    assert components.CppSource(simple_source).functions
+    assert len(scanned) == 1
+
+
+def test_may_define_main(tmp_path):
+    """Tests that only the word main passes the prefilter."""
+    source = tmp_path / "source.cpp"
+    source.write_text("int remaining(int domain);\n")
+    assert not components.may_define_main(source)
+    source.write_text("// main\n")
+    assert components.may_define_main(source)
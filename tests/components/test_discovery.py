@@ -0,0 +1,57 @@
+"""Tests the discovery module's functions."""
+
+import os
+
+from autograde.components.discovery import (
+    discover_many, discover_sources, is_ignored
+)
+
+
+def make_tree(root):
+    """Makes a program folder with sources in ignored and nested folders."""
+    for relative_path in [
+            "main.cpp", "util.h", "notes.txt", "lib/helper.cpp",
+            "lib/deep/more.hpp", ".git/hook.cpp", "build/main.cpp",
+            "cmake-build-debug/gen.cpp", "node_modules/pkg/x.h"]:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    return root
+
+
+def test_is_ignored():
+    """Tests the glob matching of ignore patterns."""
+    assert is_ignored(".git", [".*"])
+    assert is_ignored("cmake-build-release", ["cmake-build-*"])
+    assert not is_ignored("src", [".*", "build"])
+
+
+def test_discover_sources(tmp_path):
+    """Tests that every extension is found in one walk and ignores apply."""
+    root = make_tree(tmp_path)
+    found = discover_sources(root, [".cpp", ".h", ".hpp"])
+    assert found == sorted([
+        root / "main.cpp", root / "util.h", root / "lib" / "helper.cpp",
+        root / "lib" / "deep" / "more.hpp"
+    ])
+    assert discover_sources(root, [".cpp"], ignore=[]) == sorted(
+        path for path in root.rglob("*.cpp")
+    )
+
+
+def test_discover_sources_symlink(tmp_path):
+    """Tests that symbolic links to directories aren't followed."""
+    root = make_tree(tmp_path / "program")
+    os.symlink(root / "lib", root / "loop")
+    assert root / "loop" / "helper.cpp" not in discover_sources(
+        root, [".cpp"]
+    )
+
+
+def test_discover_many(tmp_path):
+    """Tests that many trees are walked and mapped to their sources."""
+    roots = [make_tree(tmp_path / name) for name in ["a", "b", "c"]]
+    found = discover_many(roots, [".cpp"], max_workers=2)
+    assert list(found) == roots
+    for root in roots:
+        assert found[root] == discover_sources(root, [".cpp"])
@@ -0,0 +1,80 @@
+"""Tests the index module's functions."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import autograde.components as components
+import autograde.components.cpp_components as cpp_components
+
+
+def fail_scan(source_code):
+    """Stands in for the scanner when a file must not be parsed."""
+    raise AssertionError("The source was parsed.")
+
+
+def test_parse_index_warm_load(tmp_path, simple_program, monkeypatch):
+    """Tests that an indexed file is loaded without being parsed."""
+    index = components.ParseIndex(tmp_path / "index.sqlite")
+    cold = components.CppSource(simple_program, index=index)
+    assert cold.is_entry_point()
+    monkeypatch.setattr(cpp_components, "scan_source", fail_scan)
+    warm = components.CppSource(simple_program, index=index)
+    assert warm.is_entry_point()
+    assert warm.functions == cold.functions
+    assert warm.comments == cold.comments
+
+
+def test_parse_index_touched_file(tmp_path, simple_program, monkeypatch):
+    """Tests that a file with a new mtime but the same content is reused."""
+    index = components.ParseIndex(tmp_path / "index.sqlite")
+    components.CppSource(simple_program, index=index).load()
+    stat = simple_program.stat()
+    os.utime(simple_program, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(cpp_components, "scan_source", fail_scan)
+    assert index.lookup(simple_program) is not None
+
+
+def test_parse_index_changed_file(tmp_path, simple_program):
+    """Tests that a changed file is parsed again."""
+    index = components.ParseIndex(tmp_path / "index.sqlite")
+    components.CppSource(simple_program, index=index).load()
+    simple_program.write_text("float helper() { return 0; }\n")
+    assert index.lookup(simple_program) is None
+    source = components.CppSource(simple_program, index=index)
+    assert source.functions == (("float", "helper", ()),)
+    assert not source.is_entry_point()
+    assert index.lookup(simple_program).functions == (
+        ("float", "helper", ()),
+    )
+
+
+def test_program_shares_index(tmp_path, simple_program, simple_source):
+    """Tests that sources collected by a program use its index."""
+    index = components.ParseIndex(tmp_path / "index.sqlite")
+    cpp_program = components.CppProgram(tmp_path, index=index)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    assert all(sf.index is index for sf in cpp_program.source_files)
+    assert index.lookup(simple_program).is_entry_point
+
+
+def test_parse_index_threads(tmp_path):
+    """Tests that one index can be used from many threads at once."""
+    index = components.ParseIndex(tmp_path / "index.sqlite")
+    paths = []
+    for i in range(8):
+        path = tmp_path / f"source_{i}.cpp"
+        path.write_text(f"int function_{i}() {{ return {i}; }}\n")
+        paths.append(path)
+
+    def load(path):
+        return components.CppSource(path, index=index).functions
+
+    for _ in range(2):
+        with ThreadPoolExecutor(4) as executor:
+            functions = list(executor.map(load, paths))
+        assert functions == [
+            (("int", f"function_{i}", ()),) for i in range(8)
+        ]
+    index.close()
+    assert index.lookup(paths[0]).functions == functions[0]
@@ -76,3 +76,23 @@ def simple_source(tmp_path, simple_func_code) -> Path:
     with tmp_source_path.open('wt') as src:
         src.write(func_code)
     return tmp_source_path
+
+
+@pytest.fixture
+def echo_program(tmp_path) -> Path:
+    """Returns a path to a source file that echoes its input to stdout."""
+    program_code = (
+        "#include <iostream>\n"
+        "#include <string>\n"
+        "int main() {\n"
+        "std::string line;\n"
+        "while (std::getline(std::cin, line)) {\n"
+        "std::cout << line << std::endl;\n"
+        "}\n"
+        "return 0;\n"
+        "}\n"
+    )
+    tmp_source_path = Path(tmp_path, 'echo_program.cpp')
+    with tmp_source_path.open('wt') as src:
+        src.write(program_code)
+    return tmp_source_path
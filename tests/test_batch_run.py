@@ -0,0 +1,267 @@
+"""Tests the batch_run module's functions."""
+
+import sys
+import asyncio
+import shutil
+import tarfile
+import threading
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import autograde.batch_run as batch_run
+from autograde.components import ParseIndex
+from autograde.tools.cache import ObjectCache
+from autograde.tools.distributed import start_coordinator
+from autograde.tools.store import ResultStore
+
+
+def make_batch(tmp_path, sleeps):
+    """Creates a batch of programs that sleep and print their number."""
+    batch_path = Path(tmp_path, "batch")
+    for i, sleep in enumerate(sleeps):
+        program_path = batch_path / f"program_{i}"
+        program_path.mkdir(parents=True)
+        Path(program_path, "main.cpp").write_text(
+            "#include <iostream>\n"
+            "#include <thread>\n"
+            "#include <chrono>\n"
+            "int main() {\n"
+            "std::this_thread::sleep_for("
+            f"std::chrono::milliseconds({sleep}));\n"
+            f"std::cout << {i};\n"
+            "return 0;\n"
+            "}\n"
+        )
+    return batch_path
+
+
+def test_batch_run_programs_sequential(tmp_path):
+    """Tests running a batch one program at a time."""
+    batch_path = make_batch(tmp_path, [0, 0])
+    results = dict(batch_run.batch_run_programs(batch_path, backend="direct"))
+    assert len(results) == 2
+    for program_path, (_, compile_result, execute_result) in results.items():
+        assert bool(compile_result)
+        assert execute_result.stdout == program_path.name[-1]
+
+
+def test_batch_run_programs_concurrent_completion_order(tmp_path):
+    """Tests that concurrent results stream back as programs finish."""
+    batch_path = make_batch(tmp_path, [2000, 0, 0, 0])
+    results = list(batch_run.batch_run_programs(
+        batch_path, concurrent=True, backend="direct", compile_workers=2,
+        execute_workers=4
+    ))
+    assert len(results) == 4
+    assert results[-1][0].name == "program_0"
+    for program_path, (_, compile_result, execute_result) in results:
+        assert bool(compile_result)
+        assert execute_result.stdout == program_path.name[-1]
+
+
+def test_batch_run_programs_resume(tmp_path):
+    """Tests that a resumed batch only runs new or changed programs."""
+    batch_path = make_batch(tmp_path, [0, 0, 0])
+    store = ResultStore(tmp_path / "results")
+    first = list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, program_input="1"
+    ))
+    assert len(first) == 3
+    assert list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, program_input="1",
+        resume=True
+    )) == []
+    Path(batch_path, "program_1", "main.cpp").write_text(
+        "int main() { return 1; }\n"
+    )
+    resumed = list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, program_input="1",
+        resume=True
+    ))
+    assert [path.name for path, _ in resumed] == ["program_1"]
+    assert [
+        Path(line["path"]).name for line in store.failures()
+    ] == ["program_1"]
+    assert len(list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, program_input="2",
+        resume=True
+    ))) == 3
+
+
+def test_batch_run_programs_async(tmp_path):
+    """Tests that an async batch streams back results as programs finish."""
+    batch_path = make_batch(tmp_path, [2000, 0, 0, 0])
+    store = ResultStore(tmp_path / "results")
+
+    async def collect():
+        return [
+            result async for result in batch_run.batch_run_programs_async(
+                batch_path, compile_workers=2, execute_workers=4,
+                store=store
+            )
+        ]
+
+    results = asyncio.run(collect())
+    assert len(results) == 4
+    assert results[-1][0].name == "program_0"
+    for program_path, (_, compile_result, execute_result) in results:
+        assert bool(compile_result)
+        assert execute_result.stdout == program_path.name[-1]
+    assert len(store.latest()) == 4
+
+
+def test_batch_run_programs_async_index(tmp_path):
+    """Tests that an async batch can share a parse index between threads."""
+    batch_path = make_batch(tmp_path, [0, 0, 0, 0])
+    index = ParseIndex(tmp_path / "index.sqlite")
+
+    async def collect():
+        return [
+            result async for result in batch_run.batch_run_programs_async(
+                batch_path, execute_workers=4, index=index
+            )
+        ]
+
+    for _ in range(2):
+        results = asyncio.run(collect())
+        assert len(results) == 4
+        for program_path, (_, compile_result, execute_result) in results:
+            assert bool(compile_result)
+            assert execute_result.stdout == program_path.name[-1]
+    assert index.lookup(batch_path / "program_0" / "main.cpp") is not None
+
+
+def test_batch_run_programs_dedup(tmp_path):
+    """Tests that identical programs are run once and share the result."""
+    batch_path = make_batch(tmp_path, [0, 0])
+    for name in ("copy_a", "copy_b"):
+        copy_path = batch_path / name
+        copy_path.mkdir()
+        Path(copy_path, "main.cpp").write_bytes(
+            Path(batch_path, "program_1", "main.cpp").read_bytes()
+        )
+    store = ResultStore(tmp_path / "results")
+    results = list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, dedup=True
+    ))
+    assert [path.name for path, _ in results] == [
+        "copy_a", "copy_b", "program_1", "program_0"
+    ]
+    for path, (program, compile_result, execute_result) in results:
+        assert program.entry_point.path == path / "main.cpp"
+        assert execute_result.stdout == ("0" if path.name[-1] == "0" else "1")
+        ran = path.name in ("copy_a", "program_0")
+        assert (compile_result.metrics is not None) == ran
+        assert (execute_result.metrics is not None) == ran
+        assert (compile_result.executable is not None) == ran
+        assert bool(compile_result)
+    assert not list(batch_path.glob("copy_b/*.exe"))
+    latest = store.latest()
+    duplicate = latest[str((batch_path / "program_1").resolve())]
+    assert duplicate["duplicate_of"] == str((batch_path / "copy_a").resolve())
+    assert duplicate["entry_point"] == str(
+        batch_path / "program_1" / "main.cpp"
+    )
+    assert duplicate["execute"]["metrics"] is None
+    assert duplicate["compile"]["executable"] is None
+
+
+def test_batch_run_programs_archives(tmp_path):
+    """Tests that zip and tar programs are run without extracting them."""
+    batch_path = make_batch(tmp_path, [0, 0])
+    with zipfile.ZipFile(batch_path / "program_0.zip", "w") as archive:
+        archive.write(batch_path / "program_0" / "main.cpp", "src/main.cpp")
+        archive.writestr("data/unused.txt", "unused")
+    with tarfile.open(batch_path / "program_1.tar.gz", "w:gz") as archive:
+        archive.add(batch_path / "program_1" / "main.cpp", "main.cpp")
+    shutil.rmtree(batch_path / "program_0")
+    shutil.rmtree(batch_path / "program_1")
+    store = ResultStore(tmp_path / "results")
+    results = dict(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store
+    ))
+    assert sorted(path.name for path in results) == [
+        "program_0.zip", "program_1.tar.gz"
+    ]
+    for program_path, (program, compile_result, execute_result) in (
+            results.items()):
+        assert program_path in program.entry_point.path.parents
+        assert bool(compile_result)
+        assert execute_result.stdout == program_path.name[8]
+    build_path = batch_path / ".program_0.zip.build"
+    assert (build_path / "src" / "main.cpp").exists()
+    assert not (build_path / "data").exists()
+    assert not list(batch_run.batch_run_programs(
+        batch_path, backend="direct", store=store, resume=True
+    ))
+
+
+def test_object_cache_requires_direct_backend(tmp_path, monkeypatch):
+    """Tests that an object cache is refused or skipped with scons."""
+    monkeypatch.setattr(sys, "argv", [
+        "batch_run", "--object_cache_dir", str(tmp_path / "objects"),
+        str(tmp_path)
+    ])
+    with pytest.raises(SystemExit):
+        batch_run.get_args()
+    batch_path = make_batch(tmp_path, [0])
+    program_path = batch_path / "program_0"
+    compile_result, execute_result = batch_run.run_job(
+        program_path, [program_path / "main.cpp"], {"backend": "scons"},
+        object_cache=ObjectCache(tmp_path / "objects")
+    )
+    assert bool(compile_result)
+    assert execute_result.stdout == "0"
+
+
+def test_serve_programs_to_workers(tmp_path):
+    """Tests that workers on localhost run a batch for a coordinator."""
+    batch_path = make_batch(tmp_path, [0, 0, 0])
+    store = ResultStore(tmp_path / "results")
+    counts = []
+    with start_coordinator(("127.0.0.1", 0), b"test") as manager:
+        results = batch_run.serve_programs(
+            manager.coordinator(), batch_path, backend="direct", store=store
+        )
+        workers = [
+            threading.Thread(target=lambda i=i: counts.append(
+                batch_run.work_programs(
+                    manager.address, b"test", tmp_path / f"worker_{i}",
+                    jobs=1
+                )
+            ))
+            for i in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        results = dict(results)
+        for worker in workers:
+            worker.join(30)
+    assert sorted(results) == sorted(batch_path.iterdir())
+    for program_path, (program, compile_result, execute_result) in (
+            results.items()):
+        assert program.entry_point.path.parent == program_path
+        assert bool(compile_result)
+        assert "scons" not in compile_result.stdout
+        assert execute_result.stdout == program_path.name[-1]
+    assert sum(counts) == 3
+    assert len(store.latest()) == 3
+
+
+def test_watch_programs_regrades_changed(tmp_path):
+    """Tests that watching reruns only the program that was resubmitted."""
+    batch_path = make_batch(tmp_path, [0, 0])
+    results = batch_run.watch_programs(
+        batch_path, debounce_time=0.2, backend="direct"
+    )
+    first_pass = {next(results)[0].name, next(results)[0].name}
+    assert first_pass == {"program_0", "program_1"}
+    Path(batch_path, "program_1", "main.cpp").write_text(
+        "#include <iostream>\nint main() {\nstd::cout << 11;\n}\n"
+    )
+    program_path, (_, _, execute_result) = next(results)
+    results.close()
+    assert program_path.name == "program_1"
+    assert execute_result.stdout == "11"
@@ -0,0 +1,32 @@
+"""A stand in for the docker command line used to test container pools.
+
+"run" starts docker/run.py from this repository in place of the image's entry
+point and ignores volumes, so the pool under test should mount its programs at
+the same path they have on the host. "kill" does nothing.
+"""
+import os
+import sys
+from pathlib import Path
+
+REPO_PATH = Path(__file__).resolve().parents[2]
+OPTIONS_WITH_VALUES = {"--name", "-v", "--volume", "-e", "--env"}
+
+
+def main():
+    command, *args = sys.argv[1:]
+    if command != "run":
+        return
+    while args[0].startswith("-"):
+        option = args.pop(0)
+        if option in OPTIONS_WITH_VALUES:
+            args.pop(0)
+    _image, *entry_args = args
+    env = dict(os.environ, PYTHONPATH=str(REPO_PATH))
+    run_script = str(REPO_PATH / "docker" / "run.py")
+    os.execve(
+        sys.executable, [sys.executable, run_script, *entry_args], env
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 """Tests the build module's functions."""
 
+import subprocess
 from pathlib import Path
 
+import pytest
+
 import autograde.components as components
 import autograde.tools.build as build_tools
 
@@ -21,6 +24,17 @@ def test_compile_cpp(tmp_path, simple_program):
     assert bool(result)
 
 
+def test_compile_cpp_scons_overhead(tmp_path, simple_program):
+    """Tests that scons's own time is measured and its timings removed."""
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    result = build_tools.compile_cpp(cpp_program, target_path=tmp_path)
+    assert bool(result)
+    assert "execution time" not in result.stdout
+    assert 0 < result.metrics.overhead < result.metrics.wall
+
+
 def test_cpp_program_clean(tmp_path, simple_program):
     """Tests CppProgram clean method."""
     tmp_path = Path(tmp_path)
@@ -35,3 +49,61 @@ def test_cpp_program_clean(tmp_path, simple_program):
     print(clean_result)
     assert not list(tmp_path.rglob('*.o'))
     assert not list(tmp_path.rglob('*.obj'))
+
+
+def write_units(path, helper_body):
+    """Writes a program of a main and a helper translation unit."""
+    path.mkdir()
+    Path(path, "helper.h").write_text("int helper();\n")
+    Path(path, "helper.cpp").write_text(
+        '#include "helper.h"\n'
+        f"static int value() {{ return {helper_body}; }}\n"
+        "int helper() { return value(); }\n"
+    )
+    Path(path, "main.cpp").write_text(
+        '#include <iostream>\n#include "helper.h"\n'
+        "int main() { std::cout << helper(); }\n"
+    )
+    cpp_program = components.CppProgram(path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    return cpp_program
+
+
+@pytest.mark.parametrize("backend", ["scons", "direct", "incremental"])
+def test_compile_cpp_unity(tmp_path, backend):
+    """Tests that a program's translation units are built as one."""
+    cpp_program = write_units(tmp_path / "program", "7")
+    target_path = tmp_path / "build"
+    target_path.mkdir()
+    result = build_tools.compile_cpp(
+        cpp_program, target_path=target_path, backend=backend, unity=True
+    )
+    assert bool(result), result.stderr
+    assert result.mode == "unity"
+    assert result.executable.name == "main.exe"
+    assert subprocess.run(
+        [result.executable], capture_output=True, text=True
+    ).stdout == "7"
+    assert [path.name for path in target_path.glob("*.o")] == ["unity.o"]
+
+
+def test_compile_cpp_unity_fallback(tmp_path):
+    """Tests that a program that can't be built as one is built per file."""
+    program_path = tmp_path / "program"
+    cpp_program = write_units(program_path, "3")
+    Path(program_path, "main.cpp").write_text(
+        '#include <iostream>\n#include "helper.h"\n'
+        "static int value() { return 4; }\n"
+        "int main() { std::cout << helper() + value(); }\n"
+    )
+    result = build_tools.compile_cpp(
+        cpp_program, target_path=program_path, backend="direct", unity=True
+    )
+    assert bool(result), result.stderr
+    assert result.mode == "unity_fallback"
+    assert subprocess.run(
+        [result.executable], capture_output=True, text=True
+    ).stdout == "7"
+    cpp_program.collect_source()
+    assert len(cpp_program.source_files) == 3
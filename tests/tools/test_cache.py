@@ -0,0 +1,175 @@
+"""Tests the cache module's functions."""
+
+import asyncio
+import pickle
+from pathlib import Path
+
+import autograde.components as components
+import autograde.tools.build as build_tools
+import autograde.tools.cache as cache_tools
+from autograde.tools.pch import PrecompiledHeader
+from autograde.tools.result import CompileResult
+
+
+def test_compile_cpp_cache_hit(tmp_path, simple_program):
+    """Tests that a second compile of the same program is a cache hit."""
+    cache = cache_tools.CompileCache(tmp_path / "cache")
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    first_target = tmp_path / "first"
+    second_target = tmp_path / "second"
+    first_target.mkdir()
+    second_target.mkdir()
+    first_result = build_tools.compile_cpp(
+        cpp_program, target_path=first_target, cache=cache
+    )
+    second_result = build_tools.compile_cpp(
+        cpp_program, target_path=second_target, cache=cache
+    )
+    assert not first_result.cached
+    assert second_result.cached
+    assert second_result.executable.parent == second_target.resolve()
+    assert second_result.executable.exists()
+    assert second_result.stdout == first_result.stdout
+    assert bool(second_result)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+
+
+def test_program_key_changes_with_source(tmp_path, simple_program):
+    """Tests that the key depends on the content of the sources."""
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    key = cache_tools.program_key(cpp_program, "g++")
+    assert key == cache_tools.program_key(cpp_program, "g++")
+    assert key != cache_tools.program_key(cpp_program, "g++", ["-O2"])
+    assert key != cache_tools.program_key(
+        cpp_program, "g++", backend="direct"
+    )
+    assert key != cache_tools.program_key(
+        cpp_program, "g++", pch=PrecompiledHeader(tmp_path, compiler="g++")
+    )
+    with Path(simple_program).open("at") as src:
+        src.write("// changed\n")
+    assert key != cache_tools.program_key(cpp_program, "g++")
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Tests that the least recently used entries are evicted first."""
+    cache = cache_tools.CompileCache(tmp_path / "cache", max_size=300)
+    for key in ("aa0", "bb0", "aa0", "cc0"):
+        if cache.get(key, tmp_path) is None:
+            cache.put(key, CompileResult(None, "x"*50, "", 0))
+    keys = {path.name for _, _, path in cache.entries()}
+    assert keys == {"aa0", "cc0"}
+    assert cache.hits == 1
+    assert cache.misses == 3
+
+
+def write_program(path: Path, value: int) -> components.CppProgram:
+    """Writes a program with its own main.cpp and a shared helper.cpp."""
+    path.mkdir()
+    (path / "helper.cpp").write_text("int helper() {\n    return 2;\n}\n")
+    (path / "main.cpp").write_text(
+        "#include <iostream>\nint helper();\n"
+        f"int main() {{\n    std::cout << helper() + {value};\n}}\n"
+    )
+    cpp_program = components.CppProgram(path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    return cpp_program
+
+
+def test_object_cache_shared_translation_unit(tmp_path):
+    """Tests that a translation unit shared by two programs compiles once."""
+    cache = cache_tools.ObjectCache(tmp_path / "objects")
+    results = [
+        build_tools.compile_cpp(
+            write_program(tmp_path / name, value), tmp_path / name,
+            backend="direct", object_cache=cache
+        )
+        for name, value in (("first", 1), ("second", 3))
+    ]
+    assert all(results)
+    assert "helper.cpp" in results[1].stdout
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 3, 3)
+    second = cache_tools.ObjectCache(tmp_path / "objects")
+    assert second.stats().hits == 1
+    assert (second.hits, second.misses) == (0, 0)
+
+
+def test_object_cache_async(tmp_path):
+    """Tests that the object cache is shared by programs compiled async."""
+    cache = cache_tools.ObjectCache(tmp_path / "objects")
+
+    async def compile_all():
+        results = []
+        for name, value in (("first", 1), ("second", 3)):
+            results.append(await build_tools.compile_cpp_async(
+                write_program(tmp_path / name, value), tmp_path / name,
+                backend="direct", object_cache=cache
+            ))
+        return results
+
+    assert all(asyncio.run(compile_all()))
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 3, 3)
+
+
+def test_object_cache_counts(tmp_path):
+    """Tests that lookups of every copy are added to one counts file."""
+    cache = cache_tools.ObjectCache(tmp_path / "objects")
+    copy = pickle.loads(pickle.dumps(cache))
+    for lookup_cache in (cache, copy, copy):
+        for _ in range(100):
+            lookup_cache.get("missing", tmp_path / "a.o")
+    copy.flush()
+    assert (cache.misses, copy.misses) == (100, 200)
+    assert cache.stats().misses == 300
+    counts_path = tmp_path / "objects" / cache.COUNTS_NAME
+    assert counts_path.stat().st_size < 64
+    assert [path.name for path in (tmp_path / "objects").iterdir()] == [
+        cache.COUNTS_NAME
+    ]
+
+
+def test_object_cache_key_and_eviction(tmp_path):
+    """Tests the object key and that old objects are evicted."""
+    cache = cache_tools.ObjectCache(tmp_path / "objects", max_size=200)
+    key = cache.key("int x;\n", "g++")
+    assert key == cache.key("int x;\n", "g++")
+    assert key != cache.key("int x;\n", "g++", ["-O2"])
+    assert key != cache.key("int y;\n", "g++")
+    for name in ("a", "b"):
+        obj = tmp_path / f"{name}.o"
+        obj.write_bytes(b"x"*100)
+        cache.put(cache.key(name, "g++"), obj)
+    assert [path.name for _, _, path in cache.entries()] == [
+        cache.key("b", "g++")
+    ]
+    assert cache.get(cache.key("b", "g++"), tmp_path / "c.o")
+    assert (tmp_path / "c.o").read_bytes() == b"x"*100
+    assert not cache.get(cache.key("a", "g++"), tmp_path / "c.o")
+
+
+def test_compile_cpp_cache_unity(tmp_path):
+    """Tests that unity and per file builds are cached apart."""
+    cache = cache_tools.CompileCache(tmp_path / "cache")
+    cpp_program = write_program(tmp_path / "program", 1)
+    results = []
+    for unity in (True, False, True):
+        target_path = tmp_path / f"build{len(results)}"
+        target_path.mkdir()
+        results.append(build_tools.compile_cpp(
+            cpp_program, target_path, cache=cache, backend="direct",
+            unity=unity
+        ))
+    assert [result.cached for result in results] == [False, False, True]
+    assert [result.mode for result in results] == [
+        "unity", "per_file", "unity"
+    ]
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 2, 2)
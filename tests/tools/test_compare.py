@@ -0,0 +1,66 @@
+"""Tests the compare module's comparators."""
+
+import pytest
+
+import autograde.tools.compare as compare_tools
+
+
+def compare(mode, expected, chunks, **kwargs):
+    """Feeds chunks to a comparator and returns what feed and finish return."""
+    comparator = compare_tools.make_comparator(mode, expected, **kwargs)
+    alive = [comparator.feed(chunk) for chunk in chunks]
+    return alive, comparator.finish()
+
+
+@pytest.mark.parametrize("mode, expected, chunks", [
+    ("exact", "a\nb\n", [b"a\r", b"\nb", b"\n"]),
+    ("whitespace", "1 2\n3\n", [b"1  ", b"2 3"]),
+    ("numeric", "1.5 x 2e3\n", [b"1.5000000001 x ", b"2000.0\n"]),
+    ("lineset", "a\nb\nb\n", [b"b\na\n", b"b  "]),
+])
+def test_comparator_pass(mode, expected, chunks):
+    """Tests output that matches in each mode."""
+    alive, verdict = compare(mode, expected, chunks)
+    assert all(alive)
+    assert verdict == (True, mode, None, None, None, "")
+
+
+@pytest.mark.parametrize("mode, expected, chunks, alive, verdict", [
+    ("exact", "a\nb\nc\n", [b"a\nx", b"\nc\n"], [False, False],
+     (2, "b", "x", "output differs")),
+    ("exact", "a\n", [b"a\n", b"b"], [True, False],
+     (2, "", "b", "output is longer than expected")),
+    ("exact", "a\nb\n", [b"a\n"], [True],
+     (2, "b\n", None, "output ended early")),
+    ("whitespace", "1 2 3", [b"1 4 ", b"3"], [False, False],
+     (2, "2", "4", "token differs")),
+    ("whitespace", "1 2 3", [b"1 2"], [True],
+     (3, "3", None, "output ended early")),
+    ("numeric", "1 x 3", [b"1.0 y 3"], [False],
+     (2, "x", "y", "token differs")),
+    ("lineset", "a\nb\n", [b"b\nc\n"], [False],
+     (2, None, "c", "unexpected line")),
+    ("lineset", "a\nb\nb\n", [b"b\na\n"], [True],
+     (3, "b", None, "missing line")),
+    ("whitespace", "1 2", [b"1 ", b"2" * 100], [True, False],
+     (2, None, "2" * 80, "token is longer than expected")),
+])
+def test_comparator_fail(mode, expected, chunks, alive, verdict):
+    """Tests that the first mismatch is found as soon as it is fed."""
+    fed, result = compare(mode, expected, chunks)
+    assert fed == alive
+    assert not result.passed
+    assert result[2:] == verdict
+
+
+def test_numeric_comparator_batches():
+    """Tests that numbers are compared in batches within the tolerance."""
+    comparator = compare_tools.NumericComparator(
+        "1 " * 10, tolerance=0.01, batch_size=4
+    )
+    assert all(comparator.feed(b"1.001 ") for _ in range(3))
+    assert not all(comparator.feed(b"2 ") for _ in range(3))
+    verdict = comparator.finish()
+    assert verdict[2:] == (
+        4, "1", "2", "number differs by more than 0.01"
+    )
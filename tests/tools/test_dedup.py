@@ -0,0 +1,44 @@
+"""Tests the dedup module's functions."""
+
+from pathlib import Path
+
+import autograde.tools.dedup as dedup_tools
+
+
+def write_program(path, files):
+    """Writes a program's files into path and returns their paths."""
+    path.mkdir(parents=True)
+    for name, data in files.items():
+        Path(path, name).write_bytes(data)
+    return sorted(Path(path, name) for name in files)
+
+
+def test_normalize_source():
+    """Tests that line endings and trailing whitespace are ignored."""
+    assert dedup_tools.normalize_source(
+        b"\xef\xbb\xbfint main() {  \r\n  return 0;\t\r\n}\r\n\r\n"
+    ) == b"int main() {\n  return 0;\n}"
+
+
+def test_group_duplicates(tmp_path):
+    """Tests that programs with the same normalized sources are grouped."""
+    main = b"int main() {\n  return 0;\n}\n"
+    programs = {
+        tmp_path / "a": write_program(tmp_path / "a", {"main.cpp": main}),
+        tmp_path / "b": write_program(tmp_path / "b", {"main.cpp": main}),
+        tmp_path / "c": write_program(
+            tmp_path / "c", {"main.cpp": main.replace(b"\n", b"\r\n")}
+        ),
+        tmp_path / "d": write_program(tmp_path / "d", {"other.cpp": main}),
+        tmp_path / "e": write_program(
+            tmp_path / "e", {"main.cpp": main.replace(b"0", b"1")}
+        ),
+        tmp_path / "f": [],
+        tmp_path / "g": [],
+    }
+    groups = dedup_tools.group_duplicates(programs)
+    assert groups == {
+        tmp_path / "a": [tmp_path / "b", tmp_path / "c"],
+        tmp_path / "d": [], tmp_path / "e": [],
+        tmp_path / "f": [], tmp_path / "g": [],
+    }
@@ -0,0 +1,104 @@
+"""Tests the distributed module's functions."""
+
+import threading
+import time
+
+import pytest
+
+import autograde.tools.distributed as distributed_tools
+
+AUTHKEY = b"test"
+
+
+def test_pack_unpack_program(tmp_path):
+    """Tests that sources keep their names relative to the program."""
+    program_path = tmp_path / "program"
+    (program_path / "src").mkdir(parents=True)
+    (program_path / "main.cpp").write_text("int main() {}\n")
+    (program_path / "src" / "unit.cpp").write_text("int unit;\n")
+    files = distributed_tools.pack_program(
+        program_path, sorted(program_path.rglob("*.cpp"))
+    )
+    assert files == {
+        "main.cpp": b"int main() {}\n", "src/unit.cpp": b"int unit;\n"
+    }
+    paths = distributed_tools.unpack_program(files, tmp_path / "copy")
+    assert sorted(
+        path.relative_to(tmp_path / "copy").as_posix() for path in paths
+    ) == ["main.cpp", "src/unit.cpp"]
+    with pytest.raises(ValueError):
+        distributed_tools.unpack_program({"../x.cpp": b""}, tmp_path / "copy")
+
+
+def test_coordinator_retries_silent_worker():
+    """Tests that a job leased to a worker that went quiet is retried."""
+    coordinator = distributed_tools.Coordinator(
+        lease_timeout=0.2, max_attempts=2
+    )
+    job_id = coordinator.add_job("program", {"main.cpp": b""})
+    coordinator.close()
+    assert coordinator.get_job("lost").attempt == 1
+    time.sleep(0.3)
+    job = coordinator.get_job("alive")
+    assert (job.job_id, job.attempt) == (job_id, 2)
+    coordinator.put_result("lost", job_id, "stale")
+    coordinator.put_result("alive", job_id, "done")
+    result = coordinator.next_result()
+    assert result.result == "done"
+    assert result.errors == ["lost stopped responding"]
+    assert coordinator.finished()
+    assert coordinator.get_job("alive", timeout=0.1) is None
+
+
+def test_coordinator_fails_after_max_attempts():
+    """Tests that a job that fails on every attempt has no result."""
+    coordinator = distributed_tools.Coordinator(max_attempts=2)
+    job_id = coordinator.add_job("program", {})
+    for worker_id in ("first", "second"):
+        job = coordinator.get_job(worker_id)
+        coordinator.fail(worker_id, job.job_id, "boom")
+    result = coordinator.next_result()
+    assert result == (job_id, None, ["first: boom", "second: boom"])
+
+
+def test_run_workers_on_localhost(tmp_path):
+    """Tests several workers sharing the jobs of one coordinator."""
+    with distributed_tools.start_coordinator(
+            ("127.0.0.1", 0), AUTHKEY, lease_timeout=5) as manager:
+        coordinator = manager.coordinator()
+        coordinator.configure({"suffix": "!"})
+        for i in range(6):
+            coordinator.add_job(f"p{i}", {"main.txt": str(i).encode()})
+        coordinator.close()
+
+        failed = []
+
+        def run(program_path, source_paths, settings):
+            if program_path.name == "p0" and not failed:
+                failed.append(program_path)
+                raise RuntimeError("flaky host")
+            time.sleep(0.05)
+            return source_paths[0].read_text() + settings["suffix"]
+
+        counts = []
+        threads = [
+            threading.Thread(target=lambda i=i: counts.append(
+                distributed_tools.run_worker(
+                    manager.address, AUTHKEY, run, tmp_path / f"w{i}",
+                    jobs=2, worker_id=f"w{i}"
+                )
+            ))
+            for i in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        results = [coordinator.next_result(timeout=10) for _ in range(6)]
+        for thread in threads:
+            thread.join(10)
+    assert sorted(result.result for result in results) == [
+        f"{i}!" for i in range(6)
+    ]
+    assert sum(counts) == 6
+    assert any("flaky host" in error for result in results
+               for error in result.errors)
+    assert not list(tmp_path.glob("w*/*"))
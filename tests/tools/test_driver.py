@@ -0,0 +1,49 @@
+"""Tests the driver module's functions."""
+
+from pathlib import Path
+
+import autograde.components as components
+import autograde.tools.build as build_tools
+import autograde.tools.driver as driver_tools
+import autograde.tools.execute as execute_tools
+
+
+def test_compile_cpp_direct(tmp_path, simple_program):
+    """Tests compiling a program without scons."""
+    header = Path(tmp_path, "simple_header.h")
+    header.write_text("int header_func();\n")
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    result = driver_tools.compile_cpp_direct(cpp_program, tmp_path)
+    print(result.stdout, result.stderr)
+    assert bool(result)
+    assert result.executable.name == "simple_program.exe"
+    assert result.executable.exists()
+    assert not list(tmp_path.glob("simple_header*.o"))
+    execute_result = execute_tools.execute_program(
+        result.executable, tmp_path
+    )
+    assert bool(execute_result)
+
+
+def test_compile_cpp_direct_error(tmp_path):
+    """Tests that a compile error is reported without an executable."""
+    source = Path(tmp_path, "broken.cpp")
+    source.write_text("int main() { return missing; }\n")
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point(source)
+    result = build_tools.compile_cpp(
+        cpp_program, target_path=tmp_path, backend="direct"
+    )
+    assert not bool(result)
+    assert result.executable is None
+    assert "missing" in result.stderr
+
+
+def test_get_object_paths_unique(tmp_path):
+    """Tests that sources with the same stem get different objects."""
+    sources = [Path("a", "main.cpp"), Path("b", "main.cpp")]
+    objects = driver_tools.get_object_paths(sources, tmp_path)
+    assert len(set(objects)) == 2
@@ -1,8 +1,15 @@
 """Tests the build module's functions."""
 
+import signal
+import asyncio
+from pathlib import Path
+from time import time
+
 import autograde.components as components
 import autograde.tools.build as build_tools
 import autograde.tools.execute as execute_tools
+from autograde.tools.result import PhaseMetrics
+from autograde.tools.sandbox import ResourceLimits, get_limit_hit
 
 
 def test_execute(tmp_path, simple_program):
@@ -16,3 +23,209 @@ def test_execute(tmp_path, simple_program):
     )
     assert execute_result.return_code == 0
     assert bool(execute_result)
+
+
+def compile_source(tmp_path, name, code):
+    """Compiles a single source file and returns the executable."""
+    source = Path(tmp_path, name)
+    source.write_text(code)
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.add_source(components.CppSource(source))
+    cpp_program.set_entry_point(source)
+    compile_result = build_tools.compile_cpp(
+        cpp_program, target_path=tmp_path, backend="direct"
+    )
+    assert compile_result.executable is not None, compile_result.stderr
+    return compile_result.executable
+
+
+def test_execute_input(tmp_path, echo_program):
+    """Tests that input is streamed into the program."""
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    compile_result = build_tools.compile_cpp(
+        cpp_program, target_path=tmp_path, backend="direct"
+    )
+    program_input = "line\n" * 100000
+    execute_result = execute_tools.execute_program(
+        compile_result.executable, tmp_path, program_input=program_input
+    )
+    assert execute_result.stdout == program_input
+    assert not execute_result.timed_out
+    assert not execute_result.truncated
+
+
+def test_execute_output_limit(tmp_path):
+    """Tests that a program printing forever is killed at the output limit."""
+    executable = compile_source(
+        tmp_path, "forever.cpp",
+        "#include <iostream>\n"
+        "int main() { while (true) { std::cout << \"spam\\n\"; } }\n"
+    )
+    execute_result = execute_tools.execute_program_stream(
+        executable, tmp_path, timeout=30, output_limit=1 << 20,
+        buffer_size=1024
+    )
+    assert execute_result.truncated
+    assert not execute_result.timed_out
+    assert not bool(execute_result)
+    assert len(execute_result.stdout) <= 1024
+    assert "spam\n" in execute_result.stdout
+
+
+def test_execute_timeout(tmp_path):
+    """Tests that a program that never finishes is killed at the timeout."""
+    executable = compile_source(
+        tmp_path, "spin.cpp", "int main() { while (true) {} }\n"
+    )
+    begin = time()
+    execute_result = execute_tools.execute_program(
+        executable, tmp_path, timeout=0.5
+    )
+    assert time() - begin < 10
+    assert execute_result.timed_out
+    assert not bool(execute_result)
+
+
+def test_ring_buffer():
+    """Tests that the ring buffer keeps the most recent bytes."""
+    ring_buffer = execute_tools.RingBuffer(5)
+    for chunk in (b"abc", b"def", b"ghijklm"):
+        ring_buffer.write(chunk)
+    assert ring_buffer.getvalue() == b"ijklm"
+    assert ring_buffer.dropped == 8
+
+
+def test_execute_cpu_limit(tmp_path):
+    """Tests that a program that spins is stopped by its cpu limit."""
+    executable = compile_source(
+        tmp_path, "spin.cpp",
+        "int main() { volatile unsigned long i = 0; while (true) { ++i; } }\n"
+    )
+    result = execute_tools.execute_program(
+        executable, tmp_path, timeout=10, limits=ResourceLimits(cpu_time=1)
+    )
+    assert not result.timed_out
+    assert result.limit_hit == "cpu_time"
+    assert result.metrics.user + result.metrics.sys >= 0.9
+
+
+def test_execute_file_size_limit(tmp_path):
+    """Tests that a program that writes a large file is stopped."""
+    executable = compile_source(
+        tmp_path, "writer.cpp",
+        "#include <fstream>\n#include <string>\n"
+        "int main() { std::ofstream out(\"big.txt\");\n"
+        "std::string block(1 << 16, 'x');\n"
+        "for (int i = 0; i < 1024; i++) { out << block << std::flush; } }\n"
+    )
+    result = execute_tools.execute_program(
+        executable, tmp_path, timeout=10,
+        limits=ResourceLimits(file_size=1 << 20)
+    )
+    assert result.limit_hit == "file_size"
+    assert Path(tmp_path, "big.txt").stat().st_size <= 1 << 20
+
+
+def test_execute_memory_limit(tmp_path):
+    """Tests that a program that allocates too much is reported."""
+    executable = compile_source(
+        tmp_path, "hog.cpp",
+        "#include <vector>\n#include <iostream>\n"
+        "int main() { std::vector<char> hog(1L << 32, 1);\n"
+        "std::cout << hog.back(); }\n"
+    )
+    result = execute_tools.execute_program(
+        executable, tmp_path, timeout=10,
+        limits=ResourceLimits(memory=256 << 20)
+    )
+    assert not bool(result)
+    assert result.limit_hit == "memory"
+
+
+def test_get_limit_hit_sigkill():
+    """Tests that SIGKILL is only put down to a limit the program reached."""
+    limits = ResourceLimits(cpu_time=2, memory=100 << 20)
+    killed = -signal.SIGKILL
+    assert get_limit_hit(limits, killed, "") is None
+    assert get_limit_hit(
+        limits, killed, "", PhaseMetrics(0.5, 0.1, 0.0, 1000)
+    ) is None
+    assert get_limit_hit(
+        limits, killed, "", PhaseMetrics(3.1, 2.9, 0.1, 1000)
+    ) == "cpu_time"
+    assert get_limit_hit(
+        limits, killed, "", PhaseMetrics(0.5, 0.3, 0.1, 99 << 10)
+    ) == "memory"
+    assert get_limit_hit(
+        ResourceLimits(cpu_time=2), killed, "",
+        PhaseMetrics(0.5, 0.3, 0.1, 99 << 10)
+    ) is None
+    assert get_limit_hit(limits, -signal.SIGXCPU, "") == "cpu_time"
+
+
+def test_execute_limits_unhit(tmp_path, echo_program):
+    """Tests that a program within its limits runs normally."""
+    executable = compile_source(
+        tmp_path, echo_program.name, echo_program.read_text()
+    )
+    result = execute_tools.execute_program(
+        executable, tmp_path, program_input="spam\n",
+        limits=ResourceLimits(
+            cpu_time=5, memory=1 << 30, file_size=1 << 20, open_files=64
+        )
+    )
+    assert bool(result)
+    assert result.stdout == "spam\n"
+    assert result.limit_hit is None
+
+
+def test_execute_async(tmp_path, echo_program):
+    """Tests that many programs run at once from one event loop."""
+    executable = compile_source(
+        tmp_path, echo_program.name, echo_program.read_text()
+    )
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(4)
+        return await asyncio.gather(*(
+            execute_tools.execute_program_async(
+                executable, tmp_path, program_input=f"{i}\n" * 10000,
+                semaphore=semaphore
+            )
+            for i in range(16)
+        ))
+
+    results = asyncio.run(run_all())
+    for i, result in enumerate(results):
+        assert bool(result)
+        assert result.stdout == f"{i}\n" * 10000
+        assert result.metrics.wall > 0
+
+
+def test_execute_async_limits(tmp_path):
+    """Tests that async programs are killed at the timeout and output limit."""
+    spin = compile_source(
+        tmp_path, "spin.cpp", "int main() { while (true) {} }\n"
+    )
+    forever = compile_source(
+        tmp_path, "forever.cpp",
+        "#include <iostream>\n"
+        "int main() { while (true) { std::cout << \"spam\\n\"; } }\n"
+    )
+
+    async def run_both():
+        return await asyncio.gather(
+            execute_tools.execute_program_async(spin, tmp_path, timeout=0.5),
+            execute_tools.execute_program_async(
+                forever, tmp_path, timeout=30, output_limit=1 << 20
+            )
+        )
+
+    begin = time()
+    timed_out, truncated = asyncio.run(run_both())
+    assert time() - begin < 10
+    assert timed_out.timed_out and not timed_out.truncated
+    assert truncated.truncated and not truncated.timed_out
+    assert "spam\n" in truncated.stdout
@@ -0,0 +1,131 @@
+"""Tests the incremental module's functions."""
+
+from pathlib import Path
+
+import autograde.batch_run as batch_run
+import autograde.components as components
+import autograde.tools.build as build_tools
+import autograde.tools.execute as execute_tools
+from autograde.tools.incremental import read_depfile
+
+
+def make_project(path):
+    """Creates a program of three translation units and a shared header."""
+    path.mkdir(parents=True)
+    Path(path, "util.h").write_text("int twice(int x);\n")
+    Path(path, "util.cpp").write_text(
+        '#include "util.h"\nint twice(int x) { return 2 * x; }\n'
+    )
+    Path(path, "other.cpp").write_text("int other() { return 1; }\n")
+    Path(path, "main.cpp").write_text(
+        '#include <cstdio>\n#include "util.h"\n'
+        'int main() { std::printf("%d", twice(21)); }\n'
+    )
+    return path
+
+
+def build(source_path, build_path, flags=None):
+    """Compiles the project in source_path incrementally in build_path."""
+    program = components.CppProgram(source_path)
+    program.collect_source()
+    program.set_entry_point()
+    result = build_tools.compile_cpp(
+        program, build_path, flags=flags, backend="incremental"
+    )
+    print(result.stdout, result.stderr)
+    assert bool(result)
+    return result
+
+
+def compiled(result):
+    """Returns the names of the sources compiled in a result."""
+    return sorted(
+        Path(line.split()[-1]).name for line in result.stdout.splitlines()
+        if " -c " in line
+    )
+
+
+def test_read_depfile(tmp_path):
+    """Tests reading continued lines and escaped spaces."""
+    depfile = Path(tmp_path, "main.d")
+    depfile.write_text("main.o: /a/main.cpp \\\n /a/my\\ util.h /a/b.h\n")
+    assert read_depfile(depfile) == [
+        Path("/a/main.cpp"), Path("/a/my util.h"), Path("/a/b.h")
+    ]
+
+
+def test_compile_cpp_incremental(tmp_path):
+    """Tests that only what changed is rebuilt."""
+    source_path = make_project(tmp_path / "program")
+    build_path = tmp_path / "build"
+    result = build(source_path, build_path)
+    assert compiled(result) == ["main.cpp", "other.cpp", "util.cpp"]
+    assert not list(source_path.glob("*.o"))
+    result = build(source_path, build_path)
+    assert result.stdout == ""
+    assert result.executable.exists()
+    Path(source_path, "util.h").write_text("int twice(int y);\n")
+    assert compiled(build(source_path, build_path)) == [
+        "main.cpp", "util.cpp"
+    ]
+    Path(source_path, "util.cpp").write_text(
+        '#include "util.h"\nint twice(int x) { return x + x + 1; }\n'
+    )
+    result = build(source_path, build_path)
+    assert compiled(result) == ["util.cpp"]
+    execute_result = execute_tools.execute_program(
+        result.executable, build_path
+    )
+    assert execute_result.stdout == "43"
+    assert len(compiled(build(source_path, build_path, ["-O1"]))) == 3
+
+
+def test_batch_run_build_dir(tmp_path):
+    """Tests that a batch keeps its build files outside of the programs."""
+    make_project(tmp_path / "batch" / "program")
+    for _ in range(2):
+        results = dict(batch_run.batch_run_programs(
+            tmp_path / "batch", backend="incremental",
+            build_dir=tmp_path / "build"
+        ))
+        (_, compile_result, execute_result), = results.values()
+        assert execute_result.stdout == "42"
+    assert compile_result.stdout == ""
+    assert compile_result.executable.parent == tmp_path / "build" / "program"
+    assert not list((tmp_path / "batch").rglob("*.o"))
+
+
+def test_batch_run_default_build_dir(tmp_path):
+    """Tests that incremental builds stay out of programs by default."""
+    program_path = tmp_path / "batch" / "program"
+    make_project(program_path)
+    sources = sorted(program_path.iterdir())
+    for _ in range(2):
+        results = dict(batch_run.batch_run_programs(
+            tmp_path / "batch", backend="incremental"
+        ))
+        assert list(results) == [program_path]
+        (_, compile_result, execute_result), = results.values()
+        assert execute_result.stdout == "42"
+    assert compile_result.stdout == ""
+    assert compile_result.executable.parent == (
+        tmp_path / "batch" / ".program.build"
+    )
+    assert sorted(program_path.iterdir()) == sources
+
+
+def test_compile_program_current_dir(tmp_path, monkeypatch):
+    """Tests that a program given as "." is built next to its folder."""
+    program_path = tmp_path / "program"
+    make_project(program_path)
+    (program_path / "sub").mkdir()
+    sources = sorted(program_path.iterdir())
+    monkeypatch.chdir(program_path)
+    for path in (".", "sub/.."):
+        assert batch_run.prepare_target(path, backend="incremental") == (
+            tmp_path / ".program.build"
+        )
+    _, compile_result = batch_run.compile_program(".", backend="incremental")
+    assert bool(compile_result), compile_result.stderr
+    assert compile_result.executable.parent == tmp_path / ".program.build"
+    assert sorted(program_path.iterdir()) == sources
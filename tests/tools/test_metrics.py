@@ -0,0 +1,124 @@
+"""Tests the metrics module's functions."""
+
+import math
+
+import autograde.components as components
+import autograde.tools.build as build_tools
+import autograde.tools.driver as driver_tools
+import autograde.tools.execute as execute_tools
+from autograde.tools.cache import CompileCache
+from autograde.tools.metrics import (
+    combine_metrics, get_rss_shim, measure_call, percentile
+)
+from autograde.tools.result import PhaseMetrics
+
+
+def test_percentile():
+    """Tests nearest rank percentiles."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3], 0) == 3
+    assert math.isnan(percentile([], 50))
+
+
+def test_combine_metrics():
+    """Tests that cpu times add up and the largest peak is kept."""
+    combined = combine_metrics(2.0, [
+        PhaseMetrics(1.0, 0.5, 0.1, 100), None,
+        PhaseMetrics(1.5, 0.25, 0.2, 300)
+    ])
+    assert combined.wall == 2.0
+    assert math.isclose(combined.user, 0.75)
+    assert math.isclose(combined.sys, 0.3)
+    assert combined.max_rss == 300
+    assert combined.overhead is None
+    unmeasured = combine_metrics(1.0, [PhaseMetrics(1.0)])
+    assert unmeasured == PhaseMetrics(1.0)
+
+
+def test_measure_call():
+    """Tests that a call's result is returned with its metrics."""
+    result, metrics = measure_call(sum, range(100000), start=1)
+    assert result == sum(range(100000)) + 1
+    assert metrics.wall > 0 and metrics.user is not None
+    assert metrics.max_rss is None
+
+
+def test_run_command_metrics(tmp_path):
+    """Tests that a command's cpu time is measured."""
+    stdout, _, return_code, metrics = driver_tools.run_command(
+        ["sh", "-c", "i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done"],
+        tmp_path
+    )
+    assert return_code == 0
+    assert stdout.startswith("sh -c")
+    assert metrics.user + metrics.sys > 0
+    assert metrics.wall >= metrics.user
+    assert metrics.max_rss > 0
+    _, _, return_code, metrics = driver_tools.run_command(
+        ["missing-command"], tmp_path
+    )
+    assert return_code == 127 and metrics is None
+
+
+def test_get_rss_shim_fallback(tmp_path, monkeypatch):
+    """Tests that the shim is built in the cache home or done without."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    get_rss_shim.cache_clear()
+    try:
+        shim_path = get_rss_shim()
+        assert shim_path.parent == tmp_path / "cache" / "autograde"
+        assert [path.name for path in shim_path.parent.iterdir()] == [
+            shim_path.name
+        ]
+        get_rss_shim.cache_clear()
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "other"))
+        monkeypatch.setenv("CC", str(tmp_path / "missing-cc"))
+        assert get_rss_shim() is None
+        _, _, return_code, metrics = driver_tools.run_command(
+            ["true"], tmp_path
+        )
+        assert return_code == 0 and metrics.max_rss > 0
+        assert not list((tmp_path / "other" / "autograde").iterdir())
+    finally:
+        get_rss_shim.cache_clear()
+
+
+def test_run_command_peak_memory(tmp_path):
+    """Tests that the peak memory is the command's and not the grader's."""
+    assert get_rss_shim() is not None
+    held = bytearray(256 << 20)
+    held[::4096] = b"x" * len(held[::4096])
+    _, _, _, small = driver_tools.run_command(["true"], tmp_path)
+    _, _, _, large = driver_tools.run_command(
+        ["sh", "-c", "x=$(head -c 50000000 /dev/zero | tr '\\0' a)"],
+        tmp_path
+    )
+    del held
+    assert 0 < small.max_rss < 64 << 10
+    assert large.max_rss > small.max_rss
+
+
+def test_compile_execute_metrics(tmp_path, simple_program):
+    """Tests that compiling and executing carry their metrics."""
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    cache = CompileCache(tmp_path / "cache")
+    build_path = tmp_path / "build"
+    build_path.mkdir()
+    compile_result = build_tools.compile_cpp(
+        cpp_program, build_path, cache=cache, backend="direct"
+    )
+    assert compile_result.metrics.user > 0
+    cached = build_tools.compile_cpp(
+        cpp_program, build_path, cache=cache, backend="direct"
+    )
+    assert cached.cached and cached.metrics.user is None
+    execute_result = execute_tools.execute_program(
+        compile_result.executable, tmp_path
+    )
+    assert execute_result.metrics.wall > 0
+    assert execute_result.metrics.max_rss > 0
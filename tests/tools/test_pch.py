@@ -0,0 +1,84 @@
+"""Tests the pch module's functions."""
+
+from pathlib import Path
+
+import pytest
+
+import autograde.components as components
+import autograde.tools.build as build_tools
+from autograde.tools.pch import PrecompiledHeader, get_system_includes
+
+PROGRAM = (
+    "#include <iostream>\n#include <string>\n"
+    "int main() { std::cout << std::string(\"pch\") << std::endl; }\n"
+)
+
+
+@pytest.fixture(scope="module")
+def pch(tmp_path_factory):
+    """Returns a built precompiled header of <iostream> and <string>."""
+    pch = PrecompiledHeader(
+        tmp_path_factory.mktemp("pch"), headers=["iostream", "string"]
+    )
+    result = pch.build()
+    print(result.stdout, result.stderr)
+    assert bool(result)
+    return pch
+
+
+def make_program(path, code):
+    """Returns a program of one source file with code."""
+    path.mkdir(exist_ok=True)
+    Path(path, "main.cpp").write_text(code)
+    program = components.CppProgram(path)
+    program.collect_source()
+    program.set_entry_point()
+    return program
+
+
+def test_get_system_includes(tmp_path):
+    """Tests that only <...> includes are found."""
+    source = Path(tmp_path, "main.cpp")
+    source.write_text('#include <vector>\n # include<map>\n#include "a.h"\n')
+    assert get_system_includes(source) == {"vector", "map"}
+
+
+def test_pch_build(pch):
+    """Tests that the header is built once into a shared directory."""
+    assert pch.ready
+    assert bool(pch.build())
+    assert PrecompiledHeader(
+        pch.header_path.parent.parent, headers=["iostream", "string"]
+    ).header_path == pch.header_path
+
+
+@pytest.mark.parametrize("backend", ["scons", "direct"])
+def test_compile_cpp_pch(tmp_path, pch, backend):
+    """Tests that a program that includes every header uses the pch."""
+    program = make_program(tmp_path / "program", PROGRAM)
+    result = build_tools.compile_cpp(
+        program, tmp_path / "program", backend=backend, pch=pch
+    )
+    print(result.stdout, result.stderr)
+    assert bool(result)
+    assert str(pch.header_path) in result.stdout
+
+
+def test_compile_cpp_pch_fallback(tmp_path, pch):
+    """Tests that programs the pch doesn't fit are compiled without it."""
+    missing = make_program(
+        tmp_path / "missing",
+        "#include <iostream>\nint main() { std::cout << 1; }\n"
+    )
+    result = build_tools.compile_cpp(
+        missing, tmp_path / "missing", backend="direct", pch=pch
+    )
+    assert bool(result)
+    assert str(pch.header_path) not in result.stdout
+    flagged = make_program(tmp_path / "flagged", PROGRAM)
+    result = build_tools.compile_cpp(
+        flagged, tmp_path / "flagged", flags=["-O2"], backend="direct",
+        pch=pch
+    )
+    assert bool(result)
+    assert str(pch.header_path) not in result.stdout
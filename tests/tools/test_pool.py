@@ -0,0 +1,82 @@
+"""Tests the pool module's functions."""
+
+import sys
+from pathlib import Path
+from time import time
+
+import autograde.components as components
+import autograde.tools.pool as pool_tools
+
+FAKE_DOCKER = Path(__file__).parent / "fake_docker.py"
+
+
+def make_pool(tmp_path, **kwargs):
+    """Returns a pool that runs workers with the fake docker script."""
+    return pool_tools.ContainerPool(
+        tmp_path, command=[sys.executable, str(FAKE_DOCKER)],
+        mount_point=str(Path(tmp_path).resolve()), health_timeout=30,
+        **kwargs
+    )
+
+
+def make_programs(tmp_path, count):
+    """Creates programs that print their number and returns them."""
+    programs = []
+    for i in range(count):
+        program_path = Path(tmp_path, f"program_{i}")
+        program_path.mkdir()
+        Path(program_path, "main.cpp").write_text(
+            "#include <iostream>\n"
+            f"int main() {{ std::cout << {i}; return 0; }}\n"
+        )
+        cpp_program = components.CppProgram(program_path)
+        cpp_program.collect_source()
+        cpp_program.set_entry_point()
+        programs.append(cpp_program)
+    return programs
+
+
+def test_container_pool_run(tmp_path):
+    """Tests that jobs are run and workers are recycled after max_jobs."""
+    with make_pool(tmp_path, size=1, max_jobs=2) as pool:
+        names = []
+        for i, cpp_program in enumerate(make_programs(tmp_path, 3)):
+            compile_result, execute_result = pool.run(cpp_program)
+            assert bool(compile_result), compile_result.stderr
+            assert execute_result.stdout == str(i)
+            names.append(next(iter(pool._workers)).name)
+    assert names[0] == names[1]
+    assert names[1] != names[2]
+
+
+def test_container_pool_replaces_dead_worker(tmp_path):
+    """Tests that a worker that died is replaced by a healthy one."""
+    first, second = make_programs(tmp_path, 2)
+    with make_pool(tmp_path, size=1) as pool:
+        pool.run(first)
+        worker = next(iter(pool._workers))
+        worker._process.kill()
+        worker._process.wait()
+        _, execute_result = pool.run(second)
+        assert execute_result.stdout == "1"
+        assert worker not in pool._workers
+
+
+def test_container_pool_expires_stuck_job(tmp_path):
+    """Tests that a worker stuck on a job is killed and replaced."""
+    stuck, second = make_programs(tmp_path, 2)
+    Path(stuck.entry_point.path).write_text(
+        "#include <chrono>\n#include <thread>\n"
+        "int main() { std::this_thread::sleep_for(std::chrono::seconds(20)); }"
+        "\n"
+    )
+    with make_pool(tmp_path, size=1, job_margin=3) as pool:
+        start = time()
+        compile_result, execute_result = pool.run(stuck)
+        assert time() - start < 10
+        assert not bool(compile_result)
+        assert "did not reply" in compile_result.stderr
+        assert execute_result is None
+        assert not pool._workers
+        _, execute_result = pool.run(second, timeout=30)
+        assert execute_result.stdout == "1"
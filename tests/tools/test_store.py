@@ -0,0 +1,73 @@
+"""Tests the store module's functions."""
+
+from pathlib import Path
+
+import autograde.batch_run as batch_run
+import autograde.components as components
+from autograde.tools.result import CompileResult, ExecuteResult
+from autograde.tools.store import ResultStore, make_fingerprint, passed
+from autograde.tools.testcase import CaseResult
+
+
+def make_result(tmp_path, stdout, return_code=0):
+    """Returns a run result of a program that printed stdout."""
+    program = components.CppProgram(tmp_path)
+    program.set_entry_point(Path(tmp_path, "main.cpp"))
+    return (
+        program, CompileResult(Path(tmp_path, "main.exe"), "", "", 0),
+        ExecuteResult(stdout, "", return_code)
+    )
+
+
+def test_result_store_blobs(tmp_path):
+    """Tests that long output is stored once outside of the lines."""
+    store = ResultStore(tmp_path / "store", inline_limit=16)
+    long_output = "spam\n" * 1000
+    for name in ["a", "b"]:
+        store.record(tmp_path / name, make_result(tmp_path, long_output))
+    store.record(tmp_path / "c", make_result(tmp_path, "short", 1))
+    assert len(list((tmp_path / "store").rglob("*.gz"))) == 1
+    assert store.results_path.stat().st_size < len(long_output)
+    _, execute_result = store.load(store.find(tmp_path / "a"))
+    assert execute_result.stdout == long_output
+    _, execute_result = store.load(store.find(tmp_path / "c"))
+    assert execute_result == ExecuteResult("short", "", 1)
+    assert [line["path"] for line in store.failures()] == [
+        str(tmp_path / "c")
+    ]
+
+
+def test_result_store_latest(tmp_path):
+    """Tests that the last line of a program describes it."""
+    store = ResultStore(tmp_path / "store")
+    store.record(tmp_path / "a", make_result(tmp_path, "", 1))
+    with store.results_path.open("at") as results:
+        results.write('{"path": "cut sho')
+    store.record(tmp_path / "a", make_result(tmp_path, "", 0))
+    assert len(list(store.records())) == 2
+    assert passed(store.find(tmp_path / "a"))
+    assert store.find(tmp_path / "b") is None
+
+
+def test_result_store_cases(tmp_path):
+    """Tests storing the results of test cases."""
+    store = ResultStore(tmp_path / "store")
+    program, compile_result, _ = make_result(tmp_path, "")
+    case = batch_run.TestCase("one", "1\n", "1\n")
+    case_results = [CaseResult(case, ExecuteResult("1\n", "", 0), True)]
+    line = store.record(tmp_path, (program, compile_result, case_results))
+    assert passed(line)
+    _, loaded = store.load(line)
+    assert loaded[0].case.name == "one"
+    assert loaded[0].execute_result == case_results[0].execute_result
+
+
+def test_make_fingerprint(tmp_path):
+    """Tests that the fingerprint follows the sources and settings."""
+    source = Path(tmp_path, "main.cpp")
+    source.write_text("int main() {}\n")
+    fingerprint = make_fingerprint([source], program_input="1")
+    assert make_fingerprint([source], program_input="1") == fingerprint
+    assert make_fingerprint([source], program_input="2") != fingerprint
+    source.write_text("int main() { return 0; }\n")
+    assert make_fingerprint([source], program_input="1") != fingerprint
@@ -0,0 +1,83 @@
+"""Tests the testcase module's functions."""
+
+import json
+from pathlib import Path
+from time import time
+
+import autograde.components as components
+import autograde.tools.build as build_tools
+import autograde.tools.testcase as testcase_tools
+
+
+def test_load_test_cases_directory(tmp_path):
+    """Tests loading test cases from a directory of .in/.out files."""
+    Path(tmp_path, "b.in").write_text("2\n")
+    Path(tmp_path, "b.out").write_text("2\n")
+    Path(tmp_path, "a.in").write_text("1\n")
+    test_cases = testcase_tools.load_test_cases(tmp_path)
+    assert [case.name for case in test_cases] == ["a", "b"]
+    assert test_cases[0].expected_output is None
+    assert test_cases[1] == ("b", "2\n", "2\n")
+
+
+def test_load_test_cases_manifest(tmp_path):
+    """Tests loading test cases from a json manifest."""
+    Path(tmp_path, "case.in").write_text("hello\n")
+    manifest = [
+        {"name": "file", "input_file": "case.in", "expected_output": "x"},
+        {"name": "inline", "input": "y\n", "expected_output": "y\n"},
+    ]
+    manifest_path = Path(tmp_path, "manifest.json")
+    manifest_path.write_text(json.dumps(manifest))
+    test_cases = testcase_tools.load_test_cases(manifest_path)
+    assert test_cases[0] == ("file", "hello\n", "x")
+    assert test_cases[1] == ("inline", "y\n", "y\n")
+
+
+def test_run_test_cases(tmp_path, echo_program):
+    """Tests running one executable against many test cases."""
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.collect_source()
+    cpp_program.set_entry_point()
+    compile_result = build_tools.compile_cpp(
+        cpp_program, target_path=tmp_path, backend="direct"
+    )
+    test_cases = [
+        testcase_tools.TestCase(str(i), f"{i}\n", f"{i}\n")
+        for i in range(8)
+    ]
+    test_cases.append(testcase_tools.TestCase("wrong", "1\n", "2\n"))
+    case_results = testcase_tools.run_test_cases(
+        compile_result.executable, tmp_path, test_cases, max_workers=4
+    )
+    assert [result.case for result in case_results] == test_cases
+    assert [result.passed for result in case_results] == [True]*8 + [False]
+    assert case_results[0].execute_result.stdout == "0\n"
+
+
+def test_run_test_case_stops_at_mismatch(tmp_path):
+    """Tests that a program is killed once its output can't match."""
+    source = Path(tmp_path, "wrong.cpp")
+    source.write_text(
+        "#include <iostream>\n"
+        "int main() { std::cout << \"1 2.5 wrong\" << std::endl;\n"
+        "while (true) {} }\n"
+    )
+    cpp_program = components.CppProgram(tmp_path)
+    cpp_program.add_source(components.CppSource(source))
+    cpp_program.set_entry_point(source)
+    compile_result = build_tools.compile_cpp(
+        cpp_program, target_path=tmp_path, backend="direct"
+    )
+    test_case = testcase_tools.TestCase("case", None, "1 2.5000001 3\n")
+    begin = time()
+    case_result = testcase_tools.run_test_case(
+        compile_result.executable, tmp_path, test_case, timeout=30,
+        compare="numeric"
+    )
+    assert time() - begin < 10
+    assert not case_result.passed
+    assert not case_result.execute_result.timed_out
+    assert case_result.execute_result.verdict[2:] == (
+        3, "3", "wrong", "token differs"
+    )
@@ -0,0 +1,63 @@
+"""Tests the watch module's functions."""
+
+import threading
+import time
+
+import pytest
+
+import autograde.tools.watch as watch_tools
+
+EXTENSIONS = (".cpp", ".h")
+
+
+def make_batch(tmp_path):
+    """Creates a batch of two programs with one source each."""
+    batch_path = tmp_path / "batch"
+    for name in ("first", "second"):
+        (batch_path / name).mkdir(parents=True)
+        (batch_path / name / "main.cpp").write_text("int main() {}\n")
+    return batch_path
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_watcher_finds_changed_programs(tmp_path, polling):
+    """Tests that only changes to sources of programs are reported."""
+    batch_path = make_batch(tmp_path)
+    with watch_tools.make_watcher(
+            batch_path, EXTENSIONS, polling=polling, interval=0.05
+    ) as watcher:
+        assert isinstance(watcher, watch_tools.PollingWatcher) == polling
+        assert watcher.changes(0.2) == set()
+        (batch_path / "first" / "main.exe").write_text("build output")
+        (batch_path / "first" / ".unity").mkdir()
+        (batch_path / "first" / ".unity" / "unity.cpp").write_text("")
+        (batch_path / "notes.cpp").write_text("")
+        assert watcher.changes(0.2) == set()
+        (batch_path / "second" / "main.cpp").write_text("int main() {\n}\n")
+        assert watcher.changes(5) == {batch_path.resolve() / "second"}
+        (batch_path / "third" / "src").mkdir(parents=True)
+        (batch_path / "third" / "src" / "main.cpp").write_text("")
+        assert watcher.changes(5) == {batch_path.resolve() / "third"}
+        (batch_path / "fourth.zip").write_bytes(b"PK\x05\x06" + bytes(18))
+        assert watcher.changes(5) == {batch_path.resolve() / "fourth.zip"}
+
+
+def test_debounce_merges_bursts(tmp_path):
+    """Tests that a burst of changes is yielded once when it settles."""
+    batch_path = make_batch(tmp_path)
+
+    def resubmit():
+        for name in ("first", "second", "first"):
+            time.sleep(0.05)
+            (batch_path / name / "main.cpp").write_text(f"// {time.time()}\n")
+
+    with watch_tools.make_watcher(batch_path, EXTENSIONS) as watcher:
+        writer = threading.Thread(target=resubmit)
+        writer.start()
+        start = time.monotonic()
+        changed = next(watch_tools.debounce(watcher, quiet=0.3))
+        writer.join()
+    assert changed == {
+        batch_path.resolve() / "first", batch_path.resolve() / "second"
+    }
+    assert time.monotonic() - start >= 0.4